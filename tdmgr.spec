@@ -28,6 +28,7 @@ block_cipher = None
 a = Analysis(
     ['tdmgr/run.py'],
     binaries=[],
+    datas=[('tdmgr/GUI/icons.rcc', 'tdmgr/GUI')],
     hiddenimports=[],
     hookspath=[],
     runtime_hooks=[],
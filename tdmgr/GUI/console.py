@@ -1,9 +1,24 @@
 import os
+import re
 from datetime import datetime
-
-from PyQt5.QtCore import QDir, QEvent, QRegExp, QSize, QStringListModel, Qt, pyqtSignal, pyqtSlot
-from PyQt5.QtGui import QColor, QFont, QIcon, QSyntaxHighlighter, QTextCharFormat
+from typing import Dict, List, Optional
+
+from PyQt5.QtCore import (
+    QAbstractListModel,
+    QDir,
+    QEvent,
+    QModelIndex,
+    QPointF,
+    QSize,
+    QStringListModel,
+    Qt,
+    QTimer,
+    pyqtSignal,
+    pyqtSlot,
+)
+from PyQt5.QtGui import QColor, QFont, QIcon, QTextCharFormat, QTextLayout, QTextOption
 from PyQt5.QtWidgets import (
+    QAbstractItemView,
     QComboBox,
     QCompleter,
     QDialog,
@@ -11,17 +26,23 @@ from PyQt5.QtWidgets import (
     QFileDialog,
     QLabel,
     QLineEdit,
+    QListView,
     QListWidget,
-    QPlainTextEdit,
     QPushButton,
+    QStyle,
+    QStyledItemDelegate,
     QWidget,
 )
 
+from tdmgr.GUI.common import GAP
 from tdmgr.GUI.widgets import GroupBoxV, HLayout, VLayout, console_font
-from tdmgr.mqtt import Message
+from tdmgr.mqtt import DEFAULT_LOG_SIZE, LogEntry, MessageLog
 from tdmgr.tasmota.commands import commands
 from tdmgr.tasmota.device import TasmotaDevice
 
+CONSOLE_REFRESH_INTERVAL = 100  # ms
+MAX_CACHED_SIZES = 4096  # row sizes remembered by the delegate
+
 
 class ConsoleWidget(QDockWidget):
     sendCommand = pyqtSignal(str, str)
@@ -38,19 +59,28 @@ class ConsoleWidget(QDockWidget):
         console_font.setPointSize(console_font_size)
 
         console_word_wrap = self.settings.value("console_word_wrap", True, bool)
+        buffer_size = self.settings.value("console_buffer_size", DEFAULT_LOG_SIZE, int)
 
         w = QWidget()
 
         vl = VLayout()
 
-        self.console = QPlainTextEdit()
-        self.console.setTabChangesFocus(True)
-        self.console.setWordWrapMode(console_word_wrap)
-
-        self.console.setReadOnly(True)
+        # only the rows in view are formatted and painted, messages come from the device log
+        self.model = MessageLogModel(device.open_log(buffer_size))
+        self.console = QListView()
+        self.console.setModel(self.model)
+        self.console.setItemDelegate(ConsoleDelegate(self.console))
         self.console.setFont(console_font)
+        self.console.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.console.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.console.setLayoutMode(QListView.Batched)
+        self.console.setResizeMode(QListView.Adjust)
+        self.setWordWrap(console_word_wrap)
 
-        self.console_hl = JSONHighLighter(self.console.document())
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(CONSOLE_REFRESH_INTERVAL)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
 
         hl_command_mqttlog = HLayout(0)
 
@@ -112,12 +142,22 @@ class ConsoleWidget(QDockWidget):
         if text == "":
             self.command.completer().setModel(QStringListModel(sorted(commands)))
 
-    @pyqtSlot(Message)
-    def consoleAppend(self, msg: Message):
-        if self.device.message_topic_matches_fulltopic(msg):
-            self.console.appendPlainText(
-                f"[{msg.timestamp.strftime('%X')}] {msg.topic} {msg.payload}"
-            )
+    def setWordWrap(self, enabled: bool):
+        self.console.itemDelegate().wrap = enabled
+        self.console.itemDelegate().sizes.clear()
+        self.console.setHorizontalScrollBarPolicy(
+            Qt.ScrollBarAlwaysOff if enabled else Qt.ScrollBarAsNeeded
+        )
+        self.console.doItemsLayout()
+
+    @pyqtSlot()
+    def refresh(self):
+        if not self.isVisible():
+            return
+        scrollbar = self.console.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum()
+        if self.model.sync() and at_bottom:
+            self.console.scrollToBottom()
 
     def eventFilter(self, obj, e):
         if obj == self.command and e.type() == QEvent.KeyPress:
@@ -169,68 +209,177 @@ class ConsoleWidget(QDockWidget):
         file, ok = QFileDialog.getSaveFileName(self, "Save console", new_fname, "Log files | *.log")
         if ok:
             with open(file, "w") as f:
-                f.write(self.console.toPlainText())
+                f.write("\n".join(self.model.lines()))
 
     def clear_console(self):
-        self.console.clear()
-
-
-class JSONHighLighter(QSyntaxHighlighter):
-    keyword = QTextCharFormat()
-    keyword.setForeground(QColor("darkCyan"))
-
-    braces = QTextCharFormat()
-    braces.setFontWeight(QFont.Bold)
-
-    error = QTextCharFormat()
-    error.setForeground(QColor("darkRed"))
-
-    command = QTextCharFormat()
-    command.setForeground(QColor("darkMagenta"))
-    command.setFontWeight(QFont.Bold)
-
-    tstamp = QTextCharFormat()
-    tstamp.setForeground(QColor("gray"))
+        self.model.clear()
+
+
+def text_format(color: Optional[str] = None, bold: bool = False) -> QTextCharFormat:
+    fmt = QTextCharFormat()
+    if color:
+        fmt.setForeground(QColor(color))
+    if bold:
+        fmt.setFontWeight(QFont.Bold)
+    return fmt
+
+
+HIGHLIGHT_STYLES = {
+    "keyword": text_format("darkCyan"),
+    "brace": text_format(bold=True),
+    "error": text_format("darkRed"),
+    "tstamp": text_format("gray"),
+    "command": text_format("darkMagenta", bold=True),
+}
+
+HIGHLIGHT_RULES = [
+    (re.compile(pattern), HIGHLIGHT_STYLES[style])
+    for pattern, style in (
+        (r"\[.*\] ", "tstamp"),
+        (r"\s.*(stat|tele).*\s", "brace"),
+        (r"\s.*cmnd.*\s", "command"),
+        (r"\"\w*\"(?=:)", "keyword"),
+        (r":\"\w*\"", "error"),
+        (r"\{\"Command\":\"Unknown\"\}", "error"),
+        (r"\{", "brace"),
+        (r"\}", "brace"),
+    )
+]
+
+
+def highlight(text: str) -> List[QTextLayout.FormatRange]:
+    ranges = []
+    for expression, fmt in HIGHLIGHT_RULES:
+        for match in expression.finditer(text):
+            fmt_range = QTextLayout.FormatRange()
+            fmt_range.start, fmt_range.length, fmt_range.format = (
+                match.start(),
+                match.end() - match.start(),
+                fmt,
+            )
+            ranges.append(fmt_range)
+    return ranges
 
-    STYLES = {
-        "keyword": keyword,
-        "brace": braces,
-        "error": error,
-        "tstamp": tstamp,
-        "command": command,
-    }
 
-    braces = [r"\{", r"\}"]
+def format_entry(entry: LogEntry) -> str:
+    return f"[{entry.timestamp.strftime('%X')}] {entry.topic} {entry.payload}"
 
-    def __init__(self, document):
-        QSyntaxHighlighter.__init__(self, document)
 
-        rules = []
+class MessageLogModel(QAbstractListModel):
+    """Rows of a device MessageLog, updated by `sync()` rather than with every message."""
 
-        rules += [
-            (r"\[.*\] ", 0, self.STYLES["tstamp"]),
-            (r"\s.*(stat|tele).*\s", 0, self.STYLES["brace"]),
-            (r"\s.*cmnd.*\s", 0, self.STYLES["command"]),
-            (r"\"\w*\"(?=:)", 0, self.STYLES["keyword"]),
-            (r":\"\w*\"", 0, self.STYLES["error"]),
-            (r"\{\"Command\":\"Unknown\"\}", 0, self.STYLES["error"]),
-        ]
+    NumberRole = Qt.UserRole
 
-        rules += [(r"%s" % b, 0, self.STYLES["brace"]) for b in self.braces]
+    def __init__(self, log: MessageLog, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.log = log
+        self.first = log.first  # number of the entry in the first row
+        self.last = log.total  # number of the entry after the last row
 
-        self.rules = [(QRegExp(pat), index, fmt) for (pat, index, fmt) in rules]
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.last - self.first
 
-    def highlightBlock(self, text):
-        for expression, nth, fmt in self.rules:
-            index = expression.indexIn(text, 0)
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid():
+            number = self.first + index.row()
+            if role == self.NumberRole:
+                return number
+            if role == Qt.DisplayRole and (entry := self.log.get(number)):
+                return format_entry(entry)
 
-            while index >= 0:
-                index = expression.pos(nth)
-                length = len(expression.cap(nth))
-                self.setFormat(index, length, fmt)
-                index = expression.indexIn(text, index + length)
+    def sync(self) -> bool:
+        """Drop the rows of entries which left the log and add the new ones."""
+        total, first = self.log.total, self.log.first
+        # entries also leave without new ones when another console shrinks the log
+        if total == self.last and first <= self.first:
+            return False
 
-        self.setCurrentBlockState(0)
+        if first >= self.last:
+            self.beginResetModel()
+            self.first, self.last = first, total
+            self.endResetModel()
+            return True
+
+        if (dropped := first - self.first) > 0:
+            self.beginRemoveRows(QModelIndex(), 0, dropped - 1)
+            self.first = first
+            self.endRemoveRows()
+
+        if total > self.last:
+            rows = self.rowCount()
+            self.beginInsertRows(QModelIndex(), rows, rows + total - self.last - 1)
+            self.last = total
+            self.endInsertRows()
+        return True
+
+    def clear(self):
+        self.beginResetModel()
+        self.first = self.last = self.log.total
+        self.endResetModel()
+
+    def lines(self):
+        for number in range(max(self.first, self.log.first), self.last):
+            yield format_entry(self.log.get(number))
+
+
+class ConsoleDelegate(QStyledItemDelegate):
+    """Paints console lines with JSON highlighting, wrapped to the view width if `wrap`."""
+
+    def __init__(self, view: QListView):
+        super().__init__(view)
+        self.view = view
+        self.wrap = True
+        self.sizes: Dict[int, QSize] = {}  # by entry number, valid for one view width
+        self.sizes_width = 0
+
+    def layout(self, text: str, font: QFont, width: int, formats=None) -> QTextLayout:
+        layout = QTextLayout(text, font)
+        if formats:
+            layout.setFormats(formats)
+        option = QTextOption()
+        option.setWrapMode(
+            QTextOption.WrapAtWordBoundaryOrAnywhere if self.wrap else QTextOption.NoWrap
+        )
+        layout.setTextOption(option)
+
+        height = 0.0
+        layout.beginLayout()
+        while (line := layout.createLine()).isValid():
+            if self.wrap:
+                line.setLineWidth(width)
+            line.setPosition(QPointF(0, height))
+            height += line.height()
+        layout.endLayout()
+        return layout
+
+    def sizeHint(self, option, index) -> QSize:
+        width = self.view.viewport().width() if self.wrap else 0
+        if width != self.sizes_width or len(self.sizes) > MAX_CACHED_SIZES:
+            self.sizes.clear()
+            self.sizes_width = width
+
+        number = index.data(MessageLogModel.NumberRole)
+        if not (size := self.sizes.get(number)):
+            text = index.data() or ""
+            if self.wrap:
+                height = self.layout(text, option.font, width).boundingRect().height()
+                size = QSize(width, int(height) + 1)
+            else:
+                metrics = option.fontMetrics
+                size = QSize(metrics.horizontalAdvance(text) + GAP, metrics.lineSpacing())
+            self.sizes[number] = size
+        return size
+
+    def paint(self, p, option, index):
+        text = index.data() or ""
+        if option.state & QStyle.State_Selected:
+            p.fillRect(option.rect, option.palette.highlight())
+
+        layout = self.layout(text, option.font, option.rect.width(), highlight(text))
+        p.save()
+        p.setClipRect(option.rect)
+        layout.draw(p, QPointF(option.rect.topLeft()))
+        p.restore()
 
 
 class DeviceConsoleHistory(QDialog):
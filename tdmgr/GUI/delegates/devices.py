@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from time import perf_counter
 from typing import List, Optional, Union
 
 from PyQt5.QtCore import QModelIndex, QPoint, QRect, QSize, Qt
@@ -24,6 +25,8 @@ from tdmgr.GUI.common import (
     RSSI_MEDIUM,
     SizeMode,
 )
+from tdmgr.GUI.delegates.sparkline import draw_sparkline
+from tdmgr.models.devices import TREND_PREFIX
 from tdmgr.models.roles import DeviceRoles
 from tdmgr.tasmota.common import TasmotaColor
 from tdmgr.tasmota.device import Relay, Shutter
@@ -290,6 +293,10 @@ class DeviceDelegate(QStyledItemDelegate):
 
         self.rssi_offline = QPixmap(":/signal0.png")
 
+        # paint time accounting, enabled by the performance monitor
+        self.timed = False
+        self.paint_time = 0.0
+
     def sizeHint(self, option, index):
         if self.get_column_name(index) == "Device":
             return QSize(10, ROW_HEIGHT)
@@ -329,6 +336,14 @@ class DeviceDelegate(QStyledItemDelegate):
         return index.model().sourceModel().columns[index.column()]
 
     def paint(self, p: QPainter, option: QStyleOptionViewItem, index):
+        if self.timed:
+            started = perf_counter()
+            self.paint_cell(p, option, index)
+            self.paint_time += perf_counter() - started
+        else:
+            self.paint_cell(p, option, index)
+
+    def paint_cell(self, p: QPainter, option: QStyleOptionViewItem, index):
         y = option.rect.y() + (option.rect.height() - RECT_SIZE.height()) // 2
         selected = option.state & QStyle.State_Selected
 
@@ -389,6 +404,9 @@ class DeviceDelegate(QStyledItemDelegate):
         elif col_name == "RSSI":
             self.draw_rssi_rect(p, option.rect, index)
 
+        elif col_name.startswith(TREND_PREFIX):
+            self.draw_trend(p, option, index)
+
         else:
             QStyledItemDelegate.paint(self, p, option, index)
 
@@ -407,6 +425,15 @@ class DeviceDelegate(QStyledItemDelegate):
         p.drawPixmap(px_rect, px.scaled(ICON_SIZE))
         p.restore()
 
+    def draw_trend(self, p: QPainter, option, index):
+        rect = option.rect
+        if (value := index.data()) is not None:
+            text = f"{value:g}"
+            text_width = option.fontMetrics.horizontalAdvance(text) + 2 * GAP
+            p.drawText(rect.adjusted(0, 0, -GAP, 0), Qt.AlignVCenter | Qt.AlignRight, text)
+            rect = rect.adjusted(0, 0, -text_width, 0)
+        draw_sparkline(p, rect, index.data(DeviceRoles.HistoryRole))
+
     def draw_rssi_rect(self, p: QPainter, rect, index):
         if index.data():
             rect = rect.adjusted(*RECT_ADJUSTMENT)
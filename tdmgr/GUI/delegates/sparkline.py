@@ -0,0 +1,51 @@
+from typing import Optional, Sequence
+
+from PyQt5.QtCore import QPointF, QRectF, Qt
+from PyQt5.QtGui import QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QStyledItemDelegate
+
+from tdmgr.GUI.common import GREEN
+from tdmgr.timeseries import Series
+
+SPARKLINE_PADDING = 3
+
+
+def sparkline_polygon(values: Sequence[float], rect: QRectF) -> QPolygonF:
+    """Values spread over the width of rect and scaled to its height, the highest at the top."""
+    if len(values) < 2:
+        return QPolygonF()
+    low = min(values)
+    span = max(values) - low
+    step = rect.width() / (len(values) - 1)
+    points = []
+    for i, value in enumerate(values):
+        level = (value - low) / span if span else 0.5
+        points.append(QPointF(rect.left() + i * step, rect.bottom() - level * rect.height()))
+    return QPolygonF(points)
+
+
+def draw_sparkline(p: QPainter, rect, series: Optional[Series], tier: int = 0):
+    if series and len(values := series.values(tier)) > 1:
+        rect = QRectF(rect).adjusted(
+            SPARKLINE_PADDING, SPARKLINE_PADDING, -SPARKLINE_PADDING, -SPARKLINE_PADDING
+        )
+        p.save()
+        p.setRenderHint(QPainter.Antialiasing)
+        p.setPen(QPen(GREEN, 1.5))
+        p.drawPolyline(sparkline_polygon(values, rect))
+        p.restore()
+
+
+class SparklineDelegate(QStyledItemDelegate):
+    """Draws the history of the series returned by `lookup` for the path stored in the index."""
+
+    PathRole = Qt.UserRole
+
+    def __init__(self, lookup, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookup = lookup
+
+    def paint(self, p: QPainter, option, index):
+        super().paint(p, option, index)
+        if path := index.data(self.PathRole):
+            draw_sparkline(p, option.rect, self.lookup(path))
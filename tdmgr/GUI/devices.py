@@ -1,6 +1,6 @@
 import os
 from json import dumps
-from typing import Optional
+from typing import Optional, Set
 
 from PyQt5.QtCore import QDir, QSortFilterProxyModel, Qt, QUrl, pyqtSignal
 from PyQt5.QtGui import QIcon
@@ -23,19 +23,9 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 
+from tdmgr.GUI import dialogs
 from tdmgr.GUI.common import make_relay_pixmap
 from tdmgr.GUI.delegates.devices import DeviceDelegate
-from tdmgr.GUI.dialogs import (
-    ButtonsDialog,
-    GPIODialog,
-    ModulesDialog,
-    PowerDialog,
-    SetOptionsDialog,
-    SwitchesDialog,
-    TemplateDialog,
-    TimersDialog,
-)
-from tdmgr.GUI.dialogs.shutter_control import ShutterControlDialog
 from tdmgr.GUI.widgets import (
     SliderAction,
     SpinBox,
@@ -105,6 +95,10 @@ class DevicesListWidget(QWidget):
         self.sorted_device_model.setSortRole(Qt.InitialSortOrderRole)
         self.sorted_device_model.setSortLocaleAware(True)
         self.sorted_device_model.setFilterKeyColumn(-1)
+        # the model coalesces changes, re-sort once per refresh instead of on every dataChanged
+        self.sorted_device_model.setDynamicSortFilter(False)
+        self.model.refreshed.connect(self.resort)
+        self.model.rowsInserted.connect(self.resort)
 
         self.device_list.setModel(self.sorted_device_model)
         self.device_list.setupView(self.views["Home"])
@@ -256,6 +250,27 @@ class DevicesListWidget(QWidget):
     #     #     query = "{}|{}".format(self.cbxLWT.currentText(), query)
     #     self.sorted_device_model.setFilterRegExp(query)
 
+    def visible_devices(self) -> Set[TasmotaDevice]:
+        """Devices in the rows currently shown by the view."""
+        view = self.device_list
+        if not view.isVisible() or (top := view.rowAt(0)) < 0:
+            return set()
+        if (bottom := view.rowAt(view.viewport().height() - 1)) < 0:
+            bottom = self.sorted_device_model.rowCount() - 1
+
+        return {
+            self.model.deviceAtRow(
+                self.sorted_device_model.mapToSource(self.sorted_device_model.index(row, 0)).row()
+            )
+            for row in range(top, bottom + 1)
+        }
+
+    def resort(self):
+        if self.device_list.isSortingEnabled():
+            self.sorted_device_model.sort(
+                self.sorted_device_model.sortColumn(), self.sorted_device_model.sortOrder()
+            )
+
     def change_view(self, a=None):
         view = self.views[self.sender().text()]
         self.model.setupColumns(view)
@@ -445,25 +460,25 @@ class DevicesListWidget(QWidget):
 
     def configureSO(self):
         if self.device:
-            dlg = SetOptionsDialog(self.device)
+            dlg = dialogs.SetOptionsDialog(self.device)
             dlg.sendCommand.connect(self.mqtt.publish)
             dlg.exec_()
 
     def configureModule(self):
         if self.device:
-            dlg = ModulesDialog(self.device)
+            dlg = dialogs.ModulesDialog(self.device)
             dlg.sendCommand.connect(self.mqtt.publish)
             dlg.exec_()
 
     def configureGPIO(self):
         if self.device:
-            dlg = GPIODialog(self.device)
+            dlg = dialogs.GPIODialog(self.device)
             dlg.sendCommand.connect(self.mqtt.publish)
             dlg.exec_()
 
     def configureTemplate(self):
         if self.device:
-            dlg = TemplateDialog(self.device)
+            dlg = dialogs.TemplateDialog(self.device)
             dlg.sendCommand.connect(self.mqtt.publish)
             dlg.exec_()
 
@@ -481,15 +496,15 @@ class DevicesListWidget(QWidget):
     def configureTimers(self):
         if self.device:
             self.mqtt.publish(self.device.cmnd_topic("timers"))
-            timers = TimersDialog(self.device)
-            self.mqtt.messageSignal.connect(timers.parseMessage)
+            timers = dialogs.TimersDialog(self.device)
+            self.device.message_received.connect(timers.parseMessage)
             timers.sendCommand.connect(self.mqtt.publish)
             timers.exec_()
 
     def configureButtons(self):
         if self.device:
             backlog = []
-            buttons = ButtonsDialog(self.device)
+            buttons = dialogs.ButtonsDialog(self.device)
             if buttons.exec_() == QDialog.Accepted:
                 for c, cw in buttons.command_widgets.items():
                     current_value = self.device.p.get(c)
@@ -530,7 +545,7 @@ class DevicesListWidget(QWidget):
     def configureSwitches(self):
         if self.device:
             backlog = []
-            switches = SwitchesDialog(self.device)
+            switches = dialogs.SwitchesDialog(self.device)
             if switches.exec_() == QDialog.Accepted:
                 for c, cw in switches.command_widgets.items():
                     current_value = self.device.p.get(c)
@@ -577,7 +592,7 @@ class DevicesListWidget(QWidget):
     def configurePower(self):
         if self.device:
             backlog = []
-            power = PowerDialog(self.device)
+            power = dialogs.PowerDialog(self.device)
             if power.exec_() == QDialog.Accepted:
                 for c, cw in power.command_widgets.items():
                     current_value = self.device.p.get(c)
@@ -637,7 +652,7 @@ class DevicesListWidget(QWidget):
                     self.mqtt.publish(self.device.cmnd_topic("backlog"), "; ".join(backlog))
 
     def shutterControl(self):
-        shutters = ShutterControlDialog(self.device)
+        shutters = dialogs.ShutterControlDialog(self.device)
         shutters.sendCommand.connect(self.mqtt.publish)
         self.mqtt.publish(self.device.cmnd_topic("shutterposition"))
         shutters.exec_()
@@ -1,31 +1,56 @@
-from tdmgr.GUI.console import ConsoleWidget
-from tdmgr.GUI.dialogs.broker import BrokerDialog
-from tdmgr.GUI.dialogs.bssid import BSSIdDialog
-from tdmgr.GUI.dialogs.buttons import ButtonsDialog
-from tdmgr.GUI.dialogs.clear_lwt import ClearRetainedDialog
-from tdmgr.GUI.dialogs.gpio import GPIODialog
-from tdmgr.GUI.dialogs.modules import ModulesDialog
-from tdmgr.GUI.dialogs.patterns import PatternsDialog
-from tdmgr.GUI.dialogs.power import PowerDialog
-from tdmgr.GUI.dialogs.prefs import PrefsDialog
-from tdmgr.GUI.dialogs.setoptions import SetOptionsDialog
-from tdmgr.GUI.dialogs.switches import SwitchesDialog
-from tdmgr.GUI.dialogs.templates import TemplateDialog
-from tdmgr.GUI.dialogs.timers import TimersDialog
-
-__all__ = [
-    "BrokerDialog",
-    "BSSIdDialog",
-    "ButtonsDialog",
-    "ClearRetainedDialog",
-    "ConsoleWidget",
-    "GPIODialog",
-    "ModulesDialog",
-    "PatternsDialog",
-    "PowerDialog",
-    "PrefsDialog",
-    "SetOptionsDialog",
-    "SwitchesDialog",
-    "TemplateDialog",
-    "TimersDialog",
-]
+"""Dialogs are imported on first use, so they stay out of the startup imports.
+
+Use them through the package, e.g. `dialogs.GPIODialog(device)` after `from tdmgr.GUI import
+dialogs`, a `from tdmgr.GUI.dialogs import GPIODialog` at module level imports the dialog at once.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from tdmgr.GUI.console import ConsoleWidget
+    from tdmgr.GUI.dialogs.broker import BrokerDialog
+    from tdmgr.GUI.dialogs.bssid import BSSIdDialog
+    from tdmgr.GUI.dialogs.buttons import ButtonsDialog
+    from tdmgr.GUI.dialogs.clear_lwt import ClearRetainedDialog
+    from tdmgr.GUI.dialogs.gpio import GPIODialog
+    from tdmgr.GUI.dialogs.modules import ModulesDialog
+    from tdmgr.GUI.dialogs.patterns import PatternsDialog
+    from tdmgr.GUI.dialogs.power import PowerDialog
+    from tdmgr.GUI.dialogs.prefs import PrefsDialog
+    from tdmgr.GUI.dialogs.setoptions import SetOptionsDialog
+    from tdmgr.GUI.dialogs.shutter_control import ShutterControlDialog
+    from tdmgr.GUI.dialogs.switches import SwitchesDialog
+    from tdmgr.GUI.dialogs.templates import TemplateDialog
+    from tdmgr.GUI.dialogs.timers import TimersDialog
+
+_modules = {
+    "BrokerDialog": "tdmgr.GUI.dialogs.broker",
+    "BSSIdDialog": "tdmgr.GUI.dialogs.bssid",
+    "ButtonsDialog": "tdmgr.GUI.dialogs.buttons",
+    "ClearRetainedDialog": "tdmgr.GUI.dialogs.clear_lwt",
+    "ConsoleWidget": "tdmgr.GUI.console",
+    "GPIODialog": "tdmgr.GUI.dialogs.gpio",
+    "ModulesDialog": "tdmgr.GUI.dialogs.modules",
+    "PatternsDialog": "tdmgr.GUI.dialogs.patterns",
+    "PowerDialog": "tdmgr.GUI.dialogs.power",
+    "PrefsDialog": "tdmgr.GUI.dialogs.prefs",
+    "SetOptionsDialog": "tdmgr.GUI.dialogs.setoptions",
+    "ShutterControlDialog": "tdmgr.GUI.dialogs.shutter_control",
+    "SwitchesDialog": "tdmgr.GUI.dialogs.switches",
+    "TemplateDialog": "tdmgr.GUI.dialogs.templates",
+    "TimersDialog": "tdmgr.GUI.dialogs.timers",
+}
+
+__all__ = list(_modules)
+
+
+def __getattr__(name: str):
+    if module := _modules.get(name):
+        globals()[name] = value = getattr(import_module(module), name)
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted({*globals(), *_modules})
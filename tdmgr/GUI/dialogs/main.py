@@ -1,6 +1,8 @@
 import csv
 import logging
+import os
 import re
+from typing import Optional, Set
 
 from paho.mqtt import MQTTException
 from PyQt5.QtCore import QDir, QFileInfo, QSettings, QSize, Qt, QTimer, QUrl, pyqtSlot
@@ -17,30 +19,43 @@ from PyQt5.QtWidgets import (
     QStatusBar,
 )
 
+from tdmgr.archive import DEFAULT_HISTORY_DAYS, HistoryArchive
+from tdmgr.GUI import dialogs
 from tdmgr.GUI.console import ConsoleWidget
 from tdmgr.GUI.devices import DevicesListWidget
-from tdmgr.GUI.dialogs import (
-    BrokerDialog,
-    BSSIdDialog,
-    ClearRetainedDialog,
-    PatternsDialog,
-    PrefsDialog,
-)
+from tdmgr.GUI.performance import PerformanceMonitor, PerformanceWidget
+from tdmgr.GUI.profiler import ProfilerWidget
 from tdmgr.GUI.rules import RulesWidget
 from tdmgr.GUI.telemetry import TelemetryWidget
 from tdmgr.GUI.widgets import Toolbar
 from tdmgr.models.devices import TasmotaDevicesModel
 from tdmgr.mqtt import (
+    DEFAULT_BATCH_LATENCY,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_LOG_SIZE,
     DEFAULT_PATTERNS,
     MQTT_PATH_REGEX,
+    FullTopicPatterns,
     Message,
     MqttClient,
+    MqttTransport,
     expand_fulltopic,
     initial_commands,
 )
+from tdmgr.profiling import profiler
+from tdmgr.registry import FLUSH_INTERVAL, DeviceRegistry, device_entry, registry_path
+from tdmgr.scheduler import (
+    DEFAULT_POLL_PERIOD,
+    DEFAULT_PUBLISH_BURST,
+    DEFAULT_PUBLISH_RATE,
+    Priority,
+    PublishScheduler,
+    TelemetryPoller,
+)
 from tdmgr.tasmota.device import TasmotaDevice
 from tdmgr.tasmota.discovery import lwt_discovery_stage2
 from tdmgr.tasmota.environment import TasmotaEnvironment
+from tdmgr.timeseries import DEFAULT_HISTORY_BUDGET
 
 log = logging.getLogger(__name__)
 
@@ -53,11 +68,13 @@ class MainWindow(QMainWindow):
         devices: QSettings,
         debug: bool,
         *args,
+        transport: Optional[MqttTransport] = None,
         **kwargs,
     ):
         super(MainWindow, self).__init__(*args, **kwargs)
         self._version = version
         self.debug = debug
+        self.transport = transport
         self.setWindowIcon(QIcon(":/logo.png"))
         self.setWindowTitle(f"Tasmota Device Manager {self._version}")
 
@@ -68,12 +85,12 @@ class MainWindow(QMainWindow):
 
         self.unknown = []
         self.custom_patterns = []
+        self.fulltopic_patterns = FullTopicPatterns()
         self.env = TasmotaEnvironment()
         self.env.mqtt = self.mqtt
         self.device = None
 
         self.topics = []
-        self.mqtt_queue = []
         self.fulltopic_queue = []
 
         self.lwt = dict()
@@ -82,27 +99,37 @@ class MainWindow(QMainWindow):
         self.devices = devices
         self.setMinimumSize(QSize(1000, 600))
 
-        # load devices from the devices file, create TasmotaDevices and add the to the environment
-        for mac in self.devices.childGroups():
-            self.devices.beginGroup(mac)
-            device = TasmotaDevice(
-                self.devices.value("topic"),
-                self.devices.value("full_topic"),
-                self.devices.value("device_name"),
-            )
-            device.debug = self.devices.value("debug", False, bool)
+        self.env.history.configure(
+            self.settings.value("history_budget", DEFAULT_HISTORY_BUDGET, int)
+        )
+
+        self.setup_mqtt_batching()
+        self.mqtt_queue = PublishScheduler(self.mqtt.publish, parent=self)
+        self.setup_publish_rate()
+        self.load_patterns()
+
+        # load devices from the registry, create TasmotaDevices and add them to the environment
+        self.registry = DeviceRegistry(registry_path(self.devices))
+        if not self.registry.exists and self.devices.childGroups():
+            self.registry.migrate(self.devices)
+
+        for mac, entry in self.registry.entries.items():
+            device = TasmotaDevice(entry["topic"], entry["full_topic"], entry["device_name"])
+            device.debug = entry["debug"]
             device.p["Mac"] = mac.replace("-", ":")
+            device.history.extend(entry["history"])
             self.env.add_device(device)
 
-            # load device command history
-            self.devices.beginGroup("history")
-            for k in self.devices.childKeys():
-                device.history.append(self.devices.value(k))
-            self.devices.endGroup()
+        # changed entries are saved as they happen, not only on exit, written by a background thread
+        self.registry_timer = QTimer(self)
+        self.registry_timer.setInterval(FLUSH_INTERVAL)
+        self.registry_timer.timeout.connect(self.save_devices)
+        if not self.debug:
+            self.registry_timer.start()
 
-            self.devices.endGroup()
+        self.setup_archive()
 
-        self.device_model = TasmotaDevicesModel(self.settings, self.devices, self.env)
+        self.device_model = TasmotaDevicesModel(self.settings, self.registry, self.env)
 
         self.setup_main_layout()
         self.add_devices_tab()
@@ -115,12 +142,10 @@ class MainWindow(QMainWindow):
         pbSubs.clicked.connect(self.showSubs)
         self.statusBar().addPermanentWidget(pbSubs)
 
-        self.queue_timer = QTimer()
-        self.queue_timer.timeout.connect(self.mqtt_publish_queue)
-        self.queue_timer.start(250)
-
-        self.auto_timer = QTimer()
-        self.auto_timer.timeout.connect(self.auto_telemetry)
+        self.telemetry_poller = TelemetryPoller(
+            self.env, self.mqtt_queue, lambda: len(self.mqtt.pending), parent=self
+        )
+        self.toggle_visible_only(self.actVisibleOnly.isChecked())
 
         self.load_window_state()
 
@@ -135,13 +160,48 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.mdi)
 
     def setup_mqtt(self):
-        self.mqtt = MqttClient()
+        self.mqtt = MqttClient(transport=self.transport)
         self.mqtt.connecting.connect(self.mqtt_connecting)
         self.mqtt.connected.connect(self.mqtt_connected)
         self.mqtt.disconnected.connect(self.mqtt_disconnected)
         self.mqtt.connectError.connect(self.mqtt_connectError)
         self.mqtt.messageSignal.connect(self.mqtt_message)
 
+    def setup_mqtt_batching(self):
+        self.mqtt.setBatching(
+            self.settings.value("mqtt_batching", True, bool),
+            self.settings.value("mqtt_batch_size", DEFAULT_BATCH_SIZE, int),
+            self.settings.value("mqtt_batch_latency", DEFAULT_BATCH_LATENCY, int),
+        )
+
+    @pyqtSlot()
+    def save_devices(self):
+        for d in self.env.devices:
+            if mac := d.p.get("Mac"):
+                self.registry.update(mac.replace(":", "-"), device_entry(d))
+        self.registry.flush()
+
+    def setup_archive(self):
+        """Open, reconfigure or close the telemetry history on disk as set in the preferences."""
+        days = self.settings.value("history_days", DEFAULT_HISTORY_DAYS, int)
+        if self.env.archive:
+            if days:
+                self.env.archive.days = days
+                return
+            self.env.archive.close()
+            self.env.archive = None
+
+        elif days:
+            path = os.path.join(os.path.dirname(self.settings.fileName()), "history")
+            self.env.archive = HistoryArchive(path, days)
+            self.env.archive.restore(self.env.history, {d.p["Topic"]: d for d in self.env.devices})
+
+    def setup_publish_rate(self):
+        self.mqtt_queue.set_rate(
+            self.settings.value("mqtt_publish_rate", DEFAULT_PUBLISH_RATE, int),
+            self.settings.value("mqtt_publish_burst", DEFAULT_PUBLISH_BURST, int),
+        )
+
     def add_devices_tab(self):
         self.devices_list = DevicesListWidget(self)
         sub = self.mdi.addSubWindow(self.devices_list)
@@ -178,6 +238,34 @@ class MainWindow(QMainWindow):
         self.actToggleAutoUpdate.toggled.connect(self.toggle_autoupdate)
         mMQTT.addAction(self.actToggleAutoUpdate)
 
+        self.actVisibleOnly = QAction(QIcon(), "Auto telemetry for visible devices only")
+        self.actVisibleOnly.setCheckable(True)
+        self.actVisibleOnly.setChecked(
+            self.settings.value("autotelemetry_visible_only", False, bool)
+        )
+        self.actVisibleOnly.toggled.connect(self.toggle_visible_only)
+        mMQTT.addAction(self.actVisibleOnly)
+
+        mView = self.menuBar().addMenu("View")
+        monitor = PerformanceMonitor(
+            self.mqtt,
+            self.mqtt_queue,
+            self.env,
+            self.device_model,
+            self.devices_list.device_list,
+            parent=self,
+        )
+        self.performance_dock = PerformanceWidget(monitor)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.performance_dock)
+        self.performance_dock.hide()
+        mView.addAction(self.performance_dock.toggleViewAction())
+
+        if profiler.enabled:
+            self.profiler_dock = ProfilerWidget(profiler)
+            self.addDockWidget(Qt.BottomDockWidgetArea, self.profiler_dock)
+            self.profiler_dock.hide()
+            mView.addAction(self.profiler_dock.toggleViewAction())
+
         mSettings = self.menuBar().addMenu("Settings")
         mSettings.addAction(QIcon(), "BSSId aliases", self.bssid)
         mSettings.addSeparator()
@@ -200,24 +288,32 @@ class MainWindow(QMainWindow):
         backlog_payload = ";".join(cmds)
 
         if queued:
-            self.mqtt_queue.append([backlog, backlog_payload])
+            self.mqtt_queue.enqueue(backlog, backlog_payload, Priority.QUERY)
         else:
             self.mqtt.publish(backlog, backlog_payload, 1)
 
     def setup_broker(self):
-        brokers_dlg = BrokerDialog(self.settings)
+        brokers_dlg = dialogs.BrokerDialog(self.settings)
         if brokers_dlg.exec_() == QDialog.Accepted and self.mqtt.state == self.mqtt.Connected:
             self.mqtt.disconnect()
 
     def toggle_autoupdate(self, state):
         if state:
-            if self.mqtt.state == self.mqtt.Connected:
-                for d in self.env.devices:
-                    self.mqtt.publish(d.cmnd_topic("STATUS"), payload=8)
-            self.auto_timer.setInterval(self.settings.value("autotelemetry", 5000, int))
-            self.auto_timer.start()
+            self.telemetry_poller.set_period(
+                self.settings.value("autotelemetry", DEFAULT_POLL_PERIOD, int)
+            )
+            self.telemetry_poller.start()
         else:
-            self.auto_timer.stop()
+            self.telemetry_poller.stop()
+
+    def toggle_visible_only(self, state):
+        self.settings.setValue("autotelemetry_visible_only", state)
+        self.telemetry_poller.demand = self.polled_devices if state else None
+
+    def polled_devices(self) -> Set[TasmotaDevice]:
+        """Devices shown in open telemetry docks or in the visible rows of the devices list."""
+        devices = {dock.device for dock in self.tele_docks if dock.isVisible()}
+        return devices.union(self.devices_list.visible_devices())
 
     def toggle_connect(self, state):
         if state and self.mqtt.state == self.mqtt.Disconnected:
@@ -225,11 +321,6 @@ class MainWindow(QMainWindow):
         elif not state and self.mqtt.state == self.mqtt.Connected:
             self.mqtt_disconnect()
 
-    def auto_telemetry(self):
-        if self.mqtt.state == self.mqtt.Connected:
-            for d in self.env.devices:
-                self.mqtt.publish(d.cmnd_topic("STATUS"), payload=8)
-
     def mqtt_connect(self):
         self.broker_tls = self.settings.value("tls", False, bool)
         self.broker_tls_file = self.settings.value("tls_file", "", str)
@@ -279,18 +370,23 @@ class MainWindow(QMainWindow):
         )
 
         self.mqtt_subscribe()
+        self.mqtt_queue.start()
 
-    def mqtt_subscribe(self):
-        # clear old topics
-        self.topics.clear()
+    def load_patterns(self):
+        # load custom autodiscovery patterns and recompile the discovery matchers
         self.custom_patterns.clear()
-
-        # load custom autodiscovery patterns
         self.settings.beginGroup("Patterns")
         for k in self.settings.childKeys():
             self.custom_patterns.append(self.settings.value(k))
         self.settings.endGroup()
 
+        self.fulltopic_patterns.set_patterns(DEFAULT_PATTERNS + self.custom_patterns)
+
+    def mqtt_subscribe(self):
+        # clear old topics
+        self.topics.clear()
+        self.load_patterns()
+
         # TODO: move to TasmotaEnvironment, add unit tests
         # expand fulltopic patterns to subscribable topics
         for pat in DEFAULT_PATTERNS:  # tasmota default and SO19
@@ -324,13 +420,8 @@ class MainWindow(QMainWindow):
     def mqtt_publish(self, t, p):
         self.mqtt.publish(t, p)
 
-    def mqtt_publish_queue(self):
-        for q in self.mqtt_queue:
-            t, p = q
-            self.mqtt.publish(t, p)
-            self.mqtt_queue.pop(self.mqtt_queue.index(q))
-
     def mqtt_disconnected(self):
+        self.mqtt_queue.stop()
         self.actToggleConnect.setIcon(QIcon(":/disconnect.png"))
         self.actToggleConnect.setText("Connect")
         self.statusBar().showMessage("Disconnected")
@@ -382,20 +473,15 @@ class MainWindow(QMainWindow):
         #             lwt = self.env.lwts.pop(f"{obj.ft}/LWT", obj.ofln)
         #             device.update_property("LWT", lwt)
 
-        if device := self.env.find_device(msg):
+        # known devices process their messages while they're routed
+        if device := self.env.route(msg):
             if msg.is_lwt:
                 log.debug("MQTT: LWT message for %s: %s", device.p["Topic"], msg.payload)
-                device.online = msg.payload
 
                 if device.online:
                     # known device came online, query initial state
                     self.initial_query(device, True)
 
-            else:
-                # forward the message for processing
-                device.online = True
-                device.process_message(msg)
-
         # TODO: ditto
         # elif discovery_mode != DiscoveryMode.NATIVE:
         else:
@@ -405,35 +491,32 @@ class MainWindow(QMainWindow):
                 log.info("DISCOVERY(LEGACY): LWT from an unknown device %s", msg.topic)
 
                 # STAGE 1
-                # load default and user-provided FullTopic patterns and for all the patterns,
-                # try matching the LWT topic (it follows the device's FullTopic syntax
-
-                for p in DEFAULT_PATTERNS + self.custom_patterns:
-                    match = msg.match_fulltopic(p)
-                    if match:
-                        # assume that the matched topic is the one configured in device settings
-                        if (
-                            possible_topic := match.groupdict().get("topic")
-                        ) and possible_topic not in ("tele", "stat", "cmnd"):
-                            # if the assumed topic is different from tele or stat, there is a chance
-                            # that it's a valid topic. query the assumed device for its FullTopic.
-                            # False positives won't reply.
-                            prf_start, prf_end = match.regs[match.re.groupindex["prefix"]]
-                            possible_topic_cmnd = (
-                                f"{msg.topic[:prf_start]}cmnd{msg.topic[prf_end:]}".replace(
-                                    "/LWT", "/FullTopic"
-                                )
-                            )
-                            log.debug(
-                                "DISCOVERY(LEGACY): Asking an unknown device for FullTopic at %s",
-                                possible_topic_cmnd,
+                # match the LWT topic against all default and user-provided FullTopic patterns
+                # (it follows the device's FullTopic syntax)
+
+                for match in self.fulltopic_patterns.match(msg.topic):
+                    # assume that the matched topic is the one configured in device settings
+                    if (
+                        possible_topic := match.groupdict().get("topic")
+                    ) and possible_topic not in ("tele", "stat", "cmnd"):
+                        # if the assumed topic is different from tele or stat, there is a chance
+                        # that it's a valid topic. query the assumed device for its FullTopic.
+                        # False positives won't reply.
+                        prf_start, prf_end = match.regs[match.re.groupindex["prefix"]]
+                        possible_topic_cmnd = (
+                            f"{msg.topic[:prf_start]}cmnd{msg.topic[prf_end:]}".replace(
+                                "/LWT", "/FullTopic"
                             )
-                            self.mqtt_queue.append([possible_topic_cmnd, ""])
+                        )
+                        log.debug(
+                            "DISCOVERY(LEGACY): Asking an unknown device for FullTopic at %s",
+                            possible_topic_cmnd,
+                        )
+                        self.mqtt_queue.enqueue(possible_topic_cmnd, "", Priority.QUERY)
 
             elif msg.endpoint in ("RESULT", "FULLTOPIC"):
                 # reply from an unknown device
                 if d := lwt_discovery_stage2(self.env, msg):
-                    self.env.add_device(d)
                     self.device_model.addDevice(d)
                     log.debug("DISCOVERY: Sending initial query to topic %s", d.p["Topic"])
                     self.initial_query(d, True)
@@ -488,17 +571,18 @@ class MainWindow(QMainWindow):
                     )
 
     def bssid(self):
-        BSSIdDialog(self.settings).exec_()
+        dialogs.BSSIdDialog(self.settings).exec_()
 
     def patterns(self):
-        PatternsDialog(self.settings).exec_()
+        if dialogs.PatternsDialog(self.settings).exec_() == QDialog.Accepted:
+            self.load_patterns()
 
     def showSubs(self):
         QMessageBox.information(self, "Subscriptions", "\n".join(sorted(self.topics)))
 
     def clear_retained_topics(self):
-        dlg = ClearRetainedDialog(self.env)
-        if dlg.exec_() == ClearRetainedDialog.Accepted:
+        dlg = dialogs.ClearRetainedDialog(self.env)
+        if dlg.exec_() == dialogs.ClearRetainedDialog.Accepted:
             for row in range(dlg.lw.count()):
                 itm = dlg.lw.item(row)
                 if itm.checkState() == Qt.Checked:
@@ -508,7 +592,7 @@ class MainWindow(QMainWindow):
                     log.info("MQTT: Cleared %s", topic)
 
     def prefs(self):
-        dlg = PrefsDialog(self.settings)
+        dlg = dialogs.PrefsDialog(self.settings)
         if dlg.exec_() == QDialog.Accepted:
             # TODO: move saving to dialog accept() event
             devices_short_version = self.settings.value("devices_short_version", True, bool)
@@ -527,9 +611,15 @@ class MainWindow(QMainWindow):
                 update_consoles = True
                 self.settings.setValue("console_word_wrap", dlg.cbConsWW.isChecked())
 
+            console_buffer_size = self.settings.value("console_buffer_size", DEFAULT_LOG_SIZE, int)
+            if console_buffer_size != dlg.sbConsBufferSize.value():
+                self.settings.setValue("console_buffer_size", dlg.sbConsBufferSize.value())
+                for c in self.consoles:
+                    c.device.open_log(dlg.sbConsBufferSize.value())
+
             if update_consoles:
                 for c in self.consoles:
-                    c.console.setWordWrapMode(dlg.cbConsWW.isChecked())
+                    c.setWordWrap(dlg.cbConsWW.isChecked())
                     new_font = QFont(c.console.font())
                     new_font.setPointSize(dlg.sbConsFontSize.value())
                     c.console.setFont(new_font)
@@ -537,6 +627,23 @@ class MainWindow(QMainWindow):
             if dlg.bgDiscovery.checkedId() != self.settings.value("discovery_mode", 0, int):
                 self.settings.setValue("discovery_mode", dlg.bgDiscovery.checkedId())
 
+            self.settings.setValue("devices_refresh_rate", dlg.sbDevRefreshRate.value())
+            self.device_model.set_refresh_rate(dlg.sbDevRefreshRate.value())
+
+            self.settings.setValue("history_budget", dlg.sbHistoryBudget.value())
+            self.env.history.configure(dlg.sbHistoryBudget.value())
+
+            self.settings.setValue("history_days", dlg.sbHistoryDays.value())
+            self.setup_archive()
+
+            self.settings.setValue("mqtt_batching", dlg.cbBatching.isChecked())
+            self.settings.setValue("mqtt_batch_size", dlg.sbBatchSize.value())
+            self.settings.setValue("mqtt_batch_latency", dlg.sbBatchLatency.value())
+            self.setup_mqtt_batching()
+
+            self.settings.setValue("mqtt_publish_rate", dlg.sbPublishRate.value())
+            self.setup_publish_rate()
+
         self.settings.sync()
 
     def open_config_file(self):
@@ -548,7 +655,7 @@ class MainWindow(QMainWindow):
         QDesktopServices.openUrl(QUrl.fromLocalFile(fi.absolutePath()))
 
     def auto_telemetry_period(self):
-        curr_val = self.settings.value("autotelemetry", 5000, int)
+        curr_val = self.settings.value("autotelemetry", DEFAULT_POLL_PERIOD, int)
         period, ok = QInputDialog.getInt(
             self,
             "Set AutoTelemetry period",
@@ -559,6 +666,7 @@ class MainWindow(QMainWindow):
         if ok:
             self.settings.setValue("autotelemetry", period)
             self.settings.sync()
+            self.telemetry_poller.set_period(period)
 
     @pyqtSlot(TasmotaDevice)
     def selectDevice(self, d):
@@ -581,7 +689,6 @@ class MainWindow(QMainWindow):
     def openConsole(self):
         if self.device:
             console_widget = ConsoleWidget(self.settings, self.device)
-            self.mqtt.messageSignal.connect(console_widget.consoleAppend)
             console_widget.sendCommand.connect(self.mqtt.publish)
             self.addDockWidget(Qt.BottomDockWidgetArea, console_widget)
             console_widget.command.setFocus()
@@ -596,16 +703,14 @@ class MainWindow(QMainWindow):
     def openRulesEditor(self):
         if self.device:
             rules = RulesWidget(self.device)
-            self.mqtt.messageSignal.connect(rules.parseMessage)
+            self.device.message_received.connect(rules.parseMessage)
             rules.sendCommand.connect(self.mqtt_publish)
             self.mdi.setViewMode(QMdiArea.TabbedView)
             self.mdi.addSubWindow(rules)
             rules.setWindowState(Qt.WindowMaximized)
             rules.destroyed.connect(self.updateMDI)
-            self.mqtt_queue.append((self.device.cmnd_topic("ruletimer"), ""))
-            self.mqtt_queue.append((self.device.cmnd_topic("rule1"), ""))
-            self.mqtt_queue.append((self.device.cmnd_topic("Var"), ""))
-            self.mqtt_queue.append((self.device.cmnd_topic("Mem"), ""))
+            for command in ("ruletimer", "rule1", "Var", "Mem"):
+                self.mqtt_queue.enqueue(self.device.cmnd_topic(command), "", Priority.USER)
 
     @pyqtSlot()
     def openWebUI(self):
@@ -629,22 +734,13 @@ class MainWindow(QMainWindow):
 
         self.settings.sync()
 
+        self.registry_timer.stop()
         if not self.debug:
-            for d in self.env.devices:
-                mac = d.p.get("Mac")
-                topic = d.p["Topic"]
-                full_topic = d.p["FullTopic"]
-                device_name = d.name
-
-                if mac:
-                    self.devices.beginGroup(mac.replace(":", "-"))
-                    self.devices.setValue("topic", topic)
-                    self.devices.setValue("full_topic", full_topic)
-                    self.devices.setValue("device_name", device_name)
-
-                    for i, h in enumerate(d.history):
-                        self.devices.setValue(f"history/{i}", h)
-                    self.devices.endGroup()
-            self.devices.sync()
+            self.save_devices()
+        # waits for the writer thread
+        self.registry.close()
+
+        if self.env.archive:
+            self.env.archive.close()
 
         e.accept()
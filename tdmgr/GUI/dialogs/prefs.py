@@ -9,7 +9,12 @@ from PyQt5.QtWidgets import (
     QRadioButton,
 )
 
+from tdmgr.archive import DEFAULT_HISTORY_DAYS
 from tdmgr.GUI.widgets import GroupBoxV, SpinBox, VLayout
+from tdmgr.models.devices import DEFAULT_REFRESH_RATE
+from tdmgr.mqtt import DEFAULT_BATCH_LATENCY, DEFAULT_BATCH_SIZE, DEFAULT_LOG_SIZE
+from tdmgr.scheduler import DEFAULT_PUBLISH_RATE
+from tdmgr.timeseries import DEFAULT_HISTORY_BUDGET, DEFAULT_HISTORY_SERIES
 
 
 class PrefsDialog(QDialog):
@@ -33,9 +38,37 @@ class PrefsDialog(QDialog):
         self.cbDevShortVersion = QCheckBox()
         self.cbDevShortVersion.setChecked(self.devices_short_version)
 
+        self.sbDevRefreshRate = SpinBox(minimum=0, maximum=60, suffix=" Hz")
+        self.sbDevRefreshRate.setValue(
+            self.settings.value("devices_refresh_rate", DEFAULT_REFRESH_RATE, int)
+        )
+        self.sbDevRefreshRate.setToolTip("Maximum list repaints per second, 0 = immediate")
+
+        self.sbHistoryBudget = SpinBox(minimum=0, maximum=4096, suffix=" MiB")
+        self.sbHistoryBudget.setValue(
+            self.settings.value("history_budget", DEFAULT_HISTORY_BUDGET, int)
+        )
+        self.sbHistoryBudget.setToolTip(
+            f"Memory for the history of {DEFAULT_HISTORY_SERIES} sensor values shown in trends, "
+            "0 = off"
+        )
+
+        self.sbHistoryDays = SpinBox(minimum=0, maximum=365, suffix=" days")
+        self.sbHistoryDays.setValue(self.settings.value("history_days", DEFAULT_HISTORY_DAYS, int))
+        self.sbHistoryDays.setToolTip(
+            "Sensor values kept on disk next to the settings, older than 6 hours as 15 minute "
+            "averages, 0 = off"
+        )
+
         fl_dev.addRow("Show short Tasmota version", self.cbDevShortVersion)
+        fl_dev.addRow("Refresh rate", self.sbDevRefreshRate)
+        fl_dev.addRow("Telemetry history", self.sbHistoryBudget)
+        fl_dev.addRow("Telemetry history on disk", self.sbHistoryDays)
 
         fl_dev.setAlignment(self.cbDevShortVersion, Qt.AlignTop | Qt.AlignRight)
+        fl_dev.setAlignment(self.sbDevRefreshRate, Qt.AlignTop | Qt.AlignRight)
+        fl_dev.setAlignment(self.sbHistoryBudget, Qt.AlignTop | Qt.AlignRight)
+        fl_dev.setAlignment(self.sbHistoryDays, Qt.AlignTop | Qt.AlignRight)
 
         gbDevices.setLayout(fl_dev)
 
@@ -63,18 +96,56 @@ class PrefsDialog(QDialog):
         self.sbConsFontSize = SpinBox(minimum=9, maximum=100)
         self.sbConsFontSize.setValue(self.console_font_size)
 
+        self.sbConsBufferSize = SpinBox(minimum=100, maximum=100000, suffix=" messages")
+        self.sbConsBufferSize.setValue(
+            self.settings.value("console_buffer_size", DEFAULT_LOG_SIZE, int)
+        )
+        self.sbConsBufferSize.setToolTip("Messages kept per device, older ones are dropped")
+
         gbConsole.setLayout(fl_cons)
 
         fl_cons.addRow("Word wrap", self.cbConsWW)
         fl_cons.addRow("Font size", self.sbConsFontSize)
+        fl_cons.addRow("Buffer size", self.sbConsBufferSize)
 
         fl_cons.setAlignment(self.cbConsWW, Qt.AlignTop | Qt.AlignRight)
         fl_cons.setAlignment(self.sbConsFontSize, Qt.AlignTop | Qt.AlignRight)
+        fl_cons.setAlignment(self.sbConsBufferSize, Qt.AlignTop | Qt.AlignRight)
+
+        gbMQTT = QGroupBox("MQTT")
+        fl_mqtt = QFormLayout()
+
+        self.cbBatching = QCheckBox()
+        self.cbBatching.setChecked(self.settings.value("mqtt_batching", True, bool))
+
+        self.sbBatchSize = SpinBox(minimum=1, maximum=10000)
+        self.sbBatchSize.setValue(self.settings.value("mqtt_batch_size", DEFAULT_BATCH_SIZE, int))
+
+        self.sbBatchLatency = SpinBox(minimum=10, maximum=1000, suffix=" ms")
+        self.sbBatchLatency.setValue(
+            self.settings.value("mqtt_batch_latency", DEFAULT_BATCH_LATENCY, int)
+        )
+
+        self.sbPublishRate = SpinBox(minimum=1, maximum=1000, suffix=" msg/s")
+        self.sbPublishRate.setValue(
+            self.settings.value("mqtt_publish_rate", DEFAULT_PUBLISH_RATE, int)
+        )
+        self.sbPublishRate.setToolTip("Rate of queued queries and telemetry requests")
+
+        gbMQTT.setLayout(fl_mqtt)
+
+        fl_mqtt.addRow("Batch incoming messages", self.cbBatching)
+        fl_mqtt.addRow("Max batch size", self.sbBatchSize)
+        fl_mqtt.addRow("Max latency", self.sbBatchLatency)
+        fl_mqtt.addRow("Publish rate", self.sbPublishRate)
+
+        for w in (self.cbBatching, self.sbBatchSize, self.sbBatchLatency, self.sbPublishRate):
+            fl_mqtt.setAlignment(w, Qt.AlignTop | Qt.AlignRight)
 
         btns = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Close)
         btns.accepted.connect(self.accept)
         btns.rejected.connect(self.reject)
 
-        vl.addElements(gbDevices, gbConsole, btns)
+        vl.addElements(gbDevices, gbConsole, gbMQTT, btns)
 
         self.setLayout(vl)
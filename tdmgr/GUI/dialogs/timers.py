@@ -267,19 +267,19 @@ class TimersDialog(QDialog):
             "Days":"0000000","Repeat":0,
             "Action":0}, ....
         """
-        if self.device.message_topic_matches_fulltopic(msg):
-            if msg.is_result or msg.endpoint == "TIMERS":
-                payload = msg.dict()
-                all = list(payload)
-                if msg.first_key == "Timers":
-                    self.gbTimers.setChecked(payload[msg.first_key] == "ON")
-
-                    if len(all) > 1:
-                        payload.pop("Timers")
-                        self.timers.update(payload)
-                        self.loadTimer(self.cbTimer.currentText())
-
-                elif msg.first_key.startswith("Timers"):
-                    self.timers.update(payload[msg.first_key])
-                    if msg.first_key == "Timers4":
-                        self.loadTimer(self.cbTimer.currentText())
+        if msg.is_result or msg.endpoint == "TIMERS":
+            # the payload is shared with other listeners of the message
+            payload = dict(msg.dict())
+            all = list(payload)
+            if msg.first_key == "Timers":
+                self.gbTimers.setChecked(payload[msg.first_key] == "ON")
+
+                if len(all) > 1:
+                    payload.pop("Timers")
+                    self.timers.update(payload)
+                    self.loadTimer(self.cbTimer.currentText())
+
+            elif msg.first_key.startswith("Timers"):
+                self.timers.update(payload[msg.first_key])
+                if msg.first_key == "Timers4":
+                    self.loadTimer(self.cbTimer.currentText())
@@ -0,0 +1,172 @@
+from time import monotonic
+from typing import Dict
+
+from PyQt5.QtCore import QEvent, QObject, Qt, QTimer, pyqtSignal, pyqtSlot
+from PyQt5.QtWidgets import QDockWidget, QHeaderView, QTableWidget, QTableWidgetItem
+
+from tdmgr.profiling import RingBuffer, current_rss
+
+SAMPLE_INTERVAL = 1000  # ms
+LAG_INTERVAL = 100  # ms
+HISTORY = 120  # samples
+
+# key: (label, format)
+METRICS = {
+    "messages_in": ("Messages in [1/s]", "{:.0f}"),
+    "messages_out": ("Messages out [1/s]", "{:.0f}"),
+    "event_loop_lag": ("Event loop lag [ms]", "{:.1f}"),
+    "queue_depth": ("Publish queue depth", "{:.0f}"),
+    "devices": ("Devices", "{:.0f}"),
+    "retained": ("Retained topics", "{:.0f}"),
+    "lwts": ("LWT entries", "{:.0f}"),
+    "data_changed": ("Model dataChanged [1/s]", "{:.0f}"),
+    "paint_per_frame": ("Delegate paint per frame [ms]", "{:.2f}"),
+    "rss": ("RSS [MiB]", "{:.1f}"),
+}
+
+
+class PerformanceMonitor(QObject):
+    """Samples throughput and GUI load counters once per SAMPLE_INTERVAL into ring buffers.
+
+    Counters are plain integers bumped on the hot paths, the event loop lag is the largest delay
+    of a LAG_INTERVAL timer within the sample. Nothing is measured while the monitor is stopped.
+    """
+
+    sampled = pyqtSignal()
+
+    def __init__(self, mqtt, queue, env, model, view, parent=None):
+        super().__init__(parent)
+        self.mqtt = mqtt
+        self.queue = queue
+        self.env = env
+        self.model = model
+        self.view = view
+        self.delegate = view.itemDelegate()
+
+        self.history: Dict[str, RingBuffer] = {key: RingBuffer(HISTORY) for key in METRICS}
+
+        self.stamp = 0.0
+        self.received = 0
+        self.sent = 0
+        self.data_changed = 0
+        self.frames = 0
+        self.lag_stamp = 0.0
+        self.lag_max = 0.0
+
+        self.sample_timer = QTimer(self)
+        self.sample_timer.setInterval(SAMPLE_INTERVAL)
+        self.sample_timer.timeout.connect(self.sample)
+
+        self.lag_timer = QTimer(self)
+        self.lag_timer.setInterval(LAG_INTERVAL)
+        self.lag_timer.timeout.connect(self.check_lag)
+
+    @property
+    def active(self) -> bool:
+        return self.sample_timer.isActive()
+
+    def start(self):
+        if self.active:
+            return
+        self.stamp = self.lag_stamp = monotonic()
+        self.received, self.sent = self.mqtt.received, self.mqtt.sent
+        self.data_changed = self.frames = 0
+        self.lag_max = 0.0
+        self.delegate.timed = True
+        self.delegate.paint_time = 0.0
+        self.model.dataChanged.connect(self.count_data_changed)
+        self.view.viewport().installEventFilter(self)
+        self.sample_timer.start()
+        self.lag_timer.start()
+
+    def stop(self):
+        if not self.active:
+            return
+        self.sample_timer.stop()
+        self.lag_timer.stop()
+        self.delegate.timed = False
+        self.model.dataChanged.disconnect(self.count_data_changed)
+        self.view.viewport().removeEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.frames += 1
+        return False
+
+    def count_data_changed(self, *args):
+        self.data_changed += 1
+
+    @pyqtSlot()
+    def check_lag(self):
+        now = monotonic()
+        self.lag_max = max(self.lag_max, now - self.lag_stamp - LAG_INTERVAL / 1000)
+        self.lag_stamp = now
+
+    @pyqtSlot()
+    def sample(self, now=None):
+        now = monotonic() if now is None else now
+        elapsed = max(now - self.stamp, 1e-3)
+        received, sent = self.mqtt.received, self.mqtt.sent
+
+        values = {
+            "messages_in": (received - self.received) / elapsed,
+            "messages_out": (sent - self.sent) / elapsed,
+            "event_loop_lag": self.lag_max * 1000,
+            "queue_depth": len(self.queue),
+            "devices": len(self.env.devices),
+            "retained": len(self.env.retained),
+            "lwts": len(self.env.lwts),
+            "data_changed": self.data_changed / elapsed,
+            "paint_per_frame": self.delegate.paint_time * 1000 / self.frames if self.frames else 0,
+            "rss": current_rss() or 0.0,
+        }
+        for key, value in values.items():
+            self.history[key].append(value)
+
+        self.stamp = now
+        self.received, self.sent = received, sent
+        self.data_changed = self.frames = 0
+        self.delegate.paint_time = 0.0
+        self.lag_max = 0.0
+        self.sampled.emit()
+
+
+class PerformanceWidget(QDockWidget):
+    def __init__(self, monitor: PerformanceMonitor, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setObjectName("performance")
+        self.setWindowTitle("Performance")
+        self.monitor = monitor
+
+        self.table = QTableWidget(len(METRICS), 3)
+        self.table.setHorizontalHeaderLabels(["Current", "Average", "Max"])
+        self.table.setVerticalHeaderLabels([label for label, _ in METRICS.values()])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        for row in range(len(METRICS)):
+            for column in range(3):
+                item = QTableWidgetItem()
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+        self.setWidget(self.table)
+
+        monitor.sampled.connect(self.refresh)
+        # sample only while the dock can be seen
+        self.visibilityChanged.connect(self.toggle_monitor)
+
+    @pyqtSlot(bool)
+    def toggle_monitor(self, visible: bool):
+        if visible:
+            self.monitor.start()
+        else:
+            self.monitor.stop()
+
+    @pyqtSlot()
+    def refresh(self):
+        for row, (key, (_, fmt)) in enumerate(METRICS.items()):
+            history = self.monitor.history[key]
+            values = list(history)
+            for column, value in enumerate(
+                (history.last(), sum(values) / len(values), max(values))
+            ):
+                self.table.item(row, column).setText(fmt.format(value))
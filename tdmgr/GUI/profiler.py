@@ -0,0 +1,99 @@
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import (
+    QDockWidget,
+    QFileDialog,
+    QHeaderView,
+    QPushButton,
+    QTreeWidget,
+    QTreeWidgetItem,
+    QWidget,
+)
+
+from tdmgr.GUI.widgets import HLayout, VLayout
+from tdmgr.profiling import Profiler
+
+COLUMNS = {
+    "calls": "Calls",
+    "total_ms": "Total [ms]",
+    "mean_us": "Mean [µs]",
+    "p50_us": "p50 [µs]",
+    "p99_us": "p99 [µs]",
+    "max_us": "Max [µs]",
+}
+REFRESH_INTERVAL = 1000  # ms
+
+
+class ProfilerWidget(QDockWidget):
+    def __init__(self, profiler: Profiler, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setObjectName("profiler")
+        self.setWindowTitle("Profiler")
+        self.profiler = profiler
+        self.items = {}
+
+        w = QWidget()
+        vl = VLayout()
+
+        self.tree = QTreeWidget()
+        self.tree.setColumnCount(len(COLUMNS) + 1)
+        self.tree.setHeaderLabels(["Name", *COLUMNS.values()])
+        self.tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tree.setRootIsDecorated(True)
+
+        pbReset = QPushButton(QIcon(":/clear.png"), "Reset")
+        pbReset.clicked.connect(self.reset)
+
+        pbExport = QPushButton(QIcon(":/save.png"), "Export JSON")
+        pbExport.clicked.connect(self.export)
+
+        hl_buttons = HLayout(0)
+        hl_buttons.addElements(pbReset, pbExport)
+        hl_buttons.addStretch(1)
+
+        vl.addElements(self.tree, hl_buttons)
+        w.setLayout(vl)
+        self.setWidget(w)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(REFRESH_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+
+    def get_item(self, category: str, name: str = "") -> QTreeWidgetItem:
+        if not (item := self.items.get((category, name))):
+            item = QTreeWidgetItem([name or category])
+            if name:
+                self.get_item(category).addChild(item)
+            else:
+                self.tree.addTopLevelItem(item)
+                item.setExpanded(True)
+            self.items[(category, name)] = item
+        return item
+
+    @pyqtSlot()
+    def refresh(self):
+        if not self.isVisible():
+            return
+
+        for category, counters in self.profiler.summary().items():
+            for name, summary in counters.items():
+                item = self.get_item(category, name)
+                for column, key in enumerate(COLUMNS, start=1):
+                    value = summary[key]
+                    item.setText(column, f"{value:.0f}" if key == "calls" else f"{value:.1f}")
+                    item.setTextAlignment(column, Qt.AlignRight | Qt.AlignVCenter)
+
+    @pyqtSlot()
+    def reset(self):
+        self.profiler.reset()
+        self.tree.clear()
+        self.items.clear()
+
+    @pyqtSlot()
+    def export(self):
+        fname, _ = QFileDialog.getSaveFileName(
+            self, "Export profile", "tdm_profile.json", "JSON files (*.json)"
+        )
+        if fname:
+            self.profiler.export(fname)
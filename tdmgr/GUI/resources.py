@@ -0,0 +1,49 @@
+"""Icons and other Qt resources.
+
+At startup the resources are registered from the binary icons.rcc next to this module, which Qt
+maps into memory, instead of importing the byte literals of the generated icons module. The
+module remains the fallback and the source of icons.rcc, regenerate both after changing
+icons.qrc:
+
+    pyrcc5 icons.qrc -o tdmgr/GUI/icons.py
+    python -m tdmgr.GUI.resources
+"""
+
+import os
+import struct
+
+from PyQt5.QtCore import QResource
+
+RCC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons.rcc")
+RCC_HEADER = struct.Struct(">4sIIII")  # magic, format version, tree, data and names offsets
+
+
+def rcc_data() -> bytes:
+    """Binary resource file with the tree, names and data of the generated icons module."""
+    from tdmgr.GUI import icons
+
+    data_offset = RCC_HEADER.size
+    names_offset = data_offset + len(icons.qt_resource_data)
+    tree_offset = names_offset + len(icons.qt_resource_name)
+    return b"".join(
+        (
+            RCC_HEADER.pack(b"qres", icons.rcc_version, tree_offset, data_offset, names_offset),
+            icons.qt_resource_data,
+            icons.qt_resource_name,
+            icons.qt_resource_struct,
+        )
+    )
+
+
+def register_resources() -> bool:
+    """Register the resources, True if that was from icons.rcc."""
+    if QResource.registerResource(RCC_PATH):
+        return True
+    from tdmgr.GUI import icons  # noqa: F401
+
+    return False
+
+
+if __name__ == "__main__":
+    with open(RCC_PATH, "wb") as f:
+        f.write(rcc_data())
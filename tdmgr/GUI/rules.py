@@ -275,40 +275,35 @@ class RulesWidget(QWidget):
 
     @pyqtSlot(Message)
     def parseMessage(self, msg: Message):
-        if self.device.message_topic_matches_fulltopic(msg):
-            payload = msg.dict()
-            if payload:
-                if msg.is_result and msg.first_key == "T1" or msg.endpoint == "RULETIMER":
-                    for i, rt in enumerate(payload.keys()):
-                        self.lwRTs.item(i).setText(f"RuleTimer{i + 1}: {payload[rt]}")
-                        self.rts[i] = payload[rt]
-
-                elif (
-                    msg.is_result
-                    and msg.first_key.startswith("Var")
-                    or msg.endpoint.startswith("VAR")
-                ):
-                    for k, v in payload.items():
-                        row = int(k.replace("Var", "")) - 1
-                        self.lwVars.item(row).setText(f"VAR{row + 1}: {v}")
-                        self.vars[row] = v
-
-                elif (
-                    msg.is_result
-                    and msg.first_key.startswith("Mem")
-                    or msg.endpoint.startswith("MEM")
-                ):
-                    for k, v in payload.items():
-                        row = int(k.replace("Mem", "")) - 1
-                        self.lwMems.item(row).setText(f"MEM{row + 1}: {v}")
-                        self.mems[row] = v
-
-                elif (
-                    msg.is_result
-                    and msg.first_key.startswith("Rule")
-                    or msg.endpoint.startswith("RULE")
-                ):
-                    self.display_rule(payload, msg.first_key)
+        payload = msg.dict()
+        if payload:
+            if msg.is_result and msg.first_key == "T1" or msg.endpoint == "RULETIMER":
+                for i, rt in enumerate(payload.keys()):
+                    self.lwRTs.item(i).setText(f"RuleTimer{i + 1}: {payload[rt]}")
+                    self.rts[i] = payload[rt]
+
+            elif (
+                msg.is_result and msg.first_key.startswith("Var") or msg.endpoint.startswith("VAR")
+            ):
+                for k, v in payload.items():
+                    row = int(k.replace("Var", "")) - 1
+                    self.lwVars.item(row).setText(f"VAR{row + 1}: {v}")
+                    self.vars[row] = v
+
+            elif (
+                msg.is_result and msg.first_key.startswith("Mem") or msg.endpoint.startswith("MEM")
+            ):
+                for k, v in payload.items():
+                    row = int(k.replace("Mem", "")) - 1
+                    self.lwMems.item(row).setText(f"MEM{row + 1}: {v}")
+                    self.mems[row] = v
+
+            elif (
+                msg.is_result
+                and msg.first_key.startswith("Rule")
+                or msg.endpoint.startswith("RULE")
+            ):
+                self.display_rule(payload, msg.first_key)
 
 
 class RuleHighLighter(QSyntaxHighlighter):
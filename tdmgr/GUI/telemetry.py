@@ -1,8 +1,11 @@
-from PyQt5.QtCore import Qt, pyqtSlot
+from bisect import bisect
+from typing import Dict, List, Tuple
+
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QDockWidget, QTreeWidget, QTreeWidgetItem
 
-# TODO: merge get_top_item() and get_nested_item() to a recursive generator
+from tdmgr.GUI.delegates.sparkline import SparklineDelegate
 
 item_icons = {
     "Time": "time.png",
@@ -22,78 +25,132 @@ item_units = {
 }
 
 
+RESIZE_DELAY = 500  # ms
+
+Path = Tuple[str, ...]
+
+
+def sort_key(name: str):
+    # Time first, then alphabetical
+    return name != "Time", name
+
+
+def format_value(path: Path, value) -> str:
+    if path == ("Time",):
+        return value.replace("T", " ")
+    if len(path) > 1 and (unit := item_units.get(path[-1])):
+        return f"{value} {unit}"
+    return str(value)
+
+
 class TelemetryWidget(QDockWidget):
+    """Sensor data of a device as a tree, nested to any depth (e.g. Zigbee or BLE devices).
+
+    Each update is diffed against the previous one: new keys are inserted in order, vanished ones
+    removed and only leaves whose value changed are rewritten. Columns are resized at most once
+    per RESIZE_DELAY instead of after each update. The last column has sparklines of the values
+    kept in the environment's history.
+    """
+
     def __init__(self, device, *args, **kwargs):
         super(TelemetryWidget, self).__init__(*args, **kwargs)
         self.setAllowedAreas(Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea)
         self.setWindowTitle(device.name)
 
-        self.tree_items = {}
+        self.items: Dict[Path, QTreeWidgetItem] = {}
+        self.children: Dict[Path, List[str]] = {(): []}  # sorted child names
+        self.values: Dict[Path, str] = {}
 
         self.tree = QTreeWidget()
         self.setWidget(self.tree)
-        self.tree.setColumnCount(2)
+        self.tree.setColumnCount(3)
         self.tree.setHeaderHidden(True)
+        self.tree.setItemDelegateForColumn(2, SparklineDelegate(self.series, self.tree))
+
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_DELAY)
+        self.resize_timer.timeout.connect(self.resize_columns)
 
         device.update_telemetry.connect(self.update_telemetry)
 
         self.device = device
 
-    def get_top_item(self, name):
-        item = self.tree_items.get(name)
-        if not item:
-            item = QTreeWidgetItem()
-            item.setText(0, name)
-            item.setIcon(0, QIcon(f"GUI/icons/{item_icons.get(name, '')}"))
-            self.tree.addTopLevelItem(item)
-            self.tree_items[name] = item
+    def get_item(self, path: Path) -> QTreeWidgetItem:
+        if not (item := self.items.get(path)):
+            parent, name = path[:-1], path[-1]
+            item = QTreeWidgetItem([name])
+            item.setData(2, SparklineDelegate.PathRole, path)
+            if icon := item_icons.get(name):
+                item.setIcon(0, QIcon(f"GUI/icons/{icon}"))
+
+            siblings = self.children[parent]
+            idx = bisect([sort_key(n) for n in siblings], sort_key(name))
+            siblings.insert(idx, name)
+            if parent:
+                self.items[parent].insertChild(idx, item)
+            else:
+                self.tree.insertTopLevelItem(idx, item)
+            item.setExpanded(True)
+
+            self.items[path] = item
+            self.children[path] = []
+            self.schedule_resize()
         return item
 
-    def get_nested_item(self, parent, name):
-        nested_items = self.tree_items.get(parent)
-        if nested_items:
-            _top_item = nested_items["_top_item"]
-            item = nested_items.get(name)
-            if not item:
-                item = QTreeWidgetItem()
-                item.setText(0, name)
-                item.setIcon(0, QIcon(f"GUI/icons/{item_icons.get(name, '')}"))
-                _top_item.addChild(item)
-                nested_items[name] = item
-            return item
+    def remove_item(self, path: Path):
+        # descendants first, each unlinks itself from the children of its parent
+        for name in list(self.children[path]):
+            self.remove_item((*path, name))
+        del self.children[path]
+        item = self.items.pop(path)
+        self.values.pop(path, None)
+
+        parent = path[:-1]
+        self.children[parent].remove(path[-1])
+        if parent:
+            self.items[parent].removeChild(item)
         else:
-            _top_item = QTreeWidgetItem()
-            _top_item.setText(0, parent)
-            self.tree.addTopLevelItem(_top_item)
-            self.tree_items[parent] = {"_top_item": _top_item}
-
-            item = QTreeWidgetItem()
-            item.setText(0, name)
-            _top_item.addChild(item)
-            self.tree_items[parent][name] = item
-            return item
+            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
+
+    def update_items(self, path: Path, data: dict):
+        for name in set(self.children[path]).difference(data):
+            self.remove_item((*path, name))
+
+        for name, value in data.items():
+            item_path = (*path, name)
+            item = self.get_item(item_path)
+            if isinstance(value, dict):
+                if item_path in self.values:  # was a leaf until now
+                    del self.values[item_path]
+                    item.setText(1, "")
+                self.update_items(item_path, value)
+
+            elif self.values.get(item_path) != (text := format_value(item_path, value)):
+                if self.children[item_path]:  # was a node until now
+                    self.update_items(item_path, {})
+                self.values[item_path] = text
+                item.setText(1, text)
+                self.schedule_resize()
 
     @pyqtSlot()
     def update_telemetry(self):
-        t = self.device.t
+        if t := self.device.t:
+            self.update_items((), t)
+            # a new point in each series, even where the value didn't change
+            self.tree.viewport().update()
 
-        time = t.get("Time")
+    def series(self, path: Path):
+        if env := self.device.env:
+            return env.history.get(self.device, path)
+        return None
 
-        time_item = self.get_top_item("Time")
-        time_item.setText(1, time.replace("T", " "))
+    def schedule_resize(self):
+        # throttled, not debounced: a steady stream of updates still gets resized
+        if not self.resize_timer.isActive():
+            self.resize_timer.start()
 
-        for key in sorted(t.keys()):
-            if key != "Time":
-                v = t[key]
-                if isinstance(v, dict):
-                    for nested_key, nested_v in v.items():
-                        nested_item = self.get_nested_item(key, nested_key)
-                        nested_item.setText(1, f"{nested_v} {item_units.get(nested_key, '')}")
-
-                else:
-                    item = self.get_top_item(key)
-                    item.setText(1, v)
-
-        self.tree.expandAll()
+    @pyqtSlot()
+    def resize_columns(self):
         self.tree.resizeColumnToContents(0)
         self.tree.resizeColumnToContents(1)
@@ -65,6 +65,13 @@ default_views = {
         "FallbackTopic",
         "GroupTopic",
     ],
+    "Energy": base_view
+    + [
+        "Trend:ENERGY/Power",
+        "Trend:ENERGY/Voltage",
+        "Trend:ENERGY/Current",
+        "Trend:ENERGY/Today",
+    ],
 }
 
 console_font = QFont("asd")
@@ -0,0 +1,290 @@
+"""Telemetry history kept on disk between sessions.
+
+Numeric sensor values are appended to segment files in a `history` directory next to the
+settings. A segment is a header followed by fixed-width records in time order:
+
+    header  magic, version, resolution [s], record count, first and last timestamp
+    record  timestamp (double), series id (uint32), value (double)
+
+Series ids are the line numbers of `series.jsonl`, which holds the device topic and value path of
+each series. The active segment is written through a memory map and sealed (truncated to its
+records) after SEGMENT_SPAN. Range queries bisect a sparse index of every INDEX_STRIDE-th record
+timestamp and unpack only the records in range.
+
+Sealed raw segments older than COMPACT_AFTER are rewritten with 15 minute averages and segments
+older than the retention period are deleted, both in a background thread which only touches
+sealed segments.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from time import time
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+from tdmgr.timeseries import Path, Point, TimeSeriesStore, numeric_values
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"TDMH"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIdd4x")
+RECORD = struct.Struct("<dId")
+Record = Tuple[float, int, float]
+
+SEGMENT_SPAN = 3600  # s
+SEGMENT_CAPACITY = 1 << 20  # records, the file is truncated to the written ones when sealed
+INDEX_STRIDE = 512  # records
+COMPACT_AFTER = 6 * 3600  # s
+COMPACT_RESOLUTION = 900  # s
+RESTORE_SPAN = 6 * 3600  # s, replayed into the in-memory history on start
+DEFAULT_HISTORY_DAYS = 0  # off
+
+
+class Segment:
+    """A segment file mapped into memory, see the module docstring."""
+
+    def __init__(self, path: str, f, mm: mmap.mmap, capacity: int):
+        self.path = path
+        self.f = f
+        self.mm = mm
+        self.capacity = capacity
+        _, _, self.resolution, self.count, self.first, self.last = HEADER.unpack_from(mm)
+        self.index = array(
+            "d",
+            (RECORD.unpack_from(mm, self.offset(n))[0] for n in range(0, self.count, INDEX_STRIDE)),
+        )
+
+    @staticmethod
+    def offset(n: int) -> int:
+        return HEADER.size + n * RECORD.size
+
+    @classmethod
+    def create(cls, path: str, capacity: int = SEGMENT_CAPACITY, resolution: int = 0) -> "Segment":
+        f = open(path, "w+b")
+        f.write(HEADER.pack(MAGIC, VERSION, resolution, 0, 0.0, 0.0))
+        f.truncate(cls.offset(capacity))
+        return cls(path, f, mmap.mmap(f.fileno(), 0), capacity)
+
+    @classmethod
+    def open(cls, path: str) -> Optional["Segment"]:
+        """Map an existing segment read-only, None if it isn't one."""
+        try:
+            f = open(path, "rb")
+        except OSError as e:
+            log.warning("HISTORY: can't open %s: %s", path, e)
+            return None
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, *_ = HEADER.unpack_from(mm)
+        except (ValueError, OSError, struct.error):
+            f.close()
+            log.warning("HISTORY: %s is not a history segment", path)
+            return None
+        if (magic, version) != (MAGIC, VERSION):
+            mm.close()
+            f.close()
+            log.warning("HISTORY: %s is not a history segment", path)
+            return None
+        return cls(path, f, mm, (len(mm) - HEADER.size) // RECORD.size)
+
+    @classmethod
+    def read_header(cls, path: str) -> Optional[Tuple[int, int, float, float]]:
+        """Resolution, count, first and last timestamp without mapping the segment."""
+        try:
+            with open(path, "rb") as f:
+                magic, version, *header = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return None
+        return tuple(header) if (magic, version) == (MAGIC, VERSION) else None
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, timestamp: float, series_id: int, value: float):
+        timestamp = max(timestamp, self.last)  # keep the records in time order
+        if not self.count % INDEX_STRIDE:
+            self.index.append(timestamp)
+        if not self.count:
+            self.first = timestamp
+        RECORD.pack_into(self.mm, self.offset(self.count), timestamp, series_id, value)
+        self.count += 1
+        self.last = timestamp
+        HEADER.pack_into(
+            self.mm, 0, MAGIC, VERSION, self.resolution, self.count, self.first, self.last
+        )
+
+    def records(self, start: float = 0.0, end: float = float("inf")) -> Iterator[Record]:
+        """Records with start <= timestamp <= end."""
+        if not self.count or end < self.first or start > self.last:
+            return
+        lo = max(0, bisect_left(self.index, start) - 1) * INDEX_STRIDE
+        hi = min(self.count, bisect_right(self.index, end) * INDEX_STRIDE)
+        for record in RECORD.iter_unpack(self.mm[self.offset(lo) : self.offset(hi)]):
+            if record[0] > end:
+                break
+            if record[0] >= start:
+                yield record
+
+    def close(self, seal: bool = False):
+        if seal:
+            self.mm.flush()
+        self.mm.close()
+        if seal:
+            self.f.truncate(self.offset(self.count))
+        self.f.close()
+
+
+def compact(path: str, resolution: int = COMPACT_RESOLUTION):
+    """Replace a sealed segment by the averages of its series over `resolution` buckets."""
+    if not (segment := Segment.open(path)):
+        return
+    buckets: Dict[Tuple[float, int], List[float]] = {}
+    for timestamp, series_id, value in segment.records():
+        bucket = buckets.setdefault((timestamp - timestamp % resolution, series_id), [0.0, 0])
+        bucket[0] += value
+        bucket[1] += 1
+    segment.close()
+
+    tmp_path = f"{path}.tmp"
+    compacted = Segment.create(tmp_path, max(len(buckets), 1), resolution)
+    for (timestamp, series_id), (total, count) in sorted(buckets.items()):
+        compacted.append(timestamp, series_id, total / count)
+    compacted.close(seal=True)
+    os.replace(tmp_path, path)
+
+
+class HistoryArchive:
+    """Appends sensor values to segments in `path` and answers range queries over them."""
+
+    def __init__(self, path: str, days: int, span: int = SEGMENT_SPAN, capacity=SEGMENT_CAPACITY):
+        self.path = path
+        self.days = days
+        self.span = span
+        self.capacity = capacity
+        os.makedirs(path, exist_ok=True)
+
+        self.series: List[Tuple[str, Path]] = []
+        self.series_ids: Dict[Tuple[str, Path], int] = {}
+        self.catalog_path = os.path.join(path, "series.jsonl")
+        if os.path.exists(self.catalog_path):
+            with open(self.catalog_path) as f:
+                for line in f:
+                    name, *value_path = json.loads(line)
+                    self.series_ids[(name, tuple(value_path))] = len(self.series)
+                    self.series.append((name, tuple(value_path)))
+        self.catalog = open(self.catalog_path, "a")
+
+        self.active: Optional[Segment] = None
+        self.active_end = 0.0
+
+        self.compactor: Optional[threading.Thread] = None
+        self.maintain()
+
+    def segment_paths(self) -> List[str]:
+        """Segment files from the oldest to the newest."""
+        names = [n for n in os.listdir(self.path) if n.endswith(".seg")]
+        return [os.path.join(self.path, n) for n in sorted(names, key=lambda n: int(n[:-4]))]
+
+    @staticmethod
+    def segment_start(path: str) -> int:
+        return int(os.path.basename(path)[:-4])
+
+    def series_id(self, name: str, path: Path) -> int:
+        if (series_id := self.series_ids.get((name, path))) is None:
+            series_id = self.series_ids[(name, path)] = len(self.series)
+            self.series.append((name, path))
+            self.catalog.write(json.dumps([name, *path]) + "\n")
+            self.catalog.flush()
+        return series_id
+
+    def add(self, name: str, data: dict, timestamp: Optional[float] = None):
+        timestamp = time() if timestamp is None else timestamp
+        for path, value in numeric_values(data):
+            self.append(name, path, timestamp, value)
+
+    def append(self, name: str, path: Path, timestamp: float, value: float):
+        if not self.active or self.active.full or timestamp >= self.active_end:
+            self.rotate(timestamp)
+        self.active.append(timestamp, self.series_id(name, path), value)
+
+    def rotate(self, timestamp: float):
+        """Seal the active segment and start a new one, named by its start time."""
+        if self.active:
+            self.active.close(seal=True)
+        start = int(timestamp - timestamp % self.span)
+        while os.path.exists(path := os.path.join(self.path, f"{start}.seg")):
+            start = max(start + 1, int(timestamp))  # full before its span ended, or restarted
+        self.active = Segment.create(path, self.capacity)
+        self.active_end = start + self.span
+        self.maintain()
+
+    def sealed_segments(self) -> List[str]:
+        return [p for p in self.segment_paths() if not self.active or p != self.active.path]
+
+    def query(self, name: str, path: Path, start: float, end: float = float("inf")) -> List[Point]:
+        """Points of one series within start..end, raw or compacted depending on their age."""
+        if (series_id := self.series_ids.get((name, path))) is None:
+            return []
+        points = []
+        for record in self.records(start, end):
+            if record[1] == series_id:
+                points.append((record[0], record[2]))
+        return points
+
+    def records(self, start: float, end: float = float("inf")) -> Iterator[Record]:
+        for path in self.segment_paths():
+            if self.active and path == self.active.path:
+                yield from self.active.records(start, end)
+                continue
+            header = Segment.read_header(path)
+            if not header or not header[1] or header[2] > end or header[3] < start:
+                continue
+            if segment := Segment.open(path):
+                yield from segment.records(start, end)
+                segment.close()
+
+    def restore(self, store: TimeSeriesStore, keys: Dict[str, Hashable], span=RESTORE_SPAN):
+        """Replay the latest points of known devices (keyed by topic) into the in-memory history."""
+        for timestamp, series_id, value in self.records(time() - span):
+            name, path = self.series[series_id]
+            if (key := keys.get(name)) is not None:
+                store.add_value(key, path, timestamp, value)
+
+    def maintain(self):
+        """Compact and expire sealed segments in the background, unless that's already running."""
+        if self.compactor and self.compactor.is_alive():
+            return
+        self.compactor = threading.Thread(
+            target=self.compact_segments, args=(self.sealed_segments(), time()), daemon=True
+        )
+        self.compactor.start()
+
+    def compact_segments(self, paths: List[str], now: float):
+        for path in paths:
+            if not (header := Segment.read_header(path)):
+                continue
+            resolution, _, _, last = header
+            try:
+                if self.days and last < now - self.days * 86400:
+                    os.remove(path)
+                    log.debug("HISTORY: removed %s", path)
+                elif not resolution and last < now - COMPACT_AFTER:
+                    compact(path)
+                    log.debug("HISTORY: compacted %s", path)
+            except OSError as e:
+                log.warning("HISTORY: maintenance of %s failed: %s", path, e)
+
+    def close(self):
+        if self.compactor:
+            self.compactor.join()
+        if self.active:
+            self.active.close(seal=True)
+            self.active = None
+        self.catalog.close()
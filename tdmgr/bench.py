@@ -0,0 +1,332 @@
+"""Headless benchmark of the message ingest pipeline.
+
+Replays synthetic traffic through Message, TasmotaEnvironment.find_device,
+TasmotaDevice.process_message and TasmotaDevicesModel, without a broker or a display. Payloads
+are taken from the status corpus (tests/status_parsing/jsonfiles), each simulated device uses
+the payloads of one firmware version. The roundtrip scenario sends the initial query and
+telemetry polls through MqttClient to virtual devices of the loopback broker (tdmgr.loopback).
+
+    python -m tdmgr.bench --devices 10 100 1000 10000 --scenario telemetry
+
+`--startup` instead reports the import time of the GUI from a fresh interpreter.
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+from functools import partial
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, perf_counter_ns
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from PyQt5.QtCore import QCoreApplication, QSettings
+
+from tdmgr.loopback import (
+    DEFAULT_CORPUS,
+    STATUS0_ENDPOINTS,
+    SYNTHETIC_PROFILE,
+    LoopbackTransport,
+    VirtualDevice,
+    load_corpus,
+    unwrap,
+)
+from tdmgr.models.devices import TasmotaDevicesModel
+from tdmgr.mqtt import DEFAULT_PATTERNS, Message, MqttClient, expand_fulltopic, initial_commands
+from tdmgr.tasmota.device import TasmotaDevice
+from tdmgr.tasmota.environment import TasmotaEnvironment
+
+DEFAULT_DEVICES = [10, 100, 1000, 10000]
+STARTUP_MODULE = "tdmgr.run"
+
+SCENARIOS = ("lwt", "telemetry", "status", "result", "roundtrip")
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class BenchResult(NamedTuple):
+    devices: int
+    scenario: str
+    messages: int
+    unmatched: int
+    seconds: float
+    p50: float  # µs
+    p99: float  # µs
+    peak_rss: Optional[float]  # MiB
+
+    @property
+    def rate(self) -> float:
+        return self.messages / self.seconds if self.seconds else 0.0
+
+
+def peak_rss() -> Optional[float]:
+    """Peak resident set size of the process in MiB, None where it can't be measured."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def percentile(ordered: List[int], pct: float) -> int:
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class TrafficGenerator:
+    """Synthetic traffic for a fleet of devices, payloads are picked from the device profile."""
+
+    def __init__(self, devices: List[TasmotaDevice], profiles: List[Dict[str, List[bytes]]]):
+        self.devices = devices
+        self.profiles = profiles
+
+        self.state: List[bytes] = []
+        self.sensor: List[bytes] = []
+        for profile in profiles:
+            self.state.extend(map(unwrap, profile.get("STATUS11", ())))
+            self.sensor.extend(map(unwrap, profile.get("STATUS10", ())))
+
+        self.state = self.state or [unwrap(SYNTHETIC_PROFILE["STATUS11"][0])]
+        self.sensor = self.sensor or [unwrap(SYNTHETIC_PROFILE["STATUS10"][0])]
+
+    def profile(self, idx: int) -> Dict[str, List[bytes]]:
+        return self.profiles[idx % len(self.profiles)]
+
+    def payload(self, idx: int, endpoint: str) -> Optional[bytes]:
+        if payloads := self.profile(idx).get(endpoint):
+            return payloads[idx // len(self.profiles) % len(payloads)]
+        return None
+
+    def lwt(self, rounds: int = 1) -> Iterator[Tuple[str, bytes]]:
+        for rnd in range(rounds):
+            for device in self.devices:
+                state = device.p["Offline"] if rnd % 2 else device.p["Online"]
+                yield device.tele_topic("LWT"), state.encode()
+
+    def telemetry(self, rounds: int = 1) -> Iterator[Tuple[str, bytes]]:
+        state, sensor = self.state, self.sensor
+        for _ in range(rounds):
+            for idx, device in enumerate(self.devices):
+                yield device.tele_topic("STATE"), state[idx % len(state)]
+                yield device.tele_topic("SENSOR"), sensor[idx % len(sensor)]
+
+    def status(self, rounds: int = 1) -> Iterator[Tuple[str, bytes]]:
+        for _ in range(rounds):
+            for idx, device in enumerate(self.devices):
+                for endpoint in STATUS0_ENDPOINTS:
+                    if payload := self.payload(idx, endpoint):
+                        yield device.stat_topic(endpoint), payload
+
+    def result(self, rounds: int = 1) -> Iterator[Tuple[str, bytes]]:
+        for rnd in range(rounds):
+            for idx, device in enumerate(self.devices):
+                state = "ON" if (idx + rnd) % 2 else "OFF"
+                yield device.stat_topic("RESULT"), f'{{"POWER{idx % 4 + 1}":"{state}"}}'.encode()
+                yield device.stat_topic("RESULT"), f'{{"Dimmer":{(idx + rnd) % 100}}}'.encode()
+
+
+def ingest(env: TasmotaEnvironment, msg: Message) -> bool:
+    """Route a message the way MainWindow.mqtt_message does for known devices."""
+    return env.route(msg) is not None
+
+
+class Bench:
+    def __init__(self, count: int, profiles: Optional[List[Dict[str, List[bytes]]]] = None):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.tmp = TemporaryDirectory()
+        settings = QSettings(os.path.join(self.tmp.name, "tdm.ini"), QSettings.IniFormat)
+        devices = QSettings(os.path.join(self.tmp.name, "devices.ini"), QSettings.IniFormat)
+
+        self.env = TasmotaEnvironment()
+        for idx in range(count):
+            fulltopic = DEFAULT_PATTERNS[idx % len(DEFAULT_PATTERNS)]
+            self.env.add_device(TasmotaDevice(f"bench_{idx:05d}", fulltopic))
+
+        self.model = TasmotaDevicesModel(settings, devices, self.env)
+        self.model.setupColumns(["Device", "Module", "Version", "Uptime", "RSSI", "LoadAvg"])
+        self.traffic = TrafficGenerator(self.env.devices, profiles or load_corpus())
+        self.unmatched = 0
+
+    def close(self):
+        self.tmp.cleanup()
+
+    def ingest(self, msg: Message):
+        if not ingest(self.env, msg):
+            self.unmatched += 1
+
+    def replay(self, scenario: str, rounds: int) -> Iterator[Callable]:
+        for topic, payload in getattr(self.traffic, scenario)(rounds):
+            yield partial(self.ingest, Message(topic, payload))
+
+    def roundtrip(self, rounds: int) -> Iterator[Callable]:
+        """Initial query fan-out followed by `rounds` telemetry polls, answered by virtual devices.
+
+        Messages go through MqttClient and the loopback broker, each step delivers one message.
+        """
+        transport = LoopbackTransport(
+            VirtualDevice(d.topic, self.traffic.profile(idx), d.fulltopic, relays=idx % 4 + 1)
+            for idx, d in enumerate(self.env.devices)
+        )
+        mqtt = MqttClient(transport=transport)
+        mqtt.messageSignal.connect(self.ingest)
+        mqtt.hostname = "loopback"
+        mqtt.connectToHost()
+        transport.loop_stop()
+        mqtt.subscribe(
+            [(topic, 0) for pattern in DEFAULT_PATTERNS for topic in expand_fulltopic(pattern)]
+        )
+        self.env.mqtt = mqtt
+
+        deliver = partial(transport.process, 1)
+        backlog = ";".join(" ".join(command) for command in initial_commands())
+        for rnd in range(rounds + 1):
+            for device in self.env.devices:
+                if rnd:
+                    mqtt.publish(device.cmnd_topic("STATUS"), 8)
+                else:
+                    mqtt.publish(device.cmnd_topic("backlog"), backlog)
+            while transport.queue:
+                yield deliver
+
+    def run(self, scenario: str, rounds: int = 1) -> BenchResult:
+        latencies = []
+        self.unmatched = 0
+        started = perf_counter()
+        per_round = len(self.env.devices)
+
+        steps = self.roundtrip(rounds) if scenario == "roundtrip" else self.replay(scenario, rounds)
+        for count, step in enumerate(steps, 1):
+            t0 = perf_counter_ns()
+            step()
+            latencies.append(perf_counter_ns() - t0)
+
+            # repaint as the refresh timer would, roughly once per fleet-wide round
+            if count % per_round == 0:
+                self.model.flush_changes()
+        self.model.flush_changes()
+
+        seconds = perf_counter() - started
+        latencies.sort()
+        return BenchResult(
+            len(self.env.devices),
+            scenario,
+            len(latencies),
+            self.unmatched,
+            seconds,
+            percentile(latencies, 50) / 1000,
+            percentile(latencies, 99) / 1000,
+            peak_rss(),
+        )
+
+
+def import_times(module: str = STARTUP_MODULE) -> Dict[str, Tuple[int, int]]:
+    """Self and cumulative time in µs of each module imported along with `module`.
+
+    Measured with `python -X importtime` in a fresh interpreter, so nothing is imported yet.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "QT_QPA_PLATFORM": "offscreen"},
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:"):
+            self_us, cumulative, name = line[len("import time:") :].split("|")
+            if self_us.strip().isdigit():  # skip the header
+                times[name.strip()] = (int(self_us), int(cumulative))
+    return times
+
+
+def format_startup(times: Dict[str, Tuple[int, int]], module: str = STARTUP_MODULE) -> str:
+    slowest = sorted(times.items(), key=lambda item: -item[1][0])[:15]
+    lines = [f"import {module}: {times[module][1] / 1000:.1f} ms, {len(times)} modules"]
+    lines.append(f"{'self ms':>9} {'cumul. ms':>9}  module")
+    for name, (self_us, cumulative) in slowest:
+        lines.append(f"{self_us / 1000:>9.1f} {cumulative / 1000:>9.1f}  {name}")
+    return "\n".join(lines)
+
+
+def format_result(result: BenchResult) -> str:
+    rss = f"{result.peak_rss:8.1f}" if result.peak_rss is not None else "     n/a"
+    return (
+        f"{result.devices:>7} {result.scenario:<10} {result.messages:>9} "
+        f"{result.rate:>12.0f} {result.p50:>9.1f} {result.p99:>9.1f} {rss}"
+    )
+
+
+def setup_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="tdmgr-bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=DEFAULT_DEVICES)
+    parser.add_argument("--scenario", choices=(*SCENARIOS, "all"), default="all")
+    parser.add_argument(
+        "--teleperiod", type=int, default=300, help="Simulated TelePeriod in seconds"
+    )
+    parser.add_argument(
+        "--duration",
+        type=int,
+        default=900,
+        help="Simulated time in seconds, sets the number of telemetry and RESULT rounds",
+    )
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    parser.add_argument(
+        "--startup", action="store_true", help="Report the import time of the GUI and exit"
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = setup_parser().parse_args(argv)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    if args.startup:
+        times = import_times()
+        if args.json:
+            print(json.dumps({name: cumulative for name, (_, cumulative) in times.items()}))
+        else:
+            print(format_startup(times))
+        return
+
+    profiles = load_corpus(args.corpus)
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    rounds = {
+        "lwt": 1,
+        "status": 1,
+        "telemetry": max(1, args.duration // args.teleperiod),
+        "result": max(1, args.duration // args.teleperiod),
+        "roundtrip": max(1, args.duration // args.teleperiod),
+    }
+
+    if not args.json:
+        print(f"{len(profiles)} firmware profile(s), TelePeriod {args.teleperiod}s")
+        print(
+            f"{'devices':>7} {'scenario':<10} {'messages':>9} {'msgs/s':>12} "
+            f"{'p50 µs':>9} {'p99 µs':>9} {'RSS MiB':>8}"
+        )
+
+    # peak RSS never goes down, so run the fleets from the smallest
+    for count in sorted(args.devices):
+        bench = Bench(count, profiles)
+        for scenario in scenarios:
+            result = bench.run(scenario, rounds[scenario])
+            if args.json:
+                print(json.dumps({**result._asdict(), "rate": result.rate}))
+            else:
+                print(format_result(result))
+        bench.close()
+        del bench
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
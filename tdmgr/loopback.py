@@ -0,0 +1,309 @@
+"""In-process MQTT transport with simulated Tasmota devices.
+
+LoopbackTransport stands in for a broker: published messages are routed to subscribers and to
+virtual devices, which answer commands with payloads from the status corpus. Delivery happens on
+the thread which calls `process()` (driven by a timer after `loop_start()`), so thousands of
+devices can be simulated on one machine without a broker or hardware.
+"""
+
+import json
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from paho.mqtt.client import topic_matches_sub
+from PyQt5.QtCore import QTimer
+
+from tdmgr.mqtt import MqttTransport
+
+Reply = Tuple[str, bytes]
+
+DEFAULT_CORPUS = Path(__file__).parent.parent / "tests" / "status_parsing" / "jsonfiles"
+
+# endpoints published in reply to `status 0`
+STATUS0_ENDPOINTS = ("STATUS", *(f"STATUS{n}" for n in (1, 2, 3, 4, 5, 6, 7, 9, 10, 11)))
+
+# used when the corpus is not available, e.g. in an installed package
+SYNTHETIC_PROFILE = {
+    "STATUS": [b'{"Status":{"Module":1,"DeviceName":"Bench","FriendlyName":["Bench"],"Power":0}}'],
+    "STATUS2": [b'{"StatusFWR":{"Version":"14.2.0(tasmota)","Core":"2_7_7","Hardware":"ESP8266"}}'],
+    "STATUS10": [b'{"StatusSNS":{"Time":"2024-01-01T00:00:00","ANALOG":{"Temperature":21.5}}}'],
+    "STATUS11": [
+        b'{"StatusSTS":{"Time":"2024-01-01T00:00:00","Uptime":"0T01:00:00","UptimeSec":3600,'
+        b'"Heap":25,"LoadAvg":19,"POWER":"ON","Wifi":{"AP":1,"SSId":"bench","RSSI":80}}}'
+    ],
+}
+
+
+def load_corpus(path: Path = DEFAULT_CORPUS) -> List[Dict[str, List[bytes]]]:
+    """Load one profile per firmware version: endpoint -> list of compact JSON payloads.
+
+    STATE and SENSOR payloads are derived from the STATUS11 and STATUS10 responses.
+    """
+    profiles = []
+    if path.is_dir():
+        for version_dir in sorted(p for p in path.iterdir() if p.is_dir()):
+            profile: Dict[str, List[bytes]] = {}
+            for file in sorted(version_dir.glob("STATUS*.json")):
+                endpoint = file.name.split(".")[0]
+                profile.setdefault(endpoint, []).append(
+                    json.dumps(json.loads(file.read_text()), separators=(",", ":")).encode()
+                )
+            if profile:
+                profiles.append(profile)
+    return profiles or [SYNTHETIC_PROFILE]
+
+
+def unwrap(payload: bytes) -> bytes:
+    """Strip the StatusXXX wrapper of a STATUS response, as published on tele/STATE and SENSOR."""
+    return json.dumps(next(iter(json.loads(payload).values())), separators=(",", ":")).encode()
+
+
+TEMPLATE = {"NAME": "Generic", "GPIO": [1] * 14, "FLAG": 0, "BASE": 18}
+MODULES = {"0": "Generic", "1": "Sonoff Basic", "18": "Generic"}
+
+# canned replies for commands without state in the simulation, by lower case command name
+SIMPLE_REPLIES = {
+    "buttondebounce": {"ButtonDebounce": 50},
+    "switchdebounce": {"SwitchDebounce": 50},
+    "interlock": {"Interlock": "OFF"},
+    "blinktime": {"BlinkTime": 10},
+    "blinkcount": {"BlinkCount": 10},
+    "pulsetime": {"PulseTime": {"Set": [0] * 8, "Remaining": [0] * 8}},
+    "template": TEMPLATE,
+    "modules": {"Modules": MODULES},
+    "module": {"Module": {"18": "Generic"}},
+    "gpio": {"GPIO0": {"0": "None"}},
+    "gpios": {"GPIOs1": {"0": "None", "224": "Relay1"}},
+}
+
+
+class LoopbackMessage(NamedTuple):
+    """Delivered message, with the attributes of a paho MQTTMessage that MqttClient reads."""
+
+    topic: str
+    payload: bytes
+    retain: bool = False
+
+
+def as_bytes(payload) -> bytes:
+    if payload is None:
+        return b""
+    if isinstance(payload, bytes):
+        return payload
+    return str(payload).encode()
+
+
+class VirtualDevice:
+    """Simulated Tasmota device answering commands with the payloads of a firmware profile."""
+
+    def __init__(
+        self,
+        topic: str,
+        profile: Dict[str, List[bytes]],
+        fulltopic: str = "%prefix%/%topic%/",
+        relays: int = 1,
+    ):
+        self.topic = topic
+        self.fulltopic = fulltopic
+        self.profile = profile
+        self.power = ["OFF"] * relays
+        self.payloads: Dict[str, Optional[bytes]] = {}
+
+        mac = zlib.crc32(topic.encode()).to_bytes(4, "big")
+        self.identity = {
+            "Topic": topic,
+            "Hostname": topic,
+            "Mac": ":".join(f"{b:02X}" for b in b"\x5c\xcf" + mac),
+            "MqttClient": f"DVES_{mac.hex().upper()[-6:]}",
+        }
+
+    def build_topic(self, prefix: str, endpoint: str = "") -> str:
+        topic = self.fulltopic.replace("%prefix%", prefix).replace("%topic%", self.topic)
+        return f"{topic.rstrip('/')}/{endpoint}".rstrip("/")
+
+    def payload(self, endpoint: str) -> Optional[bytes]:
+        """Profile payload of a STATUS endpoint, with the identity of this device."""
+        if endpoint not in self.payloads:
+            payload = None
+            if payloads := self.profile.get(endpoint):
+                payload = payloads[0]
+                data = json.loads(payload)
+                body = next(iter(data.values()))
+                if isinstance(body, dict) and not self.identity.keys().isdisjoint(body):
+                    body.update((k, v) for k, v in self.identity.items() if k in body)
+                    payload = json.dumps(data, separators=(",", ":")).encode()
+            self.payloads[endpoint] = payload
+        return self.payloads[endpoint]
+
+    def lwt(self, online: bool = True) -> Reply:
+        return self.build_topic("tele", "LWT"), b"Online" if online else b"Offline"
+
+    def telemetry(self) -> List[Reply]:
+        replies = []
+        for endpoint, source in (("STATE", "STATUS11"), ("SENSOR", "STATUS10")):
+            if payload := self.payload(source):
+                replies.append((self.build_topic("tele", endpoint), unwrap(payload)))
+        return replies
+
+    def status(self, payload: str) -> List[Reply]:
+        if payload == "0":
+            endpoints = STATUS0_ENDPOINTS
+        elif payload == "8":
+            # STATUS8 has been replaced by STATUS10, which carries the same StatusSNS payload
+            if sensor := self.payload("STATUS10"):
+                return [(self.build_topic("stat", "STATUS8"), sensor)]
+            return []
+        else:
+            endpoints = (f"STATUS{payload}",)
+
+        return [
+            (self.build_topic("stat", endpoint), payload)
+            for endpoint in endpoints
+            if (payload := self.payload(endpoint))
+        ]
+
+    def set_power(self, idx: int, payload: str) -> dict:
+        if 0 <= idx < len(self.power):
+            state = self.power[idx]
+            action = payload.upper()
+            if action in ("1", "ON"):
+                state = "ON"
+            elif action in ("0", "OFF"):
+                state = "OFF"
+            elif action in ("2", "TOGGLE"):
+                state = "OFF" if state == "ON" else "ON"
+            self.power[idx] = state
+            key = "POWER" if len(self.power) == 1 else f"POWER{idx + 1}"
+            return {key: state}
+        return {"Command": "Error"}
+
+    def command(self, command: str, payload: str = "") -> List[Reply]:
+        cmd = command.lower()
+
+        if cmd == "backlog":
+            replies = []
+            for entry in filter(None, (e.strip() for e in payload.split(";"))):
+                sub_command, _, sub_payload = entry.partition(" ")
+                replies.extend(self.command(sub_command, sub_payload))
+            return replies
+
+        if cmd == "status":
+            return self.status(payload or "")
+
+        if cmd.startswith("power") and cmd[5:].isdigit() or cmd == "power":
+            result = self.set_power(int(cmd[5:] or 1) - 1, payload)
+        elif cmd == "fulltopic":
+            result = {"FullTopic": self.fulltopic}
+        elif cmd == "topic":
+            result = {"Topic": self.topic}
+        else:
+            result = SIMPLE_REPLIES.get(cmd, {"Command": "Unknown"})
+
+        return [(self.build_topic("stat", "RESULT"), json.dumps(result).encode())]
+
+
+class LoopbackTransport(MqttTransport):
+    """Broker and a fleet of virtual devices in the client's process."""
+
+    def __init__(
+        self, devices: Iterable[VirtualDevice] = (), interval: int = 10, batch_size: int = 1000
+    ):
+        self.devices: Dict[str, VirtualDevice] = {}
+        self.subscriptions: List[str] = []
+        self.retained: Dict[str, bytes] = {}
+        self.queue: Deque[LoopbackMessage] = deque()
+        self.connected = False
+        self.published = 0
+        self.batch_size = batch_size
+
+        self.timer = QTimer()
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.tick)
+
+        for device in devices:
+            self.add_device(device)
+
+    @classmethod
+    def with_devices(
+        cls, count: int, profiles: Optional[List[Dict[str, List[bytes]]]] = None
+    ) -> "LoopbackTransport":
+        """Simulate `count` devices, each using one of the firmware profiles of the corpus."""
+        profiles = profiles or load_corpus()
+        return cls(
+            VirtualDevice(f"loopback_{idx:05d}", profiles[idx % len(profiles)], relays=idx % 4 + 1)
+            for idx in range(count)
+        )
+
+    def add_device(self, device: VirtualDevice):
+        self.devices[device.build_topic("cmnd")] = device
+        topic, payload = device.lwt()
+        self.retained[topic] = payload
+
+    def connect(self, host: str = "", port: int = 1883, keepalive: int = 60):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+        self.timer.stop()
+        self.subscriptions.clear()
+        self.queue.clear()
+        if self.on_disconnect:
+            self.on_disconnect(self, None, 0)
+
+    def loop_start(self):
+        if self.connected and self.on_connect:
+            self.on_connect(self, None, {}, 0)
+        self.timer.start()
+
+    def loop_stop(self):
+        self.timer.stop()
+
+    def subscribe(self, topic: Union[str, List[Tuple[str, int]]], qos: int = 0):
+        filters = [topic] if isinstance(topic, str) else [t for t, _ in topic]
+        for _filter in filters:
+            if _filter not in self.subscriptions:
+                self.subscriptions.append(_filter)
+                for retained_topic, payload in self.retained.items():
+                    if topic_matches_sub(_filter, retained_topic):
+                        self.queue.append(LoopbackMessage(retained_topic, payload, True))
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False):
+        payload = as_bytes(payload)
+        self.published += 1
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+
+        self.route(topic, payload)
+
+        prefix, _, command = topic.rpartition("/")
+        if device := self.devices.get(prefix):
+            for reply in device.command(command, payload.decode()):
+                self.route(*reply)
+
+    def route(self, topic: str, payload: bytes, retain: bool = False):
+        if any(topic_matches_sub(_filter, topic) for _filter in self.subscriptions):
+            self.queue.append(LoopbackMessage(topic, payload, retain))
+
+    def telemetry(self):
+        """Publish STATE and SENSOR of every device, as done each TelePeriod."""
+        for device in self.devices.values():
+            for reply in device.telemetry():
+                self.route(*reply)
+
+    def tick(self):
+        self.process(self.batch_size)
+
+    def process(self, limit: Optional[int] = None) -> int:
+        """Deliver queued messages, replies triggered meanwhile are queued behind them."""
+        count = 0
+        while self.queue and (limit is None or count < limit):
+            message = self.queue.popleft()
+            if self.on_message:
+                self.on_message(self, None, message)
+            count += 1
+        return count
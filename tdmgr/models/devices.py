@@ -1,61 +1,134 @@
 import struct
 from socket import inet_aton
+from typing import Dict, List, Optional, Set, Tuple
 
-from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer, pyqtSignal
 
 from tdmgr.models.roles import DeviceRoles
-from tdmgr.tasmota.device import TasmotaDevice
+from tdmgr.tasmota.device import SENSOR_KEYS, TasmotaDevice
+from tdmgr.timeseries import Path
+
+# property keys which are painted in the "Device" column
+DEVICE_COLUMN_KEYS = frozenset(
+    ("RSSI", "LWT", "Color", "HSBColor", "IPAddress", "Gateway", "Ethernet")
+)
+DEVICE_COLUMN_PREFIXES = ("POWER", "FriendlyName", "Channel", "Dimmer", "Shutter")
+
+DEFAULT_REFRESH_RATE = 10  # Hz, 0 = repaint immediately
+
+# sparkline of a sensor value's history, e.g. "Trend:ENERGY/Power"
+TREND_PREFIX = "Trend:"
+
+
+def is_device_column_key(key: str) -> bool:
+    return key in DEVICE_COLUMN_KEYS or key.startswith(DEVICE_COLUMN_PREFIXES)
+
+
+def trend_path(column: str) -> Optional[Path]:
+    if column.startswith(TREND_PREFIX):
+        return tuple(column[len(TREND_PREFIX) :].split("/"))
+    return None
+
+
+def dirty_ranges(dirty: Dict[int, Set[int]]) -> List[Tuple[int, int, int, int]]:
+    """Merge dirty cells into (top, left, bottom, right) rectangles.
+
+    Each row is reduced to its column span, consecutive rows with the same span are merged.
+    """
+    ranges = []
+    for row in sorted(dirty):
+        left, right = min(dirty[row]), max(dirty[row])
+        if ranges and ranges[-1][2] == row - 1 and ranges[-1][1] == left and ranges[-1][3] == right:
+            ranges[-1] = (ranges[-1][0], left, row, right)
+        else:
+            ranges.append((row, left, row, right))
+    return ranges
 
 
 class TasmotaDevicesModel(QAbstractTableModel):
+    refreshed = pyqtSignal()
+
     def __init__(self, settings, devices, tasmota_env):
         super().__init__()
         self.settings = settings
         self.devices = devices
         self.tasmota_env = tasmota_env
         self.columns = []
+        self.column_index: Dict[str, int] = {}
+        self.trend_paths: Dict[int, Path] = {}
+        self.rows: Dict[TasmotaDevice, int] = {}
 
         self.devices_short_version = self.settings.value("devices_short_version", True, bool)
 
+        # changed cells are collected and repainted at most `refresh_rate` times per second
+        self.dirty: Dict[int, Set[int]] = {}
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.timeout.connect(self.flush_changes)
+        self.set_refresh_rate(
+            self.settings.value("devices_refresh_rate", DEFAULT_REFRESH_RATE, int)
+        )
+
         for d in self.tasmota_env.devices:
             d.property_changed = self.notify_change
             d.module_changed = self.module_change
+        self.update_rows()
+
+    def set_refresh_rate(self, rate: int):
+        self.refresh_rate = max(0, rate)
+        if self.refresh_rate:
+            self.refresh_timer.setInterval(1000 // self.refresh_rate)
 
     def setupColumns(self, columns):
         self.beginResetModel()
+        self.dirty.clear()
         self.columns = columns
+        self.column_index = {column: col for col, column in enumerate(columns)}
+        self.trend_paths = {
+            col: path for col, column in enumerate(columns) if (path := trend_path(column))
+        }
         self.endResetModel()
 
+    def update_rows(self, start: int = 0):
+        devices = self.tasmota_env.devices
+        for row in range(start, len(devices)):
+            self.rows[devices[row]] = row
+
     def deviceAtRow(self, row):
         if len(self.tasmota_env.devices) > 0:
             return self.tasmota_env.devices[row]
         return None
 
-    def notify_change(self, d, key):
-        row = self.tasmota_env.devices.index(d)
-
-        if any(
-            [
-                key.startswith("POWER"),
-                key.startswith("FriendlyName"),
-                key in ("RSSI", "LWT", "Color", "HSBColor", "IPAddress", "Gateway", "Ethernet"),
-                key.startswith("Channel"),
-                key.startswith("Dimmer"),
-                key.startswith("ShutterRelay"),
-                key.startswith("Shutter"),
-            ]
-        ):
-            device_name_idx = self.columns.index("Device")
-            idx = self.index(row, device_name_idx)
-            self.dataChanged.emit(idx, idx)
-
-        elif key in self.columns:
-            col = self.columns.index(key)
-            idx = self.index(row, col)
-            self.dataChanged.emit(idx, idx)
+    def notify_change(self, d, keys):
+        row = self.rows[d]
+
+        cols = set()
+        for key in keys:
+            if is_device_column_key(key) and (col := self.column_index.get("Device")) is not None:
+                cols.add(col)
+
+            if (col := self.column_index.get(key)) is not None:
+                cols.add(col)
+
+            if key in SENSOR_KEYS:
+                cols.update(self.trend_paths)
+
+        if cols:
+            self.dirty.setdefault(row, set()).update(cols)
+            if not self.refresh_rate:
+                self.flush_changes()
+            elif not self.refresh_timer.isActive():
+                self.refresh_timer.start()
+
+    def flush_changes(self):
+        if dirty := self.dirty:
+            self.dirty = {}
+            for top, left, bottom, right in dirty_ranges(dirty):
+                self.dataChanged.emit(self.index(top, left), self.index(bottom, right))
+            self.refreshed.emit()
 
     def module_change(self, d):
-        self.notify_change(d, "Module")
+        self.notify_change(d, {"Module"})
 
     def columnCount(self, parent=None):
         return len(self.columns)
@@ -68,6 +141,8 @@ class TasmotaDevicesModel(QAbstractTableModel):
 
     def headerData(self, col, orientation, role=Qt.DisplayRole):
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            if path := self.trend_paths.get(col):
+                return f"{path[-1]} trend"
             return self.columns[col]
 
     def data(self, idx, role=Qt.DisplayRole):
@@ -77,6 +152,16 @@ class TasmotaDevicesModel(QAbstractTableModel):
 
             val = d.p.get(col_name, "")
 
+            if (path := self.trend_paths.get(idx.column())) and role in (
+                Qt.DisplayRole,
+                Qt.EditRole,
+                DeviceRoles.HistoryRole,
+            ):
+                series = self.tasmota_env.history.get(d, path)
+                if role == DeviceRoles.HistoryRole:
+                    return series
+                return series.last() if series else None
+
             if role in [Qt.DisplayRole, Qt.EditRole]:
                 if col_name == "Device":
                     return d.name
@@ -213,16 +298,22 @@ class TasmotaDevicesModel(QAbstractTableModel):
                     return "\n".join(fns)
 
     def addDevice(self, device):
-        self.beginInsertRows(QModelIndex(), 0, 0)
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.tasmota_env.add_device(device)
+        self.rows[device] = row
         device.property_changed = self.notify_change
         device.module_changed = self.module_change
         self.endInsertRows()
 
     def removeRows(self, pos, rows, parent=QModelIndex()):
         if pos + rows <= self.rowCount():
+            self.flush_changes()
             self.beginRemoveRows(parent, pos, pos + rows - 1)
             device = self.deviceAtRow(pos)
-            self.tasmota_env.devices.pop(self.tasmota_env.devices.index(device))
+            self.tasmota_env.remove_device(device)
+            del self.rows[device]
+            self.update_rows(pos)
 
             topic = device.p["Topic"]
             self.settings.beginGroup("Devices")
@@ -242,4 +333,4 @@ class TasmotaDevicesModel(QAbstractTableModel):
         self.removeRows(row, 1)
 
     def columnIndex(self, column):
-        return self.columns.index(column)
+        return self.column_index[column]
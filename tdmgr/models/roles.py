@@ -17,3 +17,4 @@ class DeviceRoles(int, Enum):
     IPAddressRole = auto()
     GatewayRole = auto()
     IsEthernetRole = auto()
+    HistoryRole = auto()
@@ -3,13 +3,30 @@ import logging
 import re
 import socket
 import ssl
+from abc import ABC, abstractmethod
+from collections import deque
 from datetime import datetime
 from functools import lru_cache
 from json import JSONDecodeError
-from typing import Match, Union
+from time import monotonic, perf_counter
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Match,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
 
 import paho.mqtt.client as mqtt
-from PyQt5.QtCore import QObject, pyqtProperty, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import QObject, QTimer, pyqtProperty, pyqtSignal, pyqtSlot
+
+from tdmgr.profiling import profiler
 
 log = logging.getLogger(__name__)
 
@@ -17,6 +34,11 @@ MQTT_PATH_REGEX = "[^+#*>$/]+"  # all symbols accepted except forbidden by MQTT
 
 DEFAULT_PREFIXES = ["tele", "stat"]
 
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_BATCH_LATENCY = 50  # ms
+
+DEFAULT_LOG_SIZE = 1000  # messages kept per device for the console
+
 DEFAULT_PATTERNS = [
     "%prefix%/%topic%/",  # = %prefix%/%topic% (Tasmota default)
     "%topic%/%prefix%/",  # = %topic%/%prefix% (Tasmota with SetOption19 enabled for
@@ -57,17 +79,39 @@ def expand_fulltopic(fulltopic):
 
 
 class Message:
+    """A received MQTT message.
+
+    The payload is decoded once, endpoint, first key and JSON are computed on first access and
+    cached on the instance, so messages nobody looks into are never JSON-decoded.
+    """
+
+    __slots__ = (
+        "topic",
+        "prefix",
+        "payload",
+        "retained",
+        "timestamp",
+        "_endpoint",
+        "_dict",
+        "_first_key",
+        "__weakref__",
+    )
+
     def __init__(self, topic: str, payload: bytes = b"", retained: bool = False, **kwargs):
         self.topic: str = topic
         self.prefix: str = kwargs.get("prefix", "")
         self.payload: str = payload.decode("utf-8")
         self.retained: bool = retained
-        self.payload: Union[dict, str]
         self.timestamp: datetime = datetime.now()
+        self._endpoint: Optional[str] = None
+        self._dict: Optional[dict] = None
+        self._first_key: Optional[str] = None
 
     @property
     def endpoint(self) -> str:
-        return self.topic.split("/")[-1]
+        if self._endpoint is None:
+            self._endpoint = self.topic.rpartition("/")[2]
+        return self._endpoint
 
     @property
     def is_lwt(self) -> bool:
@@ -79,32 +123,153 @@ class Message:
 
     @property
     def first_key(self) -> str:
-        return next(iter(self.dict().keys())) if self.dict() else ""
+        if self._first_key is None:
+            self._first_key = next(iter(self.dict()), "")
+        return self._first_key
 
-    @lru_cache
     def dict(self) -> dict:
-        if self.payload.startswith("{"):
-            try:
-                return json.loads(self.payload)
-            except JSONDecodeError as e:
-                log.critical("Cannot parse %s: %s (%s)", self.endpoint, self.payload, e)
-        return {}
+        if self._dict is None:
+            self._dict = {}
+            if self.payload.startswith("{"):
+                try:
+                    self._dict = json.loads(self.payload)
+                except JSONDecodeError as e:
+                    log.critical("Cannot parse %s: %s (%s)", self.endpoint, self.payload, e)
+        return self._dict
 
     def match_fulltopic(self, pattern: str) -> Union[Match, None]:
-        _replaced_pattern = (
-            pattern.replace("+", f"({MQTT_PATH_REGEX})")
-            .replace("%topic%", f"(?P<topic>{MQTT_PATH_REGEX})")
-            .replace("%prefix%", f"(?P<prefix>{MQTT_PATH_REGEX})")
-        )
-        _match = re.fullmatch(
-            f"^{_replaced_pattern}{MQTT_PATH_REGEX}$",
-            self.topic,
-        )
+        _match = compile_fulltopic_pattern(pattern).fullmatch(self.topic)
         if _match:
             self.prefix = _match.groupdict()["prefix"]
         return _match
 
 
+class LogEntry(NamedTuple):
+    timestamp: datetime
+    topic: str
+    payload: str
+
+
+class MessageLog:
+    """The latest messages of a device, older ones are dropped once `size` is reached.
+
+    Entries are numbered by `total`, the count of all messages ever appended, so readers can tell
+    which messages are new and which were dropped since they last looked.
+    """
+
+    def __init__(self, size: int = DEFAULT_LOG_SIZE):
+        self.entries: Deque[LogEntry] = deque(maxlen=size)
+        self.total = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def size(self) -> int:
+        return self.entries.maxlen
+
+    @property
+    def first(self) -> int:
+        """Number of the oldest entry kept."""
+        return self.total - len(self.entries)
+
+    def get(self, number: int) -> Optional[LogEntry]:
+        if self.first <= number < self.total:
+            return self.entries[number - self.first]
+        return None
+
+    def append(self, msg: Message):
+        self.entries.append(LogEntry(msg.timestamp, msg.topic, msg.payload))
+        self.total += 1
+
+    def resize(self, size: int):
+        self.entries = deque(self.entries, maxlen=size)
+
+
+@lru_cache(maxsize=256)
+def compile_fulltopic_pattern(pattern: str) -> Pattern:
+    _replaced_pattern = (
+        pattern.replace("+", f"({MQTT_PATH_REGEX})")
+        .replace("%topic%", f"(?P<topic>{MQTT_PATH_REGEX})")
+        .replace("%prefix%", f"(?P<prefix>{MQTT_PATH_REGEX})")
+    )
+    return re.compile(f"^{_replaced_pattern}{MQTT_PATH_REGEX}$")
+
+
+class FullTopicPatterns:
+    """Registry of compiled FullTopic patterns used by the legacy discovery.
+
+    Every wildcard in a pattern matches exactly one topic level, so patterns are bucketed by the
+    number of levels they match. A topic is tried against each compiled pattern of its bucket in
+    turn, not in a single pass: all matching patterns are needed (each one gets a FullTopic
+    probe), which one alternation can't report, and a combined regex of lookaheads or a walk over
+    a tree of topic levels were both slower in CPython than a few compiled regexes.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns: List[str] = []
+        self.buckets: Dict[int, List[Pattern]] = {}
+        self.set_patterns(patterns)
+
+    def set_patterns(self, patterns: Iterable[str]):
+        self.patterns = list(dict.fromkeys(patterns))
+        self.buckets.clear()
+        for pattern in self.patterns:
+            levels = pattern.count("/") + 1
+            self.buckets.setdefault(levels, []).append(compile_fulltopic_pattern(pattern))
+
+    def match(self, topic: str) -> List[Match]:
+        return [
+            _match
+            for _pattern in self.buckets.get(topic.count("/") + 1, ())
+            if (_match := _pattern.fullmatch(topic))
+        ]
+
+
+class MqttTransport(ABC):
+    """Connection to a broker used by MqttClient.
+
+    The interface is the subset of the paho Client API MqttClient relies on, callbacks are called
+    with paho's signatures and may be called from any thread. Subclasses must implement connect,
+    disconnect, subscribe and publish, the other methods are optional.
+    """
+
+    on_connect: Optional[Callable] = None  # (client, userdata, flags, rc)
+    on_message: Optional[Callable] = None  # (client, userdata, message)
+    on_disconnect: Optional[Callable] = None  # (client, userdata, rc)
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def tls_set(self, ca_certs=None, tls_version=None):
+        pass
+
+    def tls_insecure_set(self, value: bool):
+        pass
+
+    @abstractmethod
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60): ...
+
+    @abstractmethod
+    def disconnect(self): ...
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    @abstractmethod
+    def subscribe(self, topic: Union[str, List[Tuple[str, int]]], qos: int = 0): ...
+
+    @abstractmethod
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False): ...
+
+
+class PahoTransport(mqtt.Client, MqttTransport):
+    """Transport over a network broker, paho runs its network loop in a background thread."""
+
+
 class MqttClient(QObject):
     Disconnected = 0
     Connecting = 1
@@ -127,7 +292,7 @@ class MqttClient(QObject):
 
     messageSignal = pyqtSignal(Message)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, transport: Optional[MqttTransport] = None):
         super(MqttClient, self).__init__(parent)
 
         self.m_hostname = ""
@@ -143,7 +308,21 @@ class MqttClient(QObject):
 
         self.m_state = MqttClient.Disconnected
 
-        self.m_client = mqtt.Client(
+        # batched delivery: the paho thread only appends to the deque (append/popleft are
+        # thread-safe), the GUI thread drains it on a timer
+        self.m_batching = False
+        self.m_batch_size = DEFAULT_BATCH_SIZE
+        self.m_batch_latency = DEFAULT_BATCH_LATENCY
+        self.pending: Deque[Message] = deque()
+
+        # message counters, sampled by the performance monitor
+        self.received = 0
+        self.sent = 0
+
+        self.batch_timer = QTimer(self)
+        self.batch_timer.timeout.connect(self.drain)
+
+        self.m_client = transport or PahoTransport(
             clean_session=self.m_cleanSession, protocol=self.protocolVersion
         )
 
@@ -221,6 +400,41 @@ class MqttClient(QObject):
             self.m_protocolVersion = protocolVersion
             self.protocolVersionChanged.emit(protocolVersion)
 
+    def setBatching(
+        self,
+        enabled: bool,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        latency: int = DEFAULT_BATCH_LATENCY,
+    ):
+        """Deliver messages to the GUI thread in batches of up to `batch_size` every `latency` ms.
+
+        Each drain is also limited to half of `latency`, whatever is left waits for the next
+        timer tick, so a message storm can't block the event loop.
+        """
+        self.m_batch_size = max(1, batch_size)
+        self.m_batch_latency = max(1, latency)
+        self.m_batching = enabled
+
+        if enabled:
+            self.batch_timer.start(self.m_batch_latency)
+        else:
+            self.batch_timer.stop()
+            self.drain(flush=True)
+
+    @pyqtSlot()
+    def drain(self, flush: bool = False):
+        if flush:
+            # the network thread may still append until it sees batching is off
+            while self.pending:
+                self.dispatch(self.pending.popleft())
+            return
+
+        deadline = monotonic() + self.m_batch_latency / 2000
+        for _ in range(min(len(self.pending), self.m_batch_size)):
+            self.dispatch(self.pending.popleft())
+            if monotonic() > deadline:
+                break
+
     #################################################################
     @pyqtSlot()
     def connectToHost(self):
@@ -265,17 +479,30 @@ class MqttClient(QObject):
             self.m_client.subscribe(path)
             log.info("Subscribed to %s", ", ".join([p[0] for p in path]))
 
+    def dispatch(self, message: Message):
+        if profiler.enabled:
+            started = perf_counter()
+            self.messageSignal.emit(message)
+            profiler.record("dispatch", "messageSignal", perf_counter() - started)
+        else:
+            self.messageSignal.emit(message)
+
     @pyqtSlot(str, str)
     def publish(self, topic, payload=None, qos=0, retain=False):
         if self.state == MqttClient.Connected:
             self.m_client.publish(topic, payload, qos, retain)
+            self.sent += 1
 
     #################################################################
     # callbacks
     def on_message(self, mqttc, obj, msg):
+        self.received += 1
         try:
             message = Message(msg.topic, msg.payload, msg.retain)
-            self.messageSignal.emit(message)
+            if self.m_batching:
+                self.pending.append(message)
+            else:
+                self.dispatch(message)
         except UnicodeDecodeError as e:
             log.error("MESSAGE DECODE ERROR: %s (%s=%s)", e, msg.topic, msg.payload.__repr__())
 
@@ -0,0 +1,134 @@
+"""Timing counters for the message processing hot paths.
+
+Disabled by default, `tdmgr.run --profile` enables the module-level `profiler`. Instrumented code
+checks `profiler.enabled` before taking timestamps, so it costs one attribute lookup when off.
+
+    if profiler.enabled:
+        started = perf_counter()
+        ...
+        profiler.record("schema", "StateSchema", perf_counter() - started)
+"""
+
+import json
+import os
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+DEFAULT_SAMPLES = 1024  # kept per counter for percentiles
+
+
+def current_rss() -> Optional[float]:
+    """Resident set size of the process in MiB, None where it can't be read cheaply."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RingBuffer:
+    """Fixed size buffer of floats, the oldest value is overwritten once it's full."""
+
+    __slots__ = ("data", "size", "pos", "count")
+
+    def __init__(self, size: int = DEFAULT_SAMPLES):
+        self.data = array("d", bytes(8 * size))
+        self.size = size
+        self.pos = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[float]:
+        """Values from the oldest to the newest."""
+        if self.count < self.size:
+            yield from self.data[: self.count]
+        else:
+            yield from self.data[self.pos :]
+            yield from self.data[: self.pos]
+
+    def append(self, value: float):
+        self.data[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def last(self) -> float:
+        return self.data[self.pos - 1] if self.count else 0.0
+
+    def clear(self):
+        self.pos = self.count = 0
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Counter:
+    """Call count and total time of one instrumented path, with the latest samples."""
+
+    __slots__ = ("calls", "total", "max", "samples")
+
+    def __init__(self, samples: int = DEFAULT_SAMPLES):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = RingBuffer(samples)
+
+    def record(self, seconds: float):
+        self.calls += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        """Call count, total in ms; mean, percentiles of the latest samples and max in µs."""
+        ordered = sorted(self.samples)
+        return {
+            "calls": self.calls,
+            "total_ms": self.total * 1e3,
+            "mean_us": self.total / self.calls * 1e6 if self.calls else 0.0,
+            "p50_us": percentile(ordered, 50) * 1e6,
+            "p90_us": percentile(ordered, 90) * 1e6,
+            "p99_us": percentile(ordered, 99) * 1e6,
+            "max_us": self.max * 1e6,
+        }
+
+
+class Profiler:
+    """Counters grouped by category (schema, endpoint, dispatch...) and name."""
+
+    def __init__(self, samples: int = DEFAULT_SAMPLES):
+        self.enabled = False
+        self.samples = samples
+        self.counters: Dict[Tuple[str, str], Counter] = {}
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def record(self, category: str, name: str, seconds: float):
+        if not (counter := self.counters.get((category, name))):
+            counter = self.counters[(category, name)] = Counter(self.samples)
+        counter.record(seconds)
+
+    def reset(self):
+        self.counters.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """category -> name -> counter summary, names ordered by total time."""
+        result: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (category, name), counter in sorted(
+            self.counters.items(), key=lambda item: (item[0][0], -item[1].total)
+        ):
+            result.setdefault(category, {})[name] = counter.summary()
+        return result
+
+    def export(self, path: Union[str, Path]):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+profiler = Profiler()
@@ -0,0 +1,220 @@
+"""Known devices, kept between sessions.
+
+Entries are keyed by MAC address like the groups of the former devices INI file
+("AA-BB-CC-DD-EE-FF") and hold the topic, full topic, device name, debug flag and command history
+of a device.
+
+They're stored as a JSON snapshot plus a journal of changes, one JSON line per changed or removed
+entry, which is replayed over the snapshot when loading. Changed entries are appended to the
+journal as they're flushed, so a crash loses at most the changes since the last flush. The journal
+is folded into a new snapshot once it's longer than JOURNAL_LIMIT lines and on close.
+
+Flushing only collects the changed entries, the files are written and synced in order by a
+writer thread, so slow storage doesn't block the caller.
+
+An unreadable snapshot is moved to `<path>.corrupt` and the devices INI file is migrated again,
+invalid journal lines are skipped.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+log = logging.getLogger(__name__)
+
+REGISTRY_VERSION = 1
+JOURNAL_LIMIT = 1000  # lines
+FLUSH_INTERVAL = 5000  # ms
+MAX_HISTORY = 25  # commands
+
+Entry = Dict[str, object]
+
+
+def registry_path(devices) -> str:
+    """devices.json next to the devices INI file (a QSettings)."""
+    return f"{os.path.splitext(devices.fileName())[0]}.json"
+
+
+def device_entry(device) -> Entry:
+    return {
+        "topic": device.p["Topic"],
+        "full_topic": device.p["FullTopic"],
+        "device_name": device.name,
+        "debug": device.debug,
+        "history": device.history[:MAX_HISTORY],
+    }
+
+
+class DeviceRegistry:
+    def __init__(self, path: str):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.entries: Dict[str, Entry] = {}
+        self.dirty: Set[str] = set()
+        self.journal_lines = 0
+        self.journal = None  # only used by the writer thread
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="registry")
+        self.pending: Optional[Future] = None
+        self.damaged = False  # the snapshot is unreadable and stays in place
+        self.load()
+
+    @property
+    def exists(self) -> bool:
+        """Whether there's a snapshot, devices only found in the journal are migrated too."""
+        return os.path.exists(self.path)
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    entries = json.load(f)["devices"]
+                if not isinstance(entries, dict):
+                    raise ValueError("devices is not an object")
+                self.entries = entries
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.set_aside(e)
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                        mac = change.pop("mac")
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        # torn by a crash while writing, or not written by us
+                        log.warning("REGISTRY: skipped an invalid journal entry")
+                        continue
+                    self.journal_lines += 1
+                    if change.get("removed"):
+                        self.entries.pop(mac, None)
+                    else:
+                        self.entries[mac] = change
+
+    def set_aside(self, error: Exception):
+        """Move an unreadable snapshot out of the way, so it's never compacted over."""
+        corrupt_path = f"{self.path}.corrupt"
+        try:
+            os.replace(self.path, corrupt_path)
+        except OSError as e:
+            log.error("REGISTRY: can't read %s (%s) nor move it aside: %s", self.path, error, e)
+            self.damaged = True
+        else:
+            log.error("REGISTRY: can't read %s, moved to %s: %s", self.path, corrupt_path, error)
+
+    def migrate(self, devices) -> int:
+        """Import the entries of the devices INI file (a QSettings), the file is left as is.
+
+        Devices already known from the journal are kept, their entries are newer.
+        """
+        for mac in devices.childGroups():
+            if mac in self.entries:
+                continue
+            devices.beginGroup(mac)
+            devices.beginGroup("history")
+            history = [devices.value(k) for k in devices.childKeys()]
+            devices.endGroup()
+            self.update(
+                mac,
+                {
+                    "topic": devices.value("topic"),
+                    "full_topic": devices.value("full_topic"),
+                    "device_name": devices.value("device_name"),
+                    "debug": devices.value("debug", False, bool),
+                    "history": history,
+                },
+            )
+            devices.endGroup()
+        self.compact()
+        log.info("REGISTRY: migrated %d devices from %s", len(self.entries), devices.fileName())
+        return len(self.entries)
+
+    def get(self, mac: str) -> Optional[Entry]:
+        return self.entries.get(mac)
+
+    def update(self, mac: str, entry: Entry):
+        if self.entries.get(mac) != entry:
+            self.entries[mac] = entry
+            self.dirty.add(mac)
+
+    def remove(self, mac: str):
+        if self.entries.pop(mac, None) is not None:
+            self.dirty.add(mac)
+
+    def flush(self) -> Optional[Future]:
+        """Hand the changed entries to the writer thread, which appends them to the journal."""
+        if not self.dirty:
+            return None
+        lines: List[str] = []
+        for mac in sorted(self.dirty):
+            if (entry := self.entries.get(mac)) is None:
+                lines.append(json.dumps({"mac": mac, "removed": True}))
+            else:
+                lines.append(json.dumps({"mac": mac, **entry}))
+        self.dirty.clear()
+
+        self.pending = self.writer.submit(self.write_journal, lines)
+        self.journal_lines += len(lines)
+        if self.journal_lines > JOURNAL_LIMIT:
+            self.compact()
+        return self.pending
+
+    sync = flush  # as QSettings.sync, called by the devices model
+
+    def compact(self):
+        """Have the writer thread write all entries to a new snapshot and start an empty journal."""
+        if self.damaged:
+            log.warning(
+                "REGISTRY: not replacing the unreadable %s, changes stay journaled", self.path
+            )
+            return
+        self.dirty.clear()
+        # entries are replaced, never changed in place, so a shallow copy is a consistent snapshot
+        self.pending = self.writer.submit(self.write_snapshot, dict(self.entries))
+        self.journal_lines = 0
+
+    def wait(self):
+        """Block until the writer thread has written everything handed to it so far."""
+        if self.pending:
+            self.pending.result()
+
+    def write_journal(self, lines: List[str]):
+        try:
+            if self.journal is None:
+                self.journal = open(self.journal_path, "a", encoding="utf-8")
+            self.journal.write("\n".join(lines) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+        except OSError as e:
+            log.error("REGISTRY: can't write %s: %s", self.journal_path, e)
+
+    def write_snapshot(self, entries: Dict[str, Entry]):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": REGISTRY_VERSION, "devices": entries}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # the journal stays, it still has the changes
+            log.error("REGISTRY: can't write %s: %s", self.path, e)
+            return
+
+        self.close_journal()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def close(self):
+        if self.damaged:
+            self.flush()
+        elif self.dirty or self.journal_lines or not os.path.exists(self.path):
+            self.compact()
+        self.writer.submit(self.close_journal)
+        self.writer.shutdown(wait=True)
@@ -4,13 +4,16 @@ import logging
 import os
 import pathlib
 import sys
+import tempfile
 from logging.handlers import TimedRotatingFileHandler
 
 from PyQt5.QtCore import QDir, QSettings
 from PyQt5.QtWidgets import QApplication
 
-from tdmgr.GUI import icons  # noqa: F401
 from tdmgr.GUI.dialogs.main import MainWindow
+from tdmgr.GUI.resources import register_resources
+from tdmgr.loopback import LoopbackTransport
+from tdmgr.profiling import profiler
 
 try:
     from tdmgr._version import version
@@ -67,28 +70,51 @@ def setup_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument("--config-location", type=pathlib.Path)
     parser.add_argument("--log-location", type=pathlib.Path)
+    parser.add_argument(
+        "--loopback",
+        type=int,
+        metavar="DEVICES",
+        help="Simulate DEVICES devices with an in-process broker instead of connecting to one",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        metavar="FILE",
+        help="Collect message processing timings, shown in View > Profiler and saved to FILE on exit",
+    )
     return parser
 
 
 def start() -> None:
     parser = setup_parser()
     args = parser.parse_args()
+    if args.loopback and not (args.local or args.config_location):
+        # keep simulated devices out of the user's configuration
+        args.config_location = pathlib.Path(tempfile.mkdtemp(prefix="tdm-loopback-"))
     configure_logging(args)
+    if args.profile is not None:
+        profiler.enable()
 
     try:
         app = QApplication(sys.argv)
+        register_resources()
         app.lastWindowClosed.connect(app.quit)
         app.setStyle("Fusion")
 
         settings, devices = get_settings(args, "tdm"), get_settings(args, "devices")
-        MW = MainWindow(version, settings, devices, args.debug)
+        transport = LoopbackTransport.with_devices(args.loopback) if args.loopback else None
+        MW = MainWindow(version, settings, devices, args.debug, transport=transport)
         MW.show()
         app.processEvents()
 
-        if settings.value("connect_on_startup", False, bool):
+        if transport or settings.value("connect_on_startup", False, bool):
             MW.mqtt_connect()
 
-        sys.exit(app.exec_())
+        exit_code = app.exec_()
+        if args.profile:
+            profiler.export(args.profile)
+        sys.exit(exit_code)
 
     except Exception as e:  # noqa: 722
         logging.exception("EXCEPTION: %s", e)
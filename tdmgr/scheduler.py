@@ -0,0 +1,327 @@
+import heapq
+import random
+from collections import deque
+from enum import IntEnum
+from itertools import count
+from time import monotonic
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from PyQt5.QtCore import QObject, QTimer
+
+DEFAULT_PUBLISH_RATE = 20  # messages/s for all devices
+DEFAULT_PUBLISH_BURST = 50
+DEFAULT_DEVICE_RATE = 2  # messages/s to a single device
+DEFAULT_DEVICE_BURST = 4
+DEFAULT_INTERVAL = 50  # ms
+
+DEFAULT_POLL_PERIOD = 5000  # ms
+DEFAULT_POLL_JITTER = 0.1  # fraction of the period
+POLL_INTERVAL = 100  # ms
+MAX_BACKOFF = 8
+ADAPT_TICKS = 10  # consecutive congested or idle ticks before the backoff changes
+MAX_QUEUE_DEPTH = 100  # pending publishes before polling backs off
+MAX_INBOUND_BACKLOG = 1000  # received messages waiting for the GUI thread
+
+
+class Priority(IntEnum):
+    USER = 0  # commands from dialogs opened by the user
+    QUERY = 1  # initial queries, discovery probes
+    POLL = 2  # periodic telemetry
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average and bursts of up to `capacity` events."""
+
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = monotonic() if now is None else now
+
+    def refill(self, now: float) -> float:
+        if now > self.stamp:
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+        return self.tokens
+
+    def take(self, now: float) -> bool:
+        if self.refill(now) >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class PendingPublish:
+    __slots__ = ("topic", "payload", "priority", "queued")
+
+    def __init__(self, topic: str, payload: str, priority: Priority, queued: float):
+        self.topic = topic
+        self.payload = payload
+        self.priority = priority
+        self.queued = queued
+
+    @property
+    def device_key(self) -> str:
+        # cmnd/<topic>/<command> -> cmnd/<topic>, the same for all commands sent to one device
+        return self.topic.rpartition("/")[0]
+
+
+class PublishScheduler(QObject):
+    """Rate limited queue of MQTT publishes.
+
+    Messages are sent in priority order, each publish takes a token from the global and from the
+    target device bucket, so a burst of queries is spread over time instead of hitting the broker
+    and the devices at once. A message identical to one already pending is dropped.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, str], None],
+        rate: float = DEFAULT_PUBLISH_RATE,
+        burst: float = DEFAULT_PUBLISH_BURST,
+        device_rate: float = DEFAULT_DEVICE_RATE,
+        device_burst: float = DEFAULT_DEVICE_BURST,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.publish = publish
+        self.queues: List[Deque[PendingPublish]] = [deque() for _ in Priority]
+        self.pending: Set[Tuple[str, str]] = set()
+
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.bucket = TokenBucket(rate, burst)
+        self.device_buckets: Dict[str, TokenBucket] = {}
+
+        # metrics
+        self.sent = 0
+        self.deduplicated = 0
+        self.wait_last = 0.0
+        self.wait_avg = 0.0
+        self.wait_max = 0.0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(DEFAULT_INTERVAL)
+        self.timer.timeout.connect(self.drain)
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for queue in self.queues:
+            for item in queue:
+                yield item.topic, item.payload
+
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        self.bucket.rate = max(0.1, rate)
+        self.bucket.capacity = max(1.0, burst if burst is not None else rate)
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def enqueue(self, topic: str, payload="", priority: Priority = Priority.QUERY) -> bool:
+        """Queue a publish, returns False if an identical one is already pending."""
+        payload = str(payload)
+        if (topic, payload) in self.pending:
+            self.deduplicated += 1
+            return False
+
+        self.pending.add((topic, payload))
+        self.queues[priority].append(PendingPublish(topic, payload, priority, monotonic()))
+        return True
+
+    def append(self, item: Tuple[str, str]):
+        """List-like shortcut for `enqueue(topic, payload)`."""
+        self.enqueue(*item)
+
+    def clear(self):
+        for queue in self.queues:
+            queue.clear()
+        self.pending.clear()
+
+    def drain(self, now: Optional[float] = None) -> int:
+        """Publish as many pending messages as the buckets allow, returns the number sent."""
+        now = monotonic() if now is None else now
+        sent = 0
+
+        for queue in self.queues:
+            # messages to devices without tokens keep their place for the next drain
+            blocked = []
+            while queue and self.bucket.refill(now) >= 1:
+                item = queue.popleft()
+                key = item.device_key
+                if not (bucket := self.device_buckets.get(key)):
+                    bucket = self.device_buckets[key] = TokenBucket(
+                        self.device_rate, self.device_burst, now
+                    )
+
+                if not bucket.take(now):
+                    blocked.append(item)
+                    continue
+
+                self.bucket.take(now)
+                self.pending.discard((item.topic, item.payload))
+                self.publish(item.topic, item.payload)
+                self.record_wait(now - item.queued)
+                sent += 1
+
+            queue.extendleft(reversed(blocked))
+
+        if not self.pending:
+            # buckets which refilled completely carry no rate state any more
+            for key in [k for k, b in self.device_buckets.items() if b.refill(now) >= b.capacity]:
+                del self.device_buckets[key]
+        return sent
+
+    def record_wait(self, wait: float):
+        self.sent += 1
+        self.wait_last = wait
+        self.wait_max = max(self.wait_max, wait)
+        self.wait_avg = wait if self.sent == 1 else self.wait_avg * 0.9 + wait * 0.1
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "depth": len(self),
+            **{f"depth_{p.name.lower()}": len(self.queues[p]) for p in Priority},
+            "sent": self.sent,
+            "deduplicated": self.deduplicated,
+            "wait_last": self.wait_last,
+            "wait_avg": self.wait_avg,
+            "wait_max": self.wait_max,
+        }
+
+
+class TelemetryPoller(QObject):
+    """Request telemetry from online devices once per period, spread evenly over the period.
+
+    Every device has its own due time, shifted by a random jitter after each poll so devices
+    don't align again. Devices which are offline, sent sensor data within the period or are left
+    out by the `demand` callback (when set) are not polled. While publishes or received messages
+    pile up the period is stretched, up to MAX_BACKOFF times, and shortened again once the backlog
+    is gone. Either takes ADAPT_TICKS ticks in a row and happens at most once per base period, so
+    short bursts don't make the period swing.
+    """
+
+    def __init__(
+        self,
+        env,
+        scheduler: PublishScheduler,
+        backlog: Callable[[], int] = lambda: 0,
+        period: int = DEFAULT_POLL_PERIOD,
+        jitter: float = DEFAULT_POLL_JITTER,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.env = env
+        self.scheduler = scheduler
+        self.backlog = backlog
+        self.period = period / 1000
+        self.jitter = min(0.5, jitter)
+        self.backoff = 1
+        self.congested = 0  # ticks in a row
+        self.idle = 0
+        self.adapted = float("-inf")
+        # when set, only the devices it returns are polled
+        self.demand: Optional[Callable[[], Set[object]]] = None
+
+        self.due: Dict[object, float] = {}
+        self.heap: List[Tuple[float, int, object]] = []
+        self._seq = count()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(POLL_INTERVAL)
+        self.timer.timeout.connect(self.tick)
+
+    @property
+    def effective_period(self) -> float:
+        return self.period * self.backoff
+
+    def set_period(self, period: int):
+        self.period = period / 1000
+        if self.timer.isActive():
+            self.reschedule()
+
+    def start(self):
+        self.reschedule()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.due.clear()
+        self.heap.clear()
+
+    def schedule(self, device, due: float):
+        self.due[device] = due
+        heapq.heappush(self.heap, (due, next(self._seq), device))
+
+    def reschedule(self, now: Optional[float] = None):
+        """Spread all devices evenly over one period, starting now."""
+        now = monotonic() if now is None else now
+        self.due.clear()
+        self.heap.clear()
+        devices = self.env.devices
+        step = self.period / max(1, len(devices))
+        for idx, device in enumerate(devices):
+            self.schedule(device, now + idx * step + random.uniform(0, step * self.jitter))
+
+    def sync(self, now: float):
+        devices = self.env.devices
+        # devices are only ever appended, a new one is always the last
+        if len(devices) == len(self.due) and (not devices or devices[-1] in self.due):
+            return
+        # entries of removed devices are dropped from the heap as they come up
+        for device in set(self.due).difference(devices):
+            del self.due[device]
+        for device in devices:
+            if device not in self.due:
+                self.schedule(device, now + random.uniform(0, self.period))
+
+    def adapt(self, now: float):
+        if len(self.scheduler) > MAX_QUEUE_DEPTH or self.backlog() > MAX_INBOUND_BACKLOG:
+            self.congested, self.idle = self.congested + 1, 0
+        elif not len(self.scheduler):
+            self.congested, self.idle = 0, self.idle + 1
+        else:  # draining
+            self.congested = self.idle = 0
+
+        if now - self.adapted < self.period:
+            return
+        if self.congested >= ADAPT_TICKS and self.backoff < MAX_BACKOFF:
+            self.backoff *= 2
+            self.congested, self.adapted = 0, now
+        elif self.idle >= ADAPT_TICKS and self.backoff > 1:
+            self.backoff //= 2
+            self.idle, self.adapted = 0, now
+
+    def tick(self, now: Optional[float] = None) -> int:
+        """Poll the devices which are due, returns the number of requests queued."""
+        now = monotonic() if now is None else now
+        self.sync(now)
+        self.adapt(now)
+
+        period = self.effective_period
+        polled = 0
+        wanted = None
+        while self.heap and self.heap[0][0] <= now:
+            due, _, device = heapq.heappop(self.heap)
+            if self.due.get(device) != due:
+                continue
+
+            if self.demand and wanted is None:
+                wanted = self.demand()
+
+            jitter = random.uniform(-self.jitter, self.jitter) * period
+            if not device.online or wanted is not None and device not in wanted:
+                self.schedule(device, now + period + jitter)
+            elif device.sensor_updated is not None and now - device.sensor_updated < period:
+                self.schedule(device, device.sensor_updated + period + abs(jitter))
+            else:
+                self.scheduler.enqueue(device.cmnd_topic("STATUS"), 8, Priority.POLL)
+                self.schedule(device, now + period + jitter)
+                polled += 1
+        return polled
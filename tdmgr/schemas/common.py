@@ -1,6 +1,19 @@
 from enum import Enum
+from typing import Hashable
 
 
 class OnOffEnum(str, Enum):
     ON = "ON"
     OFF = "OFF"
+
+
+def payload_shape(value) -> Hashable:
+    """Keys and value types of a decoded JSON payload, nested dicts included.
+
+    Two payloads with the same shape validate the same way against a schema, whatever the values.
+    """
+    if isinstance(value, dict):
+        return tuple((k, payload_shape(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return list, *map(payload_shape, value)
+    return type(value)
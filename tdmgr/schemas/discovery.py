@@ -3,7 +3,7 @@ from enum import Enum
 from ipaddress import IPv4Address
 from typing import Dict, List, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 TopicPrefixes = namedtuple("TopicPrefixes", "cmnd, stat, tele")
 
@@ -18,6 +18,8 @@ class LightType(int, Enum):
 
 
 class DiscoverySchema(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     ip: IPv4Address
     """IPv4 address"""
 
@@ -1,21 +1,26 @@
 from typing import List, Optional
 
-from pydantic import BaseModel, create_model
+from pydantic import BaseModel, ConfigDict, create_model
 
 
-class TemplateResultSchema(BaseModel):
+class ResultBaseModel(BaseModel):
+    # validators are built on first use instead of at import
+    model_config = ConfigDict(defer_build=True)
+
+
+class TemplateResultSchema(ResultBaseModel):
     NAME: str
     GPIO: List[int]
     FLAG: int
     BASE: int
 
 
-class PulseTimeLegacySchema(BaseModel):
+class PulseTimeLegacySchema(ResultBaseModel):
     Set: int
     Remaining: int
 
 
-class PulseTimeLegacyResultSchema(BaseModel):
+class PulseTimeLegacyResultSchema(ResultBaseModel):
     PulseTime1: PulseTimeLegacySchema
     PulseTime2: PulseTimeLegacySchema
     PulseTime3: PulseTimeLegacySchema
@@ -26,16 +31,16 @@ class PulseTimeLegacyResultSchema(BaseModel):
     PulseTime8: PulseTimeLegacySchema
 
 
-class PulseTimeSchema(BaseModel):
+class PulseTimeSchema(ResultBaseModel):
     Set: List[int]
     Remaining: List[int]
 
 
-class PulseTimeResultSchema(BaseModel):
+class PulseTimeResultSchema(ResultBaseModel):
     PulseTime: PulseTimeSchema
 
 
-class ShutterSchema(BaseModel):
+class ShutterSchema(ResultBaseModel):
     Position: int
     Direction: int
     Target: int
@@ -44,6 +49,6 @@ class ShutterSchema(BaseModel):
 
 ShutterResultSchema = create_model(
     "ShutterResultSchema",
-    __base__=BaseModel,
+    __base__=ResultBaseModel,
     **{f"Shutter{idx}": (Optional[ShutterSchema], None) for idx in range(1, 9)},
 )
@@ -1,7 +1,7 @@
 import logging
 from typing import List, Optional, Union
 
-from pydantic import BaseModel, ConfigDict, Field, create_model, model_validator
+from pydantic import BaseModel, ConfigDict, Field, ValidationInfo, create_model, model_validator
 
 from tdmgr.tasmota.common import MAX_PWM, MAX_RELAYS
 
@@ -9,12 +9,17 @@ log = logging.getLogger(__name__)
 
 
 class StatusBaseModel(BaseModel):
-    model_config = ConfigDict(extra="allow")
+    # validators are built on first use instead of at import
+    model_config = ConfigDict(extra="allow", defer_build=True)
 
     @model_validator(mode="after")
-    def log_extra_fields(cls, values):
+    def log_extra_fields(cls, values, info: ValidationInfo):
         if cls.__name__ != "StatusSNSSchema" and values.model_extra:
-            log.warning("%s has extra fields: %s", cls.__name__, values.model_extra)
+            # collected by the caller when validating with an "extra" list in the context
+            if info.context and "extra" in info.context:
+                info.context["extra"].append((cls.__name__, values.model_extra))
+            else:
+                log.warning("%s has extra fields: %s", cls.__name__, values.model_extra)
         return values
 
 
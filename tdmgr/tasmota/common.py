@@ -1,6 +1,7 @@
-import re
+from bisect import insort
 from collections import namedtuple
-from typing import Union
+from string import digits
+from typing import Dict, List, Tuple, Union
 
 from PyQt5.QtGui import QColor
 
@@ -17,20 +18,125 @@ ValueRange = namedtuple("ValueRange", "min, max")
 CTRange = ValueRange(153, 500)
 
 
+def parse_version(version: str) -> Tuple[int, ...]:
+    """Comparable Tasmota version, "12.2.0.6" -> (12, 2, 0, 6), non-digit suffixes are ignored.
+
+    Trailing zeros are dropped, so "12.2" and "12.2.0" are equal as with pkg_resources.
+    """
+    parts = []
+    for part in version.split("."):
+        number = part[: len(part) - len(part.lstrip(digits))]
+        parts.append(int(number or 0))
+    while parts and not parts[-1]:
+        parts.pop()
+    return tuple(parts)
+
+
+# property keys the derived views (power, shutters, color) are built from
+DERIVED_KEY_PREFIXES = (
+    "POWER",
+    "Power",
+    "Shutter",
+    "Dimmer",
+    "Channel",
+    "PWM",
+    "FriendlyName",
+    "SetOption",
+    "Color",
+    "CT",
+    "HSBColor",
+)
+
+
+def key_family(key: str) -> Tuple[str, int]:
+    """Split a property key into its family and index, -1 if it has none (POWER2 -> POWER, 2)."""
+    family = key.rstrip(digits)
+    if len(family) < len(key):
+        return family, int(key[len(family) :])
+    return family, -1
+
+
 class DeviceProps(dict):
+    """Device properties.
+
+    Keys are indexed by family (POWER, Dimmer, Channel, ShutterRelay...) so matching_items returns
+    a family in index order without scanning all keys. Values computed from the properties can be
+    memoized in `derived`, it's cleared whenever a key matching DERIVED_KEY_PREFIXES is set or
+    removed.
+    """
+
+    __slots__ = ("derived", "families")
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.derived = {}
+        self.families: Dict[str, List[Tuple[int, str]]] = {}
+        for key in self:
+            self._index(key)
+
+    def _index(self, key):
+        family, idx = key_family(key)
+        insort(self.families.setdefault(family, []), (idx, key))
+
+    def _unindex(self, key):
+        family, idx = key_family(key)
+        members = self.families[family]
+        members.remove((idx, key))
+        if not members:
+            del self.families[family]
+
+    def _invalidate(self, key):
+        if self.derived and key.startswith(DERIVED_KEY_PREFIXES):
+            self.derived.clear()
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._index(key)
+        super().__setitem__(key, value)
+        self._invalidate(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._unindex(key)
+        self._invalidate(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._unindex(key)
+        value = super().pop(key, *default)
+        self._invalidate(key)
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._unindex(key)
+        self._invalidate(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        super().clear()
+        self.families.clear()
+        self.derived.clear()
+
+    def matching_items(self, family: str, idx_only: bool = True):
+        """Yield (index, value) of the family members ordered by index.
 
-    def matching_items(self, pattern: str, idx_only: bool = True):
-        pattern = re.compile(
-            f"{pattern}(?P<idx>\\d+)" if idx_only else f"{pattern}(?P<idx>\\d+)|{pattern}$"
-        )
-        for k in sorted(self.keys()):
-            if match := pattern.match(k):
-                if idx := match.groupdict()["idx"]:
-                    yield int(idx), self[k]
-                else:
-                    yield None, self[k]
+        The key without an index (e.g. Dimmer) comes first as (None, value), unless `idx_only`.
+        """
+        for idx, key in self.families.get(family, ()):
+            if idx >= 0:
+                yield idx, self[key]
+            elif not idx_only:
+                yield None, self[key]
 
 
 def map_value(
@@ -1,15 +1,22 @@
-import json
 import logging
 import re
 from collections import defaultdict
-from functools import lru_cache
-from typing import Callable, DefaultDict, List, Optional, Union
+from functools import wraps
+from time import monotonic, perf_counter
+from typing import Callable, DefaultDict, Dict, Hashable, List, Optional, Set, Union
 
-from pkg_resources import parse_version
 from pydantic import BaseModel, ValidationError
 from PyQt5.QtCore import QObject, pyqtSignal
 
-from tdmgr.mqtt import DEFAULT_PATTERNS, MQTT_PATH_REGEX, Message
+from tdmgr.mqtt import (
+    DEFAULT_LOG_SIZE,
+    DEFAULT_PATTERNS,
+    MQTT_PATH_REGEX,
+    Message,
+    MessageLog,
+)
+from tdmgr.profiling import profiler
+from tdmgr.schemas.common import payload_shape
 from tdmgr.schemas.discovery import DiscoverySchema, TopicPrefixes
 from tdmgr.schemas.result import (
     PulseTimeLegacyResultSchema,
@@ -18,13 +25,41 @@ from tdmgr.schemas.result import (
     TemplateResultSchema,
 )
 from tdmgr.schemas.status import STATUS_SCHEMA_MAP, Status13ResponseSchema
-from tdmgr.tasmota.common import COMMAND_UNKNOWN, MAX_SHUTTERS, Color, DeviceProps, Relay, Shutter
+from tdmgr.tasmota.common import (
+    COMMAND_UNKNOWN,
+    MAX_SHUTTERS,
+    Color,
+    DeviceProps,
+    Relay,
+    Shutter,
+    parse_version,
+)
 
 log = logging.getLogger(__name__)
 
+Processor = Callable[["TasmotaDevice", Message], None]
+
+MAX_SHAPES = 64  # validated payload shapes remembered per device
+SENSOR_KEYS = frozenset(("StatusSNS",))  # passed to property_changed when sensor data arrives
+
+
+def derived_view(func):
+    """Memoize a view built from device properties until one of the keys it's built from changes."""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(self):
+        derived = self.p.derived
+        if name not in derived:
+            derived[name] = func(self)
+        return derived[name]
+
+    return wrapper
+
 
 class TasmotaDevice(QObject):
     update_telemetry = pyqtSignal()
+    message_received = pyqtSignal(Message)  # every message of this device, see env.route
 
     def __init__(self, topic: str, fulltopic: str = "%prefix%/%topic%/", devicename: str = ""):
         super(TasmotaDevice, self).__init__()
@@ -43,12 +78,14 @@ class TasmotaDevice(QObject):
         self.debug = False
         self.env = None
         self.history = []
+        self.log: Optional[MessageLog] = None  # kept once a console has been opened
 
         self.topic_prefixes = TopicPrefixes("cmnd", "stat", "tele")
 
-        self.property_changed = None  # property changed callback pointer
+        self.property_changed = None  # property changed callback pointer, called with changed keys
 
         self.t = None
+        self.sensor_updated: Optional[float] = None  # monotonic time of the last sensor data
 
         self.modules = {}  # supported modules
         self.module_changed = None  # module changed callback pointer
@@ -58,18 +95,9 @@ class TasmotaDevice(QObject):
 
         self._pulsetime: Optional[Union[PulseTimeLegacyResultSchema, PulseTimeResultSchema]] = None
 
-        self.processor_map = {
-            r"PulseTime\d?": self._process_pulsetime,
-            r"Shutter\d?": self._process_shutter,
-            r"NAME": self._process_template,
-            r"Module$": self._process_module,
-            r"Modules\d?": self._process_modules,
-            r"GPIO$": self._process_gpio,
-            r"GPIO\d?$": self._process_gpio,
-            r"GPIOs\d?": self._process_gpios,
-        }
-
         self.subscribers: DefaultDict[BaseModel, List[Callable]] = defaultdict(list)
+        # validated payload shapes, True if validation returns payloads of the shape unchanged
+        self.shapes: Dict[Hashable, bool] = {}
 
     @property
     def topic(self) -> str:
@@ -128,11 +156,23 @@ class TasmotaDevice(QObject):
         return topics
 
     def update_property(self, k, v):
-        old = self.p.get(k)
-        if not old or old != v:
-            self.p[k] = v
+        self.update_properties({k: v})
+
+    def update_properties(self, props: dict) -> Set[str]:
+        """Store changed values and report all changed keys in a single notification."""
+        p = self.p
+        changed = set()
+        for k, v in props.items():
+            if k not in p or p[k] != v:
+                p[k] = v
+                changed.add(k)
+
+        if changed:
+            if self.env and not changed.isdisjoint(("Topic", "FullTopic")):
+                self.env.reindex_device(self)
             if self.property_changed:
-                self.property_changed(self, k)
+                self.property_changed(self, changed)
+        return changed
 
     def module(self):
         if mdl := self.p.get("Module"):
@@ -150,6 +190,13 @@ class TasmotaDevice(QObject):
         )
         return f"^{_ft_pattern}"
 
+    def open_log(self, size: int = DEFAULT_LOG_SIZE) -> MessageLog:
+        if self.log is None:
+            self.log = MessageLog(size)
+        elif self.log.size != size:
+            self.log.resize(size)
+        return self.log
+
     def register(self, schema: BaseModel, method: Callable):
         if method not in self.subscribers[schema]:
             log.debug("Registered %s for %s schema", method.__name__, schema.__name__)
@@ -197,9 +244,7 @@ class TasmotaDevice(QObject):
         validated = ShutterResultSchema.model_validate(msg.dict())
         self.notify_subscribers(ShutterResultSchema, validated)
 
-        # TODO: that should be a method
-        for k, v in msg.dict().items():
-            self.update_property(k, v)
+        self.update_properties(msg.dict())
 
     def _process_template(self, msg: Message):
         _template = TemplateResultSchema.model_validate(msg.dict())
@@ -208,27 +253,48 @@ class TasmotaDevice(QObject):
     def _process_logging(self, msg: Message):
         pass
 
-    @lru_cache
-    def get_result_processor(self, key) -> Callable:
-        for pattern, func in self.processor_map.items():
-            if re.match(pattern, key):
+    def get_result_processor(self, key: str) -> Optional[Processor]:
+        # exact key first, then the key prefixes (ShutterRelay1 -> Shutter, PulseTime1 -> PulseTime)
+        if func := self.result_processors.get(key):
+            return func
+        for prefix, func in self.result_prefix_processors.items():
+            if key.startswith(prefix):
                 return func
+        return None
 
     def _process_result(self, msg: Message):
         # TODO: move this check as a Message property
         if msg.dict() != COMMAND_UNKNOWN:
             if func := self.get_result_processor(msg.first_key):
-                func(msg)
+                func(self, msg)
             else:
-                for k, v in msg.dict().items():
-                    self.update_property(k, v)
+                self.update_properties(msg.dict())
 
     def process_status(self, schema: BaseModel, payload: dict):
         try:
-            validated = schema.model_validate(payload)
-            self.notify_subscribers(schema, validated)
-
-            processed = validated.model_dump(exclude_none=True)
+            shape = (schema, payload_shape(payload))
+            trusted = self.shapes.get(shape)
+            if trusted and not self.subscribers.get(schema):
+                # validating this shape has always returned the payload unchanged
+                processed = payload
+            else:
+                extra = []
+                if profiler.enabled:
+                    started = perf_counter()
+                    validated = schema.model_validate(payload, context={"extra": extra})
+                    profiler.record("schema", schema.__name__, perf_counter() - started)
+                else:
+                    validated = schema.model_validate(payload, context={"extra": extra})
+                self.notify_subscribers(schema, validated)
+
+                processed = validated.model_dump(exclude_none=True)
+                if trusted is None:
+                    # extra fields are reported once per shape, not with every message
+                    for name, fields in extra:
+                        log.warning("%s: %s has extra fields: %s", self.topic, name, fields)
+                    if len(self.shapes) >= MAX_SHAPES:
+                        self.shapes.clear()
+                    self.shapes[shape] = processed == payload
 
             first_key = next(iter(processed.keys()))
             items = (
@@ -237,13 +303,13 @@ class TasmotaDevice(QObject):
                 else processed.items()
             )
 
-            # TODO: needs to be reworked
+            props = {}
             for k, v in items:
                 if k == "Wifi":
-                    for wk, wv in v.items():
-                        self.update_property(wk, wv)
+                    props.update(v)
                 else:
-                    self.update_property(k, v)
+                    props[k] = v
+            self.update_properties(props)
 
             if schema == Status13ResponseSchema:
                 if self.version_above("12.2.0.6"):  # Support for single-response for all shutters
@@ -259,11 +325,15 @@ class TasmotaDevice(QObject):
         except ValidationError as e:
             log.critical("MQTT: Cannot parse %s", e)
 
-    def process_sensor(self, payload: str):
-        sensor_data = json.loads(payload)
+    def process_sensor(self, sensor_data: dict):
         if "StatusSNS" in sensor_data:
             sensor_data = sensor_data["StatusSNS"]
         self.t = sensor_data
+        self.sensor_updated = monotonic()
+        if self.env:
+            self.env.record_sensor(self, sensor_data)
+            if self.property_changed:
+                self.property_changed(self, SENSOR_KEYS)
         self.update_telemetry.emit()
 
     def process_message(self, msg: Message):
@@ -271,21 +341,63 @@ class TasmotaDevice(QObject):
             log.debug("MQTT: %s %s", msg.topic, msg.payload)
 
         if msg.prefix in (self.topic_prefixes.stat, self.topic_prefixes.tele):
-            # /STATE or /STATUS<x> response
-            if status_parse_schema := STATUS_SCHEMA_MAP.get(msg.endpoint):
-                self.process_status(status_parse_schema, msg.dict())
+            # /RESULT or SetOption4 replies fall through to the RESULT processing
+            func = self.endpoint_processors.get(msg.endpoint, TasmotaDevice._process_result)
+            if profiler.enabled:
+                started = perf_counter()
+                func(self, msg)
+                profiler.record("endpoint", msg.endpoint, perf_counter() - started)
+            else:
+                func(self, msg)
+
+    def _process_status_message(self, msg: Message):
+        self.process_status(STATUS_SCHEMA_MAP[msg.endpoint], msg.dict())
+
+    def _process_sensor_message(self, msg: Message):
+        self.process_sensor(msg.dict())
+
+    # dispatch tables, shared by all instances of a class; use the register_*_processor
+    # classmethods to extend them
+    endpoint_processors: Dict[str, Processor] = {
+        # /STATUS8, /SENSOR are fully dynamic and parsed as-is
+        "STATUS8": _process_sensor_message,
+        "SENSOR": _process_sensor_message,
+        "LOGGING": _process_logging,
+        # /STATE or /STATUS<x> response
+        **dict.fromkeys(STATUS_SCHEMA_MAP, _process_status_message),
+    }
+
+    result_processors: Dict[str, Processor] = {
+        "Module": _process_module,
+        # GPIO0..GPIO9 only, higher GPIOs are stored as properties
+        **dict.fromkeys(["GPIO", *(f"GPIO{n}" for n in range(10))], _process_gpio),
+    }
+
+    result_prefix_processors: Dict[str, Processor] = {
+        "PulseTime": _process_pulsetime,
+        "Shutter": _process_shutter,
+        "NAME": _process_template,
+        "Modules": _process_modules,
+        "GPIOs": _process_gpios,
+    }
 
-            # /STATUS8, /STATUS10, /SENSOR are fully dynamic and parsed as-is
-            elif msg.endpoint in ("STATUS8", "STATUS10", "SENSOR"):
-                self.process_sensor(msg.payload)
+    @classmethod
+    def register_endpoint_processor(cls, endpoint: str, func: Processor):
+        """Process messages arriving on the stat/tele `endpoint` with `func(device, msg)`."""
+        if "endpoint_processors" not in cls.__dict__:
+            cls.endpoint_processors = dict(cls.endpoint_processors)
+        cls.endpoint_processors[endpoint] = func
 
-            # /LOGGING response
-            elif msg.endpoint == "LOGGING":
-                self._process_logging(msg)
+    @classmethod
+    def register_result_processor(cls, key: str, func: Processor, prefix: bool = False):
+        """Process RESULT messages with the first key `key` with `func(device, msg)`.
 
-            # /RESULT or SetOption4
-            else:
-                self._process_result(msg)
+        With `prefix`, also the ones with a first key starting with it (Shutter -> ShutterRelay1).
+        """
+        table = "result_prefix_processors" if prefix else "result_processors"
+        if table not in cls.__dict__:
+            setattr(cls, table, dict(getattr(cls, table)))
+        getattr(cls, table)[key] = func
 
     def is_friendlyname(self, fname: str) -> bool:
         RE_DEFAULT_FNAME = r"(Tasmota|Sonoff|Power)\d?"
@@ -304,6 +416,7 @@ class TasmotaDevice(QObject):
             )
         return name
 
+    @derived_view
     def power(self) -> Optional[List[Relay]]:
         def is_locked(idx: int) -> bool:
             if self.p.get("PowerOnState") == 4:
@@ -333,6 +446,7 @@ class TasmotaDevice(QObject):
             return relays
         return []
 
+    @derived_view
     def shutters(self) -> Optional[List[Shutter]]:
         shutters = []
         for k in range(1, MAX_SHUTTERS + 1):
@@ -352,6 +466,7 @@ class TasmotaDevice(QObject):
 
         return shutters
 
+    @derived_view
     def color(self):
         if color := self.p.get("Color", ""):
             return Color(
@@ -1,7 +1,12 @@
 from enum import Enum
+from time import time
+from typing import Optional
 
+from tdmgr.archive import HistoryArchive
 from tdmgr.mqtt import Message
 from tdmgr.tasmota.device import TasmotaDevice
+from tdmgr.tasmota.topics import TopicIndex
+from tdmgr.timeseries import TimeSeriesStore
 
 
 class DiscoveryMode(int, Enum):
@@ -16,12 +21,52 @@ class TasmotaEnvironment:
         self.lwts = dict()
         self.retained = set()
         self.mqtt = None
+        self.topic_index = TopicIndex()
+        self.history = TimeSeriesStore()
+        self.archive: Optional[HistoryArchive] = None
 
     def add_device(self, device: TasmotaDevice):
         self.devices.append(device)
+        self.topic_index.add(device)
         device.env = self
 
-    def find_device(self, msg: Message) -> TasmotaDevice:
-        for d in self.devices:
-            if d.message_topic_matches_fulltopic(msg):
-                return d
+    def remove_device(self, device: TasmotaDevice):
+        self.devices.remove(device)
+        self.topic_index.remove(device)
+        self.history.remove(device)
+
+    def reindex_device(self, device: TasmotaDevice):
+        self.topic_index.update(device)
+
+    def find_device(self, msg: Message) -> Optional[TasmotaDevice]:
+        if match := self.topic_index.match(msg.topic):
+            device, prefix = match
+            if not msg.prefix:
+                msg.prefix = prefix
+            return device
+        return None
+
+    def route(self, msg: Message) -> Optional[TasmotaDevice]:
+        """Find the device of a message and have it process the message.
+
+        Only then is the message added to the device's log and passed to its listeners, so they see
+        the device as the message left it.
+        """
+        if device := self.find_device(msg):
+            if msg.is_lwt:
+                device.online = msg.payload
+            else:
+                device.online = True
+                device.process_message(msg)
+
+            if device.log is not None:
+                device.log.append(msg)
+            device.message_received.emit(msg)
+        return device
+
+    def record_sensor(self, device: TasmotaDevice, data: dict):
+        """Keep the numeric sensor values of a device in memory and, when enabled, on disk."""
+        timestamp = time()
+        self.history.add(device, data, timestamp)
+        if self.archive:
+            self.archive.add(device.p["Topic"], data, timestamp)
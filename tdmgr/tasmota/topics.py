@@ -0,0 +1,148 @@
+import re
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+
+from tdmgr.mqtt import MQTT_PATH_REGEX
+
+PREFIX_TOKEN = "%prefix%"
+TOPIC_TOKEN = "%topic%"
+
+_is_path_segment = re.compile(MQTT_PATH_REGEX).fullmatch
+
+
+def fulltopic_segments(fulltopic: str, topic: str) -> Optional[List[str]]:
+    """Split a device FullTopic into trie segments, `None` if it can't be indexed by segment."""
+    if not fulltopic.endswith("/"):
+        fulltopic = f"{fulltopic}/"
+    segments = fulltopic.replace(TOPIC_TOKEN, topic).split("/")[:-1]
+    for segment in segments:
+        if PREFIX_TOKEN in segment and segment != PREFIX_TOKEN:
+            return None
+    return segments
+
+
+class TopicNode:
+    __slots__ = ("children", "prefix", "devices")
+
+    def __init__(self):
+        self.children: Dict[str, TopicNode] = {}
+        self.prefix: Optional[TopicNode] = None
+        self.devices: list = []
+
+    def is_empty(self) -> bool:
+        return not (self.children or self.prefix or self.devices)
+
+
+class TopicIndex:
+    """Trie of device topics keyed on topic segments, with %prefix% as a single-level wildcard.
+
+    A lookup walks the message topic once, so its cost depends on the topic length and not on
+    the number of known devices. Devices with a FullTopic that can't be split into whole segments
+    (e.g. `home_%prefix%/%topic%/`) are kept aside and matched with their regex.
+    """
+
+    def __init__(self):
+        self.root = TopicNode()
+        self.fallback: list = []
+        self.entries: Dict[object, Tuple[int, Optional[List[str]]]] = {}
+        self._seq = count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, device) -> bool:
+        return device in self.entries
+
+    def add(self, device):
+        if device in self.entries:
+            self.update(device)
+            return
+
+        segments = fulltopic_segments(device.fulltopic, device.topic)
+        self.entries[device] = (next(self._seq), segments)
+        self._insert(device, segments)
+
+    def remove(self, device):
+        if entry := self.entries.pop(device, None):
+            self._delete(device, entry[1])
+
+    def update(self, device):
+        """Re-index a device after its Topic or FullTopic has changed."""
+        if entry := self.entries.get(device):
+            seq, old_segments = entry
+            segments = fulltopic_segments(device.fulltopic, device.topic)
+            if segments != old_segments or segments is None:
+                self._delete(device, old_segments)
+                self._insert(device, segments)
+                self.entries[device] = (seq, segments)
+
+    def match(self, topic: str) -> Optional[Tuple[object, str]]:
+        """Return the earliest added device matching the topic and the matched prefix."""
+        segments = topic.split("/")
+        candidates = []
+        self._walk(self.root, segments, 0, "", candidates)
+
+        for device in self.fallback:
+            if _match := re.match(device.fulltopic_regex, topic):
+                candidates.append((self.entries[device][0], device, _match.groupdict()["prefix"]))
+
+        if candidates:
+            _, device, prefix = min(candidates, key=lambda c: c[0])
+            return device, prefix
+        return None
+
+    def _walk(self, node: TopicNode, segments: List[str], depth: int, prefix: str, candidates):
+        if depth == len(segments):
+            return
+
+        # FullTopic ends with a slash, so a device matches only if there's something left
+        for device in node.devices:
+            candidates.append((self.entries[device][0], device, prefix))
+
+        segment = segments[depth]
+        if child := node.children.get(segment):
+            self._walk(child, segments, depth + 1, prefix, candidates)
+
+        if node.prefix and _is_path_segment(segment):
+            self._walk(node.prefix, segments, depth + 1, segment, candidates)
+
+    def _insert(self, device, segments: Optional[List[str]]):
+        if segments is None:
+            self.fallback.append(device)
+            return
+
+        node = self.root
+        for segment in segments:
+            if segment == PREFIX_TOKEN:
+                if not node.prefix:
+                    node.prefix = TopicNode()
+                node = node.prefix
+            else:
+                node = node.children.setdefault(segment, TopicNode())
+        node.devices.append(device)
+
+    def _delete(self, device, segments: Optional[List[str]]):
+        if segments is None:
+            if device in self.fallback:
+                self.fallback.remove(device)
+            return
+
+        path = [self.root]
+        for segment in segments:
+            node = path[-1]
+            node = node.prefix if segment == PREFIX_TOKEN else node.children.get(segment)
+            if node is None:
+                return
+            path.append(node)
+
+        if device in path[-1].devices:
+            path[-1].devices.remove(device)
+
+        # prune branches left without devices
+        for parent, node, segment in reversed(list(zip(path, path[1:], segments))):
+            if not node.is_empty():
+                break
+            if segment == PREFIX_TOKEN:
+                parent.prefix = None
+            else:
+                parent.children.pop(segment, None)
@@ -0,0 +1,170 @@
+"""In-memory history of numeric sensor values.
+
+Each numeric leaf of a device's sensor data is appended to a `Series` keyed by the device and the
+path of the value, e.g. ("ENERGY", "Power"). A series has three tiers of fixed size: the raw
+samples and their 1 and 15 minute averages, which are aggregated as samples arrive. All buffers
+are preallocated `array('d')`, so the memory used is known up front: the budget is split evenly
+between the expected number of series and no series is created once it's used up.
+"""
+
+import logging
+from time import time
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+from tdmgr.profiling import RingBuffer
+
+log = logging.getLogger(__name__)
+
+Path = Tuple[str, ...]
+Point = Tuple[float, float]
+
+TIERS = (0, 60, 900)  # bucket width in seconds, 0 = raw samples
+TIER_WEIGHTS = (1, 1, 2)  # share of a series' points per tier
+
+DEFAULT_HISTORY_BUDGET = 64  # MiB
+DEFAULT_HISTORY_SERIES = 1000 * 20  # devices * metrics
+POINT_SIZE = 16  # bytes, timestamp and value
+SERIES_OVERHEAD = 1664  # bytes, objects, buffer headers and index entries
+MIN_TIER_SIZE = 2
+
+
+def numeric_values(data: dict, path: Path = ()) -> Iterator[Tuple[Path, float]]:
+    """Paths and values of the numeric leaves of nested sensor data."""
+    for name, value in data.items():
+        if isinstance(value, dict):
+            yield from numeric_values(value, (*path, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield (*path, name), value
+
+
+class Tier:
+    """Fixed number of points of one resolution, the current bucket is averaged until it ends."""
+
+    __slots__ = ("width", "times", "values", "bucket", "total", "count")
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.times = RingBuffer(size)
+        self.values = RingBuffer(size)
+        self.bucket = 0.0
+        self.total = 0.0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return len(self.values) + bool(self.count)
+
+    def add(self, timestamp: float, value: float):
+        if not self.width:
+            self.times.append(timestamp)
+            self.values.append(value)
+            return
+
+        bucket = timestamp - timestamp % self.width
+        if bucket != self.bucket:
+            if self.count:
+                self.times.append(self.bucket)
+                self.values.append(self.total / self.count)
+            self.bucket, self.total, self.count = bucket, 0.0, 0
+        self.total += value
+        self.count += 1
+
+    def points(self) -> List[Point]:
+        """Points from the oldest to the newest, including the unfinished bucket."""
+        points = list(zip(self.times, self.values))
+        if self.count:
+            points.append((self.bucket, self.total / self.count))
+        return points
+
+
+class Series:
+    __slots__ = ("tiers",)
+
+    def __init__(self, sizes: Tuple[int, ...]):
+        self.tiers = [Tier(width, size) for width, size in zip(TIERS, sizes)]
+
+    def add(self, timestamp: float, value: float):
+        for tier in self.tiers:
+            tier.add(timestamp, value)
+
+    def points(self, tier: int = 0) -> List[Point]:
+        return self.tiers[tier].points()
+
+    def values(self, tier: int = 0) -> List[float]:
+        return [value for _, value in self.points(tier)]
+
+    def last(self) -> Optional[float]:
+        raw = self.tiers[0].values
+        return raw.last() if len(raw) else None
+
+
+class TimeSeriesStore:
+    """Series of all devices, see the module docstring."""
+
+    def __init__(self, budget: int = DEFAULT_HISTORY_BUDGET, series: int = DEFAULT_HISTORY_SERIES):
+        self.series: Dict[Hashable, Dict[Path, Series]] = {}
+        self.count = 0
+        self.full = False
+        self.limits = None
+        self.configure(budget, series)
+
+    def configure(self, budget: int, series: int = DEFAULT_HISTORY_SERIES):
+        """Size the tiers for `series` series in `budget` MiB, 0 turns the history off.
+
+        Changing the sizes drops the collected history.
+        """
+        points = max(0, budget * 1024 * 1024 // max(series, 1) - SERIES_OVERHEAD) // POINT_SIZE
+        sizes = tuple(
+            max(MIN_TIER_SIZE, points * weight // sum(TIER_WEIGHTS)) for weight in TIER_WEIGHTS
+        )
+        series_bytes = sum(sizes) * POINT_SIZE + SERIES_OVERHEAD
+        max_series = budget * 1024 * 1024 // series_bytes
+
+        if (sizes, max_series) != self.limits:
+            self.sizes, self.series_bytes, self.max_series = sizes, series_bytes, max_series
+            self.limits = (sizes, max_series)
+            self.clear()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_series > 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, key: Hashable, data: dict, timestamp: Optional[float] = None):
+        if not self.max_series:
+            return
+        timestamp = time() if timestamp is None else timestamp
+        for path, value in numeric_values(data):
+            self.add_value(key, path, timestamp, value)
+
+    def add_value(self, key: Hashable, path: Path, timestamp: float, value: float):
+        if (device_series := self.series.get(key)) is None:
+            device_series = self.series[key] = {}
+        if (series := device_series.get(path)) is None:
+            if self.count >= self.max_series:
+                if not self.full:
+                    log.warning(
+                        "HISTORY: budget of %d series used up, new values are not kept",
+                        self.max_series,
+                    )
+                    self.full = True
+                return
+            series = device_series[path] = Series(self.sizes)
+            self.count += 1
+        series.add(timestamp, value)
+
+    def get(self, key: Hashable, path: Path) -> Optional[Series]:
+        if device_series := self.series.get(key):
+            return device_series.get(path)
+        return None
+
+    def remove(self, key: Hashable):
+        if device_series := self.series.pop(key, None):
+            self.count -= len(device_series)
+            self.full = False
+
+    def clear(self):
+        self.series.clear()
+        self.count = 0
+        self.full = False
@@ -1,6 +1,7 @@
 import os
 
 import pytest
+from PyQt5.QtWidgets import QApplication
 
 from tdmgr.mqtt import Message
 from tdmgr.tasmota.device import TasmotaDevice
@@ -13,6 +14,20 @@ def get_payload(version: str, filename: str) -> bytes:
         return f.read()
 
 
+class FakePahoMessage:
+    def __init__(self, topic: str, payload: bytes = b"", retain: bool = False):
+        self.topic = topic
+        self.payload = payload
+        self.retain = retain
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    # widgets are tested without a display
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    yield QApplication.instance() or QApplication([])
+
+
 @pytest.fixture
 def device(request):
     topic = "device"
@@ -0,0 +1,110 @@
+import os
+from time import time
+
+import pytest
+
+from tdmgr.archive import COMPACT_AFTER, HEADER, RECORD, HistoryArchive, Segment
+from tdmgr.tasmota.device import TasmotaDevice
+from tdmgr.tasmota.environment import TasmotaEnvironment
+from tdmgr.timeseries import TimeSeriesStore
+
+POWER = ("ENERGY", "Power")
+
+
+@pytest.fixture
+def now():
+    return int(time()) // 10 * 10
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = HistoryArchive(str(tmp_path / "history"), days=7, span=10, capacity=1000)
+    yield archive
+    archive.close()
+
+
+def test_append_and_query(archive, now):
+    for second in range(25):
+        archive.add("plug", {"ENERGY": {"Power": second, "Voltage": 230}}, now + second)
+
+    assert len(archive.segment_paths()) == 3
+    assert archive.query("plug", POWER, now + 8, now + 12) == [
+        (now + second, second) for second in range(8, 13)
+    ]
+    assert archive.query("plug", ("ENERGY", "Voltage"), now + 24) == [(now + 24, 230)]
+    assert archive.query("plug", ("ENERGY", "Missing"), now) == []
+
+
+def test_query_uses_index(archive, now, monkeypatch):
+    monkeypatch.setattr("tdmgr.archive.INDEX_STRIDE", 4)
+    segment = Segment.create(os.path.join(archive.path, "0.seg"), 100)
+    for n in range(50):
+        segment.append(now + n / 10, 0, n)
+
+    assert len(segment.index) == 13
+    assert [value for _, _, value in segment.records(now + 2, now + 2.35)] == [20, 21, 22, 23]
+    segment.close(seal=True)
+
+
+def test_sealed_segment_is_truncated(archive, now):
+    for second in range(12):
+        archive.append("plug", POWER, now + second, second)
+
+    sealed = archive.sealed_segments()[0]
+    assert os.path.getsize(sealed) == HEADER.size + 10 * RECORD.size
+    assert Segment.read_header(sealed) == (0, 10, now, now + 9)
+
+
+def test_reopen_keeps_series_and_segments(tmp_path, now):
+    path = str(tmp_path / "history")
+    archive = HistoryArchive(path, days=7, span=10)
+    archive.append("plug", POWER, now, 1)
+    archive.close()
+
+    archive = HistoryArchive(path, days=7, span=10)
+    archive.append("plug", POWER, now + 1, 2)
+    archive.append("bulb", ("Dimmer",), now + 1, 50)
+
+    assert archive.series == [("plug", POWER), ("bulb", ("Dimmer",))]
+    assert archive.query("plug", POWER, now) == [(now, 1), (now + 1, 2)]
+    archive.close()
+
+
+def test_compaction_and_expiry(tmp_path, now):
+    archive = HistoryArchive(str(tmp_path / "history"), days=7, span=3600)
+    start = now - now % 3600
+    for n in range(30):
+        archive.append("plug", POWER, start + n * 60, n)
+    archive.rotate(start + 3600)
+    archive.compactor.join()
+
+    archive.compact_segments(archive.sealed_segments(), start + 1800 + COMPACT_AFTER)
+    assert archive.query("plug", POWER, start) == [(start, 7), (start + 900, 22)]
+    assert all(Segment.read_header(p)[0] == 900 for p in archive.sealed_segments())
+
+    archive.compact_segments(archive.sealed_segments(), start + 8 * 86400)
+    assert archive.sealed_segments() == []
+    archive.close()
+
+
+def test_restore(archive, now):
+    archive.append("plug", POWER, now - 5, 10)
+    archive.append("plug", POWER, now - 4, 20)
+    archive.append("unknown", POWER, now - 4, 1)
+
+    store = TimeSeriesStore()
+    archive.restore(store, {"plug": "device"})
+
+    assert store.get("device", POWER).values() == [10, 20]
+    assert len(store) == 1
+
+
+def test_sensor_data_is_archived(archive):
+    env = TasmotaEnvironment()
+    env.archive = archive
+    device = TasmotaDevice("plug")
+    env.add_device(device)
+
+    device.process_sensor({"ENERGY": {"Power": 42}})
+
+    assert [value for _, value in archive.query("plug", POWER, 0)] == [42]
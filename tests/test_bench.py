@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from tdmgr.bench import SCENARIOS, Bench, import_times, main
+
+
+@pytest.fixture
+def bench(qapp):
+    bench = Bench(4)
+    yield bench
+    bench.close()
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_run(bench, scenario):
+    result = bench.run(scenario, 2)
+
+    assert result.devices == 4
+    assert result.messages > 0
+    assert result.unmatched == 0
+    assert result.p50 <= result.p99
+
+
+def test_run_updates_devices(bench):
+    bench.run("lwt")
+    bench.run("telemetry")
+
+    device = bench.env.devices[0]
+    assert device.online
+    assert "Uptime" in device.p
+
+
+def test_main_json(qapp, capsys):
+    main(["--devices", "2", "--scenario", "result", "--json"])
+
+    result = json.loads(capsys.readouterr().out)
+    assert result["devices"] == 2
+    assert result["messages"] == 2 * 2 * 3
+
+
+def test_startup_defers_imports():
+    times = import_times()
+
+    assert "tdmgr.GUI.dialogs.main" in times
+    # registered from icons.rcc, dialogs and pkg_resources are loaded on demand
+    assert "tdmgr.GUI.icons" not in times
+    assert "pkg_resources" not in times
+    assert {name for name in times if name.startswith("tdmgr.GUI.dialogs.")} == {
+        "tdmgr.GUI.dialogs.main"
+    }
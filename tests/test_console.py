@@ -0,0 +1,83 @@
+from tdmgr.GUI.console import MessageLogModel, highlight
+from tdmgr.mqtt import Message, MessageLog
+
+
+def fill(log: MessageLog, count: int):
+    for _ in range(count):
+        log.append(Message("stat/device/RESULT", b'{"POWER":"ON"}'))
+
+
+def test_model_follows_log(qapp):
+    log = MessageLog(5)
+    fill(log, 2)
+    model = MessageLogModel(log)
+    assert model.rowCount() == 2
+
+    events = []
+    model.rowsRemoved.connect(lambda parent, first, last: events.append(("-", first, last)))
+    model.rowsInserted.connect(lambda parent, first, last: events.append(("+", first, last)))
+
+    fill(log, 2)
+    assert model.rowCount() == 2  # until synced
+    assert model.sync()
+    assert events == [("+", 2, 3)]
+
+    fill(log, 3)
+    events.clear()
+    assert model.sync()
+    assert events == [("-", 0, 1), ("+", 2, 4)]
+    assert model.rowCount() == 5
+    assert model.index(0).data(MessageLogModel.NumberRole) == log.first
+    assert model.index(4).data().endswith('stat/device/RESULT {"POWER":"ON"}')
+    assert not model.sync()
+
+
+def test_model_resets_after_overflow(qapp):
+    log = MessageLog(3)
+    model = MessageLogModel(log)
+    resets = []
+    model.modelReset.connect(lambda: resets.append(1))
+
+    fill(log, 10)
+    model.sync()
+
+    assert resets == [1]
+    assert (model.first, model.last, model.rowCount()) == (7, 10, 3)
+
+
+def test_model_follows_resize(qapp):
+    log = MessageLog(5)
+    fill(log, 5)
+    model = MessageLogModel(log)
+    removed = []
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+    log.resize(2)
+    assert model.sync()
+    assert removed == [(0, 2)]
+    assert (model.first, model.last, model.rowCount()) == (3, 5, 2)
+    assert all(model.index(row).data() for row in range(model.rowCount()))
+    assert not model.sync()
+
+
+def test_model_clear(qapp):
+    log = MessageLog(5)
+    fill(log, 3)
+    model = MessageLogModel(log)
+
+    model.clear()
+    assert model.rowCount() == 0
+    assert list(model.lines()) == []
+
+    fill(log, 1)
+    model.sync()
+    assert len(list(model.lines())) == 1
+
+
+def test_highlight():
+    text = '[12:00:00] stat/device/RESULT {"POWER":"ON"}'
+    ranges = {(r.start, r.length) for r in highlight(text)}
+
+    assert (0, 11) in ranges  # timestamp
+    assert (text.index('"POWER"'), 7) in ranges  # key
+    assert (text.index(':"ON"'), 5) in ranges
@@ -1,6 +1,10 @@
+import json
+
 import pytest
 
 from tdmgr.mqtt import Message
+from tdmgr.schemas.status import StateSchema
+from tdmgr.tasmota.common import DeviceProps
 from tdmgr.tasmota.device import Relay, TasmotaDevice
 from tests.conftest import get_payload
 
@@ -98,3 +102,188 @@ def test_power_multiple(device, device_power, fname, expected):
     assert len(res) == 2
     assert res[0] == Relay(1, expected[0], "ON", 0)
     assert res[1] == Relay(2, expected[1], "OFF", 0)
+
+
+@pytest.mark.parametrize(
+    "key, processor",
+    [
+        ("PulseTime", TasmotaDevice._process_pulsetime),
+        ("PulseTime1", TasmotaDevice._process_pulsetime),
+        ("Shutter3", TasmotaDevice._process_shutter),
+        ("ShutterRelay1", TasmotaDevice._process_shutter),
+        ("ShutterPosition2", TasmotaDevice._process_shutter),
+        ("NAME", TasmotaDevice._process_template),
+        ("Module", TasmotaDevice._process_module),
+        ("Module1", None),
+        ("Modules2", TasmotaDevice._process_modules),
+        ("GPIO", TasmotaDevice._process_gpio),
+        ("GPIO3", TasmotaDevice._process_gpio),
+        ("GPIO12", None),
+        ("GPIOs1", TasmotaDevice._process_gpios),
+        ("POWER1", None),
+    ],
+)
+def test_get_result_processor(device, key, processor):
+    assert device.get_result_processor(key) is processor
+
+
+def test_register_result_processor():
+    class CustomDevice(TasmotaDevice):
+        pass
+
+    received = []
+    CustomDevice.register_result_processor(
+        "Timers", lambda d, msg: received.append(msg), prefix=True
+    )
+
+    device = CustomDevice("device")
+    message = Message("stat/device/RESULT", b'{"Timers4":{}}', prefix="stat")
+    device.process_message(message)
+
+    assert received == [message]
+    assert TasmotaDevice("device").get_result_processor("Timers4") is None
+
+
+def test_register_endpoint_processor():
+    class CustomDevice(TasmotaDevice):
+        pass
+
+    received = []
+    CustomDevice.register_endpoint_processor("LOGGING", lambda d, msg: received.append(msg))
+
+    message = Message("tele/device/LOGGING", b"log line", prefix="tele")
+    CustomDevice("device").process_message(message)
+
+    assert received == [message]
+    assert TasmotaDevice.endpoint_processors["LOGGING"] is TasmotaDevice._process_logging
+
+
+def test_process_result_updates_properties(device):
+    device.process_message(Message("stat/device/RESULT", b'{"POWER1":"ON"}', prefix="stat"))
+
+    assert device.p["POWER1"] == "ON"
+
+
+@pytest.mark.parametrize("version", ("14.2.0.6",))
+def test_process_status_single_notification(device, version):
+    notifications = []
+    device.property_changed = lambda d, keys: notifications.append(keys)
+
+    payload = get_payload(version, "STATUS11.json")
+    device.process_message(Message("stat/device/STATUS11", payload, prefix="stat"))
+
+    assert len(notifications) == 1
+    assert {"Uptime", "LoadAvg", "RSSI", "SSId"} <= notifications[0]
+
+    device.process_message(Message("stat/device/STATUS11", payload, prefix="stat"))
+    assert len(notifications) == 1
+
+
+def state_message(load_avg=19, **extra) -> Message:
+    payload = {
+        "Time": "2024-01-01T00:00:00",
+        "Uptime": "0T01:00:00",
+        "LoadAvg": load_avg,
+        "POWER": "ON",
+        "Wifi": {"AP": 1, "SSId": "ssid", "BSSId": "AA:BB:CC:DD:EE:FF", "Channel": 1, "RSSI": 80},
+        **extra,
+    }
+    return Message("tele/device/STATE", json.dumps(payload).encode(), prefix="tele")
+
+
+def test_process_status_trusts_validated_shape(device, monkeypatch):
+    device.process_message(state_message(19))
+    assert list(device.shapes.values()) == [True]
+
+    calls = []
+    validate = StateSchema.model_validate
+    monkeypatch.setattr(
+        StateSchema, "model_validate", lambda *a, **kw: calls.append(a) or validate(*a, **kw)
+    )
+    device.process_message(state_message(25))
+
+    assert calls == []
+    assert device.p["LoadAvg"] == 25
+    assert device.p["RSSI"] == 80
+
+    # a string is coerced to int, so this shape is validated every time
+    for _ in range(2):
+        device.process_message(state_message("30"))
+    assert len(calls) == 2
+    assert device.p["LoadAvg"] == 30
+    assert list(device.shapes.values()) == [True, False]
+
+
+def test_process_status_validates_for_subscribers(device):
+    device.process_message(state_message(19))
+
+    received = []
+    device.register(StateSchema, received.append)
+    device.process_message(state_message(25))
+
+    assert len(received) == 1
+    assert received[0].LoadAvg == 25
+
+
+def test_process_status_warns_once_per_shape(device, caplog):
+    for load_avg in (19, 20, 21):
+        device.process_message(state_message(load_avg, Unknown=1))
+    device.process_message(state_message(19, Other=1))
+
+    warnings = [r.getMessage() for r in caplog.records if "extra fields" in r.getMessage()]
+    assert len(warnings) == 2
+    assert device.p["LoadAvg"] == 19
+    assert list(device.shapes.values()) == [True, True]
+
+
+def test_update_properties_reports_changed_keys(device):
+    device.update_properties({"POWER1": "ON", "POWER2": "OFF"})
+
+    assert device.update_properties({"POWER1": "ON", "POWER2": "ON"}) == {"POWER2"}
+    assert device.update_properties({"POWER1": "ON"}) == set()
+
+
+@pytest.mark.parametrize("device_power", (["ON", "OFF"],), indirect=True)
+def test_derived_views_are_cached(device, device_power, monkeypatch):
+    device.p.update(**device_power, Color="FF00", Dimmer=50)
+    power, shutters, color = device.power(), device.shutters(), device.color()
+
+    calls = []
+    monkeypatch.setattr(DeviceProps, "matching_items", lambda *a, **kw: calls.append(a))
+    device.update_properties({"Uptime": "0T00:01:00", "RSSI": 50})
+
+    assert device.power() is power
+    assert device.shutters() is shutters
+    assert device.color() is color
+    assert calls == []
+
+
+@pytest.mark.parametrize(
+    "key, value",
+    [
+        ("POWER2", "ON"),
+        ("FriendlyName", ["Lamp", "Fan"]),
+        ("PowerLock", "11"),
+        ("PowerOnState", 4),
+        ("SetOption", ["00008009", "2805C80001000600003C5A0A192800000000", "00000080", "00006000"]),
+    ],
+)
+@pytest.mark.parametrize("device_power", (["ON", "OFF"],), indirect=True)
+def test_derived_views_invalidated(device, device_power, key, value):
+    device.p.update(**device_power)
+    power = device.power()
+
+    device.p[key] = value
+    assert device.power() is not power
+
+
+@pytest.mark.parametrize("device_power", (["ON", "OFF"],), indirect=True)
+def test_derived_views_invalidated_on_delete(device, device_power):
+    device.p.update(**device_power)
+    assert len(device.power()) == 2
+
+    del device.p["POWER2"]
+    assert device.power() == [Relay(1, "", "ON", False)]
+
+    device.p.pop("POWER1")
+    assert device.power() == []
@@ -0,0 +1,147 @@
+import pytest
+from PyQt5.QtCore import QSettings, Qt
+
+from tdmgr.models.devices import TasmotaDevicesModel, dirty_ranges, is_device_column_key
+from tdmgr.models.roles import DeviceRoles
+from tdmgr.mqtt import Message
+from tdmgr.tasmota.device import TasmotaDevice
+from tdmgr.tasmota.environment import TasmotaEnvironment
+
+
+@pytest.fixture
+def model(qapp, tmp_path):
+    settings = QSettings(str(tmp_path / "tdm.ini"), QSettings.IniFormat)
+    devices = QSettings(str(tmp_path / "devices.ini"), QSettings.IniFormat)
+    env = TasmotaEnvironment()
+    for idx in range(3):
+        env.add_device(TasmotaDevice(f"device{idx}"))
+
+    model = TasmotaDevicesModel(settings, devices, env)
+    model.setupColumns(["Device", "Module", "Version", "Uptime", "RSSI"])
+    yield model
+
+
+@pytest.fixture
+def data_changed(model):
+    emitted = []
+    model.dataChanged.connect(
+        lambda tl, br: emitted.append(((tl.row(), tl.column()), (br.row(), br.column())))
+    )
+    yield emitted
+
+
+def test_bulk_update_emits_one_range_per_row(model, data_changed):
+    device = model.deviceAtRow(1)
+
+    device.update_properties({"Version": "14.2.0", "Uptime": "0T00:01:00", "POWER1": "ON"})
+    model.flush_changes()
+
+    assert data_changed == [((1, 0), (1, 3))]
+
+
+def test_device_column_key_with_own_column(model, data_changed):
+    model.deviceAtRow(0).update_property("RSSI", 50)
+    model.flush_changes()
+
+    assert data_changed == [((0, 0), (0, 4))]
+
+
+def test_update_of_hidden_column_is_ignored(model, data_changed):
+    model.deviceAtRow(0).update_properties({"Hostname": "tasmota"})
+    model.flush_changes()
+
+    assert data_changed == []
+
+
+def test_add_device_row(model, data_changed):
+    device = TasmotaDevice("new_device")
+    model.addDevice(device)
+
+    assert model.rowCount() == 4
+    assert model.deviceAtRow(3) is device
+    assert model.tasmota_env.find_device(Message("tele/new_device/STATE")) is device
+
+    device.update_property("Version", "14.2.0")
+    model.flush_changes()
+    assert data_changed == [((3, 2), (3, 2))]
+
+
+def test_remove_row_shifts_rows(model, data_changed):
+    device = model.deviceAtRow(2)
+    model.removeRows(0, 1)
+
+    device.update_property("Module", 1)
+    model.flush_changes()
+    assert data_changed == [((1, 1), (1, 1))]
+
+
+def test_changes_are_deferred_until_flush(model, data_changed):
+    refreshed = []
+    model.refreshed.connect(lambda: refreshed.append(True))
+
+    for row in range(3):
+        model.deviceAtRow(row).update_property("Version", "14.2.0")
+    model.deviceAtRow(1).update_property("Version", "14.3.0")
+
+    assert data_changed == []
+    assert model.refresh_timer.isActive()
+
+    model.flush_changes()
+    assert data_changed == [((0, 2), (2, 2))]
+    assert refreshed == [True]
+
+    model.flush_changes()
+    assert refreshed == [True]
+
+
+def test_refresh_rate_zero_emits_immediately(model, data_changed):
+    model.set_refresh_rate(0)
+    model.deviceAtRow(2).update_property("Uptime", "0T00:01:00")
+
+    assert data_changed == [((2, 3), (2, 3))]
+
+
+def test_dirty_ranges():
+    dirty = {0: {1}, 1: {1}, 2: {1, 3}, 4: {1}, 5: {3, 1}}
+
+    assert dirty_ranges(dirty) == [(0, 1, 1, 1), (2, 1, 2, 3), (4, 1, 4, 1), (5, 1, 5, 3)]
+
+
+def test_column_index_follows_setup(model):
+    assert model.columnIndex("RSSI") == 4
+
+    model.setupColumns(["Device", "RSSI"])
+    assert model.columnIndex("RSSI") == 1
+
+
+@pytest.mark.parametrize(
+    "key, expected",
+    [
+        ("POWER", True),
+        ("POWER12", True),
+        ("FriendlyName1", True),
+        ("ShutterRelay1", True),
+        ("Dimmer", True),
+        ("LWT", True),
+        ("Module", False),
+        ("Uptime", False),
+    ],
+)
+def test_is_device_column_key(key, expected):
+    assert is_device_column_key(key) is expected
+
+
+def test_trend_column(model, data_changed):
+    model.setupColumns(["Device", "Trend:ENERGY/Power"])
+    device = model.deviceAtRow(1)
+
+    assert model.headerData(1, Qt.Horizontal) == "Power trend"
+    assert model.index(1, 1).data() is None
+
+    device.process_sensor({"ENERGY": {"Power": 40}})
+    device.process_sensor({"ENERGY": {"Power": 60}})
+    model.flush_changes()
+
+    assert data_changed == [((1, 1), (1, 1))]
+    assert model.index(1, 1).data() == 60
+    assert model.index(1, 1).data(DeviceRoles.HistoryRole).values() == [40, 60]
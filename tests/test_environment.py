@@ -19,9 +19,120 @@ from tdmgr.tasmota.environment import TasmotaEnvironment
 def test_find_device(full_topic, test_topic, expected):
     env = TasmotaEnvironment()
     dev = TasmotaDevice(topic="device", fulltopic=full_topic)
-    env.devices.append(dev)
+    env.add_device(dev)
 
     msg = Message(test_topic)
     device = env.find_device(msg)
 
     assert (device == dev) is expected
+
+
+def test_find_device_sets_prefix():
+    env = TasmotaEnvironment()
+    env.add_device(TasmotaDevice(topic="device", fulltopic="office/%prefix%/%topic%/"))
+
+    msg = Message("office/tele/device/STATE")
+    assert env.find_device(msg)
+    assert msg.prefix == "tele"
+
+
+def test_find_device_after_fulltopic_change():
+    env = TasmotaEnvironment()
+    dev = TasmotaDevice(topic="device")
+    env.add_device(dev)
+
+    dev.update_property("FullTopic", "%prefix%/office/%topic%/")
+
+    assert env.find_device(Message("stat/device/POWER")) is None
+    assert env.find_device(Message("stat/office/device/POWER")) == dev
+
+
+def test_find_device_after_topic_change():
+    env = TasmotaEnvironment()
+    dev = TasmotaDevice(topic="device")
+    env.add_device(dev)
+
+    dev.update_property("Topic", "renamed")
+
+    assert env.find_device(Message("stat/device/POWER")) is None
+    assert env.find_device(Message("stat/renamed/POWER")) == dev
+
+
+def test_find_device_after_removal():
+    env = TasmotaEnvironment()
+    dev = TasmotaDevice(topic="device")
+    env.add_device(dev)
+    env.remove_device(dev)
+
+    assert env.find_device(Message("stat/device/POWER")) is None
+    assert env.topic_index.root.is_empty()
+
+
+def test_find_device_prefers_earliest_device():
+    env = TasmotaEnvironment()
+    first = TasmotaDevice(topic="office", fulltopic="%prefix%/%topic%/")
+    second = TasmotaDevice(topic="lamp", fulltopic="%prefix%/office/%topic%/")
+    env.add_device(first)
+    env.add_device(second)
+
+    assert env.find_device(Message("tele/office/lamp/STATE")) == first
+    assert env.find_device(Message("tele/office/other/STATE")) == first
+
+
+@pytest.mark.parametrize(
+    "test_topic, expected",
+    [
+        ("home_stat/device/POWER", True),
+        ("stat/device/POWER", False),
+    ],
+)
+def test_find_device_partial_segment(test_topic, expected):
+    env = TasmotaEnvironment()
+    dev = TasmotaDevice(topic="device", fulltopic="home_%prefix%/%topic%/")
+    env.add_device(dev)
+
+    assert (env.find_device(Message(test_topic)) == dev) is expected
+
+
+def test_route_appends_to_device_log():
+    env = TasmotaEnvironment()
+    device = TasmotaDevice("device")
+    env.add_device(device)
+
+    assert env.route(Message("tele/device/STATE")) is device
+    assert device.log is None  # messages are kept only after a console asked for them
+
+    log = device.open_log(2)
+    for endpoint in ("STATE", "SENSOR", "RESULT"):
+        env.route(Message(f"stat/device/{endpoint}", b"{}"))
+    assert env.route(Message("stat/other/RESULT")) is None
+
+    assert [entry.topic for entry in log.entries] == ["stat/device/SENSOR", "stat/device/RESULT"]
+    assert (log.first, log.total) == (1, 3)
+
+
+def test_route_notifies_device_listeners():
+    env = TasmotaEnvironment()
+    device, other = TasmotaDevice("device"), TasmotaDevice("other")
+    env.add_device(device)
+    env.add_device(other)
+
+    received = []
+    device.message_received.connect(received.append)
+    for topic in ("tele/device/STATE", "tele/other/STATE", "stat/device/RESULT"):
+        env.route(Message(topic))
+
+    assert [msg.topic for msg in received] == ["tele/device/STATE", "stat/device/RESULT"]
+
+
+def test_route_notifies_listeners_after_processing():
+    env = TasmotaEnvironment()
+    device = TasmotaDevice("device")
+    env.add_device(device)
+
+    seen = []
+    device.message_received.connect(lambda msg: seen.append((device.online, device.p.get("POWER"))))
+    env.route(Message("tele/device/LWT", b"Online"))
+    env.route(Message("stat/device/RESULT", b'{"POWER":"ON"}'))
+
+    assert seen == [(True, None), (True, "ON")]
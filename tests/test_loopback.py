@@ -0,0 +1,119 @@
+import json
+
+import pytest
+
+from tdmgr.loopback import (
+    STATUS0_ENDPOINTS,
+    SYNTHETIC_PROFILE,
+    LoopbackTransport,
+    VirtualDevice,
+    load_corpus,
+)
+from tdmgr.mqtt import MqttClient
+
+
+def test_load_corpus():
+    profiles = load_corpus()
+
+    assert len(profiles) > 1
+    assert any("STATUS11" in profile for profile in profiles)
+    assert all(
+        isinstance(payload, bytes)
+        for profile in profiles
+        for payloads in profile.values()
+        for payload in payloads
+    )
+
+
+def test_load_corpus_fallback(tmp_path):
+    assert load_corpus(tmp_path / "missing") == [SYNTHETIC_PROFILE]
+
+
+@pytest.fixture
+def virtual_device():
+    yield VirtualDevice("virtual", SYNTHETIC_PROFILE, relays=2)
+
+
+def test_virtual_device_status(virtual_device):
+    replies = virtual_device.command("Status", "0")
+
+    assert [topic for topic, _ in replies] == [
+        f"stat/virtual/{endpoint}"
+        for endpoint in STATUS0_ENDPOINTS
+        if endpoint in SYNTHETIC_PROFILE
+    ]
+    assert virtual_device.command("status", "8")[0][0] == "stat/virtual/STATUS8"
+
+
+def test_virtual_device_identity():
+    profile = {"STATUS": [b'{"Status":{"Topic":"corpus","Module":1}}']}
+    device = VirtualDevice("virtual", profile)
+
+    _, payload = device.command("status")[0]
+    assert json.loads(payload) == {"Status": {"Topic": "virtual", "Module": 1}}
+
+
+def test_virtual_device_backlog(virtual_device):
+    replies = virtual_device.command("backlog", "fulltopic; power2 toggle;unknowncmd 1")
+
+    assert [json.loads(payload) for _, payload in replies] == [
+        {"FullTopic": "%prefix%/%topic%/"},
+        {"POWER2": "ON"},
+        {"Command": "Unknown"},
+    ]
+    assert {topic for topic, _ in replies} == {"stat/virtual/RESULT"}
+
+
+@pytest.fixture
+def loopback(qapp):
+    transport = LoopbackTransport(
+        [
+            VirtualDevice("device1", SYNTHETIC_PROFILE),
+            VirtualDevice("device2", SYNTHETIC_PROFILE, "%topic%/%prefix%/"),
+        ]
+    )
+    client = MqttClient(transport=transport)
+    received = []
+    client.messageSignal.connect(received.append)
+    client.hostname = "loopback"
+    client.connectToHost()
+    transport.loop_stop()
+    yield transport, client, received
+    client.disconnectFromHost()
+
+
+def test_loopback_connect_and_retained_lwt(loopback):
+    transport, client, received = loopback
+    assert client.state == MqttClient.Connected
+
+    client.subscribe([("tele/#", 0), ("+/tele/#", 0)])
+    transport.process()
+
+    assert {(m.topic, m.payload, m.retained) for m in received} == {
+        ("tele/device1/LWT", "Online", True),
+        ("device2/tele/LWT", "Online", True),
+    }
+
+
+def test_loopback_command_reply(loopback):
+    transport, client, received = loopback
+    client.subscribe([("stat/#", 0), ("+/stat/#", 0)])
+
+    client.publish("device2/cmnd/POWER", "ON")
+    client.publish("cmnd/unknown/POWER", "ON")
+    assert not received
+
+    assert transport.process() == 1
+    assert [(m.topic, m.payload) for m in received] == [("device2/stat/RESULT", '{"POWER": "ON"}')]
+
+
+def test_loopback_telemetry(loopback):
+    transport, client, received = loopback
+    client.subscribe([("tele/device1/#", 0)])
+    transport.process()
+    received.clear()
+
+    transport.telemetry()
+    transport.process()
+
+    assert [m.topic for m in received] == ["tele/device1/STATE", "tele/device1/SENSOR"]
@@ -1,6 +1,20 @@
+import gc
+import json
+import weakref
+from unittest.mock import patch
+
 import pytest
 
-from tdmgr.mqtt import Message
+from tdmgr.mqtt import (
+    DEFAULT_PATTERNS,
+    FullTopicPatterns,
+    Message,
+    MessageLog,
+    MqttClient,
+    compile_fulltopic_pattern,
+)
+from tdmgr.tasmota.device import TasmotaDevice
+from tests.conftest import FakePahoMessage
 
 
 def test_message():
@@ -64,3 +78,99 @@ def test_message_dict():
 def test_message_dict_failed(caplog):
     message = Message("topic/RESULT", b"not json")
     assert message.dict() == {}
+
+
+def test_message_dict_is_lazy_and_parsed_once():
+    message = Message("stat/device/RESULT", b'{"POWER": "ON"}')
+
+    with patch("tdmgr.mqtt.json.loads", wraps=json.loads) as loads:
+        assert message.endpoint == "RESULT"
+        loads.assert_not_called()
+
+        assert message.first_key == "POWER"
+        assert message.dict() == {"POWER": "ON"}
+        assert message.dict() is message.dict()
+        loads.assert_called_once()
+
+
+def test_message_first_key_empty_payload():
+    assert Message("tele/device/LWT", b"Online").first_key == ""
+
+
+def test_message_has_no_instance_dict():
+    with pytest.raises(AttributeError):
+        Message("topic").unknown_attribute = 1
+
+
+def test_message_freed_after_dispatch(qapp):
+    client = MqttClient()
+    device = TasmotaDevice("device")
+    refs = []
+
+    def slot(msg: Message):
+        msg.prefix = "stat"
+        device.process_message(msg)
+        refs.append(weakref.ref(msg))
+
+    client.messageSignal.connect(slot)
+    client.setBatching(True)
+
+    for _ in range(10):
+        client.on_message(None, None, FakePahoMessage("stat/device/RESULT", b'{"POWER":"ON"}'))
+    client.drain()
+    client.setBatching(False)
+
+    gc.collect()
+    assert len(refs) == 10
+    assert all(ref() is None for ref in refs)
+
+
+def test_match_fulltopic_compiles_pattern_once():
+    compile_fulltopic_pattern.cache_clear()
+    for topic in ("tele/device1/LWT", "tele/device2/LWT"):
+        assert Message(topic).match_fulltopic("%prefix%/%topic%/")
+
+    assert compile_fulltopic_pattern.cache_info().misses == 1
+
+
+@pytest.mark.parametrize(
+    "topic, expected",
+    [
+        ("tele/device/LWT", [("tele", "device"), ("device", "tele")]),
+        ("office/tele/device/LWT", [("tele", "device")]),
+        ("basement/office/tele/device/LWT", []),
+    ],
+)
+def test_fulltopic_patterns_match(topic, expected):
+    patterns = FullTopicPatterns(DEFAULT_PATTERNS + ["+/%prefix%/%topic%/"])
+
+    result = [(m["prefix"], m["topic"]) for m in patterns.match(topic)]
+    assert result == expected
+
+
+def test_fulltopic_patterns_reload():
+    patterns = FullTopicPatterns(DEFAULT_PATTERNS)
+    assert not patterns.match("office/tele/device/LWT")
+
+    patterns.set_patterns(DEFAULT_PATTERNS + ["+/%prefix%/%topic%/", "+/%prefix%/%topic%/"])
+    assert patterns.patterns == DEFAULT_PATTERNS + ["+/%prefix%/%topic%/"]
+    assert len(patterns.match("office/tele/device/LWT")) == 1
+
+    patterns.set_patterns(DEFAULT_PATTERNS)
+    assert not patterns.match("office/tele/device/LWT")
+
+
+def test_message_log():
+    log = MessageLog(3)
+    for idx in range(5):
+        log.append(Message(f"stat/device/{idx}", b"ON"))
+
+    assert len(log) == 3
+    assert (log.first, log.total) == (2, 5)
+    assert log.get(1) is None
+    assert log.get(2).topic == "stat/device/2"
+    assert log.get(5) is None
+
+    log.resize(2)
+    assert [e.topic for e in log.entries] == ["stat/device/3", "stat/device/4"]
+    assert log.first == 3
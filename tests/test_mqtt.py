@@ -1,6 +1,7 @@
 import pytest
 
-from tdmgr.mqtt import expand_fulltopic
+from tdmgr.mqtt import Message, MqttClient, MqttTransport, PahoTransport, expand_fulltopic
+from tests.conftest import FakePahoMessage
 
 
 @pytest.mark.parametrize(
@@ -16,3 +17,80 @@ def test_expand_fulltopic(fulltopic, expected):
     result = expand_fulltopic(fulltopic)
 
     assert result == expected
+
+
+@pytest.fixture
+def mqtt_client(qapp):
+    client = MqttClient()
+    received = []
+    client.messageSignal.connect(received.append)
+    yield client, received
+    client.setBatching(False)
+
+
+def test_on_message_unbatched(mqtt_client):
+    client, received = mqtt_client
+
+    client.on_message(None, None, FakePahoMessage("tele/device/LWT", b"Online"))
+
+    assert [m.topic for m in received] == ["tele/device/LWT"]
+    assert not client.pending
+
+
+def test_on_message_batched(mqtt_client):
+    client, received = mqtt_client
+    client.setBatching(True, batch_size=2, latency=1000)
+
+    for idx in range(5):
+        client.on_message(None, None, FakePahoMessage(f"tele/device{idx}/LWT", b"Online"))
+
+    assert not received
+    assert len(client.pending) == 5
+
+    client.drain()
+    assert [m.topic for m in received] == ["tele/device0/LWT", "tele/device1/LWT"]
+
+    client.drain()
+    client.drain()
+    assert len(received) == 5
+    assert not client.pending
+
+
+def test_disabling_batching_flushes_pending(mqtt_client):
+    client, received = mqtt_client
+    client.setBatching(True, batch_size=1)
+
+    for idx in range(3):
+        client.on_message(None, None, FakePahoMessage(f"tele/device{idx}/LWT", b"Online"))
+
+    client.setBatching(False)
+    assert len(received) == 3
+    assert not client.batch_timer.isActive()
+
+
+def test_flush_takes_late_messages(mqtt_client):
+    client, received = mqtt_client
+    client.setBatching(True, batch_size=1)
+    client.on_message(None, None, FakePahoMessage("tele/device0/LWT", b"Online"))
+
+    def append_late(message):
+        # appended by the network thread while batching is being turned off
+        if message.topic == "tele/device0/LWT":
+            client.pending.append(Message("tele/device1/LWT", b"Online"))
+
+    client.messageSignal.connect(append_late)
+    client.setBatching(False)
+
+    assert [m.topic for m in received] == ["tele/device0/LWT", "tele/device1/LWT"]
+    assert not client.pending
+
+
+def test_transport_requires_interface():
+    class IncompleteTransport(MqttTransport):
+        def connect(self, host, port=1883, keepalive=60):
+            pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        IncompleteTransport()
+
+    PahoTransport()
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+from tdmgr.GUI.performance import PerformanceMonitor
+from tdmgr.profiling import RingBuffer
+from tdmgr.tasmota.device import TasmotaDevice
+from tdmgr.tasmota.environment import TasmotaEnvironment
+
+
+@pytest.fixture
+def monitor(qapp):
+    env = TasmotaEnvironment()
+    env.add_device(TasmotaDevice("device"))
+    env.retained.update({"tele/device/LWT", "tele/other/LWT"})
+    mqtt = SimpleNamespace(received=0, sent=0)
+    delegate = SimpleNamespace(timed=False, paint_time=0.0)
+    view = SimpleNamespace(itemDelegate=lambda: delegate)
+    yield PerformanceMonitor(mqtt, [("cmnd/device/STATUS", "8")], env, None, view)
+
+
+def test_sample_rates(monitor):
+    monitor.mqtt.received, monitor.mqtt.sent = 200, 10
+    monitor.data_changed = 6
+    monitor.frames = 4
+    monitor.delegate.paint_time = 0.02
+    monitor.lag_max = 0.05
+
+    monitor.sample(now=monitor.stamp + 2)
+    latest = {key: history.last() for key, history in monitor.history.items()}
+
+    assert latest["messages_in"] == 100
+    assert latest["messages_out"] == 5
+    assert latest["data_changed"] == 3
+    assert latest["paint_per_frame"] == pytest.approx(5)
+    assert latest["event_loop_lag"] == pytest.approx(50)
+    assert (latest["queue_depth"], latest["devices"], latest["retained"]) == (1, 1, 2)
+
+    # counters start over with each sample
+    monitor.sample(now=monitor.stamp + 1)
+    assert monitor.history["messages_in"].last() == 0
+    assert monitor.history["paint_per_frame"].last() == 0
+
+
+def test_ring_buffer_last():
+    buffer = RingBuffer(2)
+    assert buffer.last() == 0
+    for value in (1, 2, 3):
+        buffer.append(value)
+    assert buffer.last() == 3
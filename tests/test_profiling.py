@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from tdmgr.mqtt import Message
+from tdmgr.profiling import Counter, Profiler, RingBuffer, profiler
+from tests.conftest import get_payload
+
+
+@pytest.fixture
+def profiling():
+    profiler.enable()
+    yield profiler
+    profiler.enable(False)
+    profiler.reset()
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(3)
+    assert list(buffer) == []
+
+    for value in range(1, 5):
+        buffer.append(value)
+
+    assert len(buffer) == 3
+    assert list(buffer) == [2, 3, 4]
+
+    buffer.clear()
+    assert list(buffer) == []
+
+
+def test_counter_summary():
+    counter = Counter(samples=10)
+    for ms in range(1, 21):
+        counter.record(ms / 1000)
+
+    summary = counter.summary()
+    assert summary["calls"] == 20
+    assert summary["total_ms"] == pytest.approx(210)
+    assert summary["mean_us"] == pytest.approx(10500)
+    assert summary["p50_us"] == pytest.approx(16000)  # of the latest 10 samples
+    assert summary["max_us"] == pytest.approx(20000)
+
+
+def test_profiler_summary_and_export(tmp_path):
+    _profiler = Profiler()
+    _profiler.record("endpoint", "STATE", 0.001)
+    _profiler.record("endpoint", "RESULT", 0.002)
+    _profiler.record("schema", "StateSchema", 0.0005)
+
+    summary = _profiler.summary()
+    assert list(summary) == ["endpoint", "schema"]
+    assert list(summary["endpoint"]) == ["RESULT", "STATE"]
+
+    _profiler.export(tmp_path / "profile.json")
+    assert json.loads((tmp_path / "profile.json").read_text()) == summary
+
+    _profiler.reset()
+    assert _profiler.summary() == {}
+
+
+@pytest.mark.parametrize("version", ("14.2.0.6",))
+def test_process_message_is_profiled(device, version, profiling):
+    payload = get_payload(version, "STATUS11.json")
+    device.process_message(Message("stat/device/STATUS11", payload, prefix="stat"))
+    device.process_message(Message("stat/device/RESULT", b'{"POWER":"ON"}', prefix="stat"))
+
+    summary = profiling.summary()
+    assert summary["endpoint"]["STATUS11"]["calls"] == 1
+    assert summary["endpoint"]["RESULT"]["calls"] == 1
+    assert summary["schema"]["Status11ResponseSchema"]["calls"] == 1
+
+
+def test_disabled_profiler_records_nothing(device):
+    device.process_message(Message("stat/device/RESULT", b'{"POWER":"ON"}', prefix="stat"))
+    assert profiler.summary() == {}
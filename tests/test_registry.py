@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+
+import pytest
+from PyQt5.QtCore import QSettings
+
+from tdmgr.registry import MAX_HISTORY, DeviceRegistry, device_entry, registry_path
+from tdmgr.tasmota.device import TasmotaDevice
+
+PLUG = "AA-BB-CC-DD-EE-01"
+BULB = "AA-BB-CC-DD-EE-02"
+
+
+def entry(topic, history=()):
+    return {
+        "topic": topic,
+        "full_topic": "%prefix%/%topic%/",
+        "device_name": topic.title(),
+        "debug": False,
+        "history": list(history),
+    }
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "devices.json")
+
+
+def test_flush_and_load(path):
+    registry = DeviceRegistry(path)
+    assert not registry.exists
+    registry.update(PLUG, entry("plug"))
+    registry.update(BULB, entry("bulb"))
+    registry.flush()
+    registry.update(PLUG, entry("plug", ["Power"]))
+    registry.flush()
+    registry.wait()
+
+    with open(registry.journal_path) as f:
+        assert len(f.readlines()) == 3
+    assert DeviceRegistry(path).entries == {PLUG: entry("plug", ["Power"]), BULB: entry("bulb")}
+
+
+def test_flush_skips_unchanged(path):
+    registry = DeviceRegistry(path)
+    registry.update(PLUG, entry("plug"))
+    registry.flush()
+    registry.update(PLUG, entry("plug"))
+    assert not registry.dirty
+    registry.flush()
+    assert registry.journal_lines == 1
+
+
+def test_flush_in_background(path, monkeypatch):
+    synced = threading.Event()
+
+    def fsync(fd):
+        assert synced.wait(5)
+
+    monkeypatch.setattr("tdmgr.registry.os.fsync", fsync)
+    registry = DeviceRegistry(path)
+    registry.update(PLUG, entry("plug"))
+    pending = registry.flush()
+    assert not pending.done()  # the caller doesn't wait for the disk
+
+    synced.set()
+    registry.close()
+    assert DeviceRegistry(path).entries == {PLUG: entry("plug")}
+
+
+def test_remove(path):
+    registry = DeviceRegistry(path)
+    registry.update(PLUG, entry("plug"))
+    registry.update(BULB, entry("bulb"))
+    registry.compact()
+    registry.remove(PLUG)
+    registry.sync()
+    registry.wait()
+
+    assert DeviceRegistry(path).entries == {BULB: entry("bulb")}
+
+
+def test_torn_journal_line(path):
+    registry = DeviceRegistry(path)
+    registry.update(PLUG, entry("plug"))
+    registry.flush()
+    registry.wait()
+    with open(registry.journal_path, "a") as f:
+        f.write('{"mac": "AA-BB-CC-DD-EE-02", "top')
+
+    assert DeviceRegistry(path).entries == {PLUG: entry("plug")}
+
+
+def test_invalid_journal_line(path):
+    registry = DeviceRegistry(path)
+    registry.update(PLUG, entry("plug"))
+    registry.flush()
+    registry.wait()
+    with open(registry.journal_path, "a") as f:
+        f.write(json.dumps(entry("bulb")) + "\n[1, 2]\n")
+    registry.update(PLUG, entry("plug", ["Power"]))
+    registry.flush()
+    registry.wait()
+
+    assert DeviceRegistry(path).entries == {PLUG: entry("plug", ["Power"])}
+
+
+def test_corrupt_snapshot(path):
+    registry = DeviceRegistry(path)
+    registry.update(PLUG, entry("plug"))
+    registry.update(BULB, entry("bulb"))
+    registry.close()
+    with open(path, "r+") as f:
+        f.truncate(20)
+
+    registry = DeviceRegistry(path)
+    assert registry.entries == {}
+    assert not registry.exists
+    assert os.path.exists(f"{path}.corrupt")
+
+    registry.update(PLUG, entry("plug", ["Power"]))
+    registry.close()
+    with open(f"{path}.corrupt") as f:
+        assert len(f.read()) == 20
+    assert DeviceRegistry(path).entries == {PLUG: entry("plug", ["Power"])}
+
+
+def test_unmovable_corrupt_snapshot(path, monkeypatch):
+    with open(path, "w") as f:
+        f.write("{")
+
+    def replace(*args):
+        raise OSError("read-only")
+
+    monkeypatch.setattr("tdmgr.registry.os.replace", replace)
+    registry = DeviceRegistry(path)
+    assert registry.damaged
+    registry.update(PLUG, entry("plug"))
+    registry.close()
+    monkeypatch.undo()
+
+    with open(path) as f:
+        assert f.read() == "{"
+    assert DeviceRegistry(path).entries == {PLUG: entry("plug")}
+
+
+def test_compact(path, monkeypatch):
+    monkeypatch.setattr("tdmgr.registry.JOURNAL_LIMIT", 3)
+    registry = DeviceRegistry(path)
+    for n in range(4):
+        registry.update(PLUG, entry("plug", [f"Power {n}"]))
+        registry.flush()
+
+    assert registry.journal_lines == 0
+    registry.wait()
+    with open(path) as f:
+        assert json.load(f)["devices"] == {PLUG: entry("plug", ["Power 3"])}
+
+    registry.update(BULB, entry("bulb"))
+    registry.close()
+    assert DeviceRegistry(path).entries == {
+        PLUG: entry("plug", ["Power 3"]),
+        BULB: entry("bulb"),
+    }
+
+
+def test_migrate(tmp_path, qapp):
+    devices = QSettings(str(tmp_path / "devices.cfg"), QSettings.IniFormat)
+    devices.beginGroup(PLUG)
+    devices.setValue("topic", "plug")
+    devices.setValue("full_topic", "%prefix%/%topic%/")
+    devices.setValue("device_name", "Plug")
+    devices.setValue("debug", True)
+    devices.setValue("history/0", "Power")
+    devices.setValue("history/1", "Status 0")
+    devices.endGroup()
+    devices.setValue(f"{BULB}/topic", "old")
+    devices.sync()
+
+    path = registry_path(devices)
+    assert path == str(tmp_path / "devices.json")
+    registry = DeviceRegistry(path)
+    registry.update(BULB, entry("bulb"))  # journaled, newer than the INI file
+    registry.flush()
+    assert not registry.exists
+    assert registry.migrate(devices) == 2
+    registry.close()
+
+    registry = DeviceRegistry(path)
+    assert registry.exists
+    assert registry.get(PLUG) == {**entry("plug", ["Power", "Status 0"]), "debug": True}
+    assert registry.get(BULB) == entry("bulb")
+
+
+def test_device_entry():
+    device = TasmotaDevice("plug", "%prefix%/%topic%/", "Plug")
+    device.history.extend(f"Power {n}" for n in range(MAX_HISTORY + 5))
+
+    assert device_entry(device) == {
+        **entry("plug"),
+        "history": [f"Power {n}" for n in range(MAX_HISTORY)],
+    }
@@ -0,0 +1,7 @@
+from tdmgr.GUI.resources import RCC_PATH, rcc_data
+
+
+def test_rcc_matches_icons_module():
+    # regenerate with `python -m tdmgr.GUI.resources` after rebuilding the icons module
+    with open(RCC_PATH, "rb") as f:
+        assert f.read() == rcc_data()
@@ -0,0 +1,241 @@
+from time import monotonic
+
+import pytest
+
+from tdmgr.scheduler import (
+    ADAPT_TICKS,
+    MAX_INBOUND_BACKLOG,
+    Priority,
+    PublishScheduler,
+    TelemetryPoller,
+    TokenBucket,
+)
+from tdmgr.tasmota.device import TasmotaDevice
+from tdmgr.tasmota.environment import TasmotaEnvironment
+
+
+@pytest.fixture
+def scheduler(qapp):
+    published = []
+    scheduler = PublishScheduler(
+        lambda topic, payload: published.append((topic, payload)),
+        rate=10,
+        burst=5,
+        device_rate=1,
+        device_burst=2,
+    )
+    yield scheduler, published
+
+
+def test_token_bucket():
+    bucket = TokenBucket(2, 3, now=0)
+
+    assert [bucket.take(0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.take(0.5)
+    assert not bucket.take(0.5)
+    assert bucket.refill(100) == 3
+
+
+def test_priorities(scheduler):
+    scheduler, published = scheduler
+    scheduler.enqueue("cmnd/device1/STATUS", 8, Priority.POLL)
+    scheduler.enqueue("cmnd/device2/backlog", "status 0", Priority.QUERY)
+    scheduler.enqueue("cmnd/device3/rule1", "", Priority.USER)
+
+    assert scheduler.drain() == 3
+    assert published == [
+        ("cmnd/device3/rule1", ""),
+        ("cmnd/device2/backlog", "status 0"),
+        ("cmnd/device1/STATUS", "8"),
+    ]
+    assert len(scheduler) == 0
+
+
+def test_deduplication(scheduler):
+    scheduler, published = scheduler
+
+    assert scheduler.enqueue("cmnd/device1/STATUS", 8, Priority.POLL)
+    assert not scheduler.enqueue("cmnd/device1/STATUS", "8", Priority.POLL)
+    assert scheduler.enqueue("cmnd/device1/STATUS", 0, Priority.POLL)
+    assert len(scheduler) == 2
+    assert scheduler.metrics()["deduplicated"] == 1
+
+    scheduler.drain()
+    assert scheduler.enqueue("cmnd/device1/STATUS", 8, Priority.POLL)
+
+
+def test_global_rate_limit(scheduler):
+    scheduler, published = scheduler
+    for idx in range(20):
+        scheduler.enqueue(f"cmnd/device{idx}/STATUS", 8)
+
+    now = monotonic()
+    assert scheduler.drain(now) == 5
+    assert scheduler.drain(now) == 0
+    assert scheduler.drain(now + 0.5) == 5
+    assert [topic for topic, _ in published] == [f"cmnd/device{idx}/STATUS" for idx in range(10)]
+    assert scheduler.metrics()["depth"] == 10
+
+
+def test_device_rate_limit_keeps_order(scheduler):
+    scheduler, published = scheduler
+    for command in ("Var", "Mem", "rule1"):
+        scheduler.enqueue(f"cmnd/device1/{command}", "")
+    scheduler.enqueue("cmnd/device2/Var", "")
+
+    now = monotonic()
+    assert scheduler.drain(now) == 3
+    assert published == [
+        ("cmnd/device1/Var", ""),
+        ("cmnd/device1/Mem", ""),
+        ("cmnd/device2/Var", ""),
+    ]
+    assert list(scheduler) == [("cmnd/device1/rule1", "")]
+
+    assert scheduler.drain(now + 1) == 1
+    assert list(scheduler.device_buckets) == ["cmnd/device1"]
+
+
+def test_wait_metrics(scheduler):
+    scheduler, published = scheduler
+    scheduler.enqueue("cmnd/device1/STATUS", 8)
+
+    scheduler.drain(monotonic() + 2)
+
+    metrics = scheduler.metrics()
+    assert metrics["sent"] == 1
+    assert metrics["wait_last"] == metrics["wait_max"] == metrics["wait_avg"] >= 2
+
+
+@pytest.fixture
+def poller(qapp):
+    env = TasmotaEnvironment()
+    for idx in range(10):
+        device = TasmotaDevice(f"device{idx}")
+        device.online = True
+        env.add_device(device)
+
+    scheduler = PublishScheduler(lambda topic, payload: None)
+    backlog = []
+    poller = TelemetryPoller(env, scheduler, lambda: len(backlog), period=1000, jitter=0.1)
+    yield poller, scheduler, backlog
+
+
+def test_poller_spreads_devices(poller):
+    poller, scheduler, _ = poller
+    poller.jitter = 0  # a jittered repoll of device0 could fall due again at 1.0
+    poller.reschedule(now=0)
+
+    assert poller.tick(0.05) == 1
+    assert poller.tick(0.55) == 5
+    assert poller.tick(1.0) == 4
+    assert len(scheduler) == 10
+    assert all(topic.endswith("/STATUS") and payload == "8" for topic, payload in scheduler)
+
+
+def test_poller_jitters_next_poll(poller):
+    poller, _, _ = poller
+    poller.reschedule(now=0)
+    poller.tick(1.0)
+
+    assert all(1.9 <= due <= 2.1 for due in poller.due.values())
+    assert len(set(poller.due.values())) > 1
+
+
+def test_poller_skips_offline_and_fresh_devices(poller):
+    poller, scheduler, _ = poller
+    devices = poller.env.devices
+    devices[0].update_property("LWT", "Offline")
+    devices[1].sensor_updated = 0.5
+    poller.reschedule(now=0)
+
+    assert poller.tick(1.0) == 8
+    assert ("cmnd/device0/STATUS", "8") not in list(scheduler)
+    assert ("cmnd/device1/STATUS", "8") not in list(scheduler)
+    assert poller.due[devices[1]] >= 1.5
+
+
+def test_poller_polls_demanded_devices_only(poller):
+    poller, scheduler, _ = poller
+    devices = poller.env.devices
+    calls = []
+
+    def demand():
+        calls.append(1)
+        return {devices[2], devices[3]}
+
+    poller.demand = demand
+    poller.reschedule(now=0)
+
+    assert poller.tick(1.0) == 2
+    assert list(scheduler) == [("cmnd/device2/STATUS", "8"), ("cmnd/device3/STATUS", "8")]
+    assert len(calls) == 1
+    assert all(due >= 1.9 for due in poller.due.values())
+
+    poller.tick(1.0)
+    assert len(calls) == 1  # not evaluated when nothing is due
+
+
+def ticks(poller, start: float, count: int, step: float = 0.125) -> float:
+    for n in range(count):
+        poller.tick(start + n * step)
+    return start + count * step
+
+
+def test_poller_backs_off(poller):
+    poller, scheduler, backlog = poller
+    backlog.extend(range(MAX_INBOUND_BACKLOG + 1))
+
+    now = ticks(poller, 0, ADAPT_TICKS)
+    assert poller.backoff == 2
+    now = ticks(poller, now, ADAPT_TICKS)
+    assert poller.backoff == 4
+    assert poller.effective_period == 4
+
+    backlog.clear()
+    scheduler.enqueue("cmnd/device0/STATUS", 8, Priority.POLL)
+    now = ticks(poller, now, 2 * ADAPT_TICKS)
+    assert poller.backoff == 4  # keep backing off until the queued publishes are sent
+
+    scheduler.clear()
+    ticks(poller, now, ADAPT_TICKS)
+    assert poller.backoff == 2
+
+
+def test_poller_backoff_ignores_short_bursts(poller):
+    poller, _, backlog = poller
+    now = 0
+    for _ in range(10):
+        backlog.extend(range(MAX_INBOUND_BACKLOG + 1))
+        now = ticks(poller, now, ADAPT_TICKS // 2)
+        backlog.clear()
+        now = ticks(poller, now, ADAPT_TICKS // 2)
+        assert poller.backoff == 1
+
+
+def test_poller_backoff_changes_once_per_period(poller):
+    poller, _, backlog = poller
+    poller.period = 2
+    backlog.extend(range(MAX_INBOUND_BACKLOG + 1))
+    changes = []
+    for n in range(80):
+        backoff = poller.backoff
+        poller.tick(n * 0.125)
+        if poller.backoff != backoff:
+            changes.append(n * 0.125)
+
+    assert changes[0] == (ADAPT_TICKS - 1) * 0.125
+    assert len(changes) == 3  # up to MAX_BACKOFF
+    assert all(b - a >= 2 for a, b in zip(changes, changes[1:]))
+
+
+def test_poller_follows_devices(poller):
+    poller, _, _ = poller
+    poller.reschedule(now=0)
+    env = poller.env
+
+    env.remove_device(env.devices[0])
+    env.add_device(TasmotaDevice("new_device"))
+    poller.tick(0)
+
+    assert set(poller.due) == set(env.devices)
@@ -1,6 +1,6 @@
 import pytest
 
-from tdmgr.tasmota.common import CTRange
+from tdmgr.tasmota.common import CTRange, parse_version
 
 
 class TestDeviceProps:
@@ -45,3 +45,85 @@ def test_map(v, f, t, expected):
 
     res = map_value(v, f, t)
     assert res == expected
+
+
+class TestDevicePropsFamilies:
+    @staticmethod
+    def test_matching_items_in_index_order():
+        from tdmgr.tasmota.common import DeviceProps
+
+        p = DeviceProps(POWER10="OFF", POWER2="ON", POWER="ON", POWERDelta=0, POWER1="OFF")
+
+        assert list(p.matching_items("POWER")) == [(1, "OFF"), (2, "ON"), (10, "OFF")]
+        assert list(p.matching_items("POWER", False))[0] == (None, "ON")
+
+    @staticmethod
+    def test_families_follow_mutations():
+        from tdmgr.tasmota.common import DeviceProps
+
+        p = DeviceProps(Channel1=10)
+        p["Channel3"] = 30
+        p.setdefault("Channel2", 20)
+        p["Channel1"] = 15
+        assert list(p.matching_items("Channel")) == [(1, 15), (2, 20), (3, 30)]
+
+        del p["Channel2"]
+        p.pop("Channel3")
+        p.pop("Channel4", None)
+        assert list(p.matching_items("Channel")) == [(1, 15)]
+
+        p.clear()
+        assert list(p.matching_items("Channel")) == []
+        assert p.families == {}
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "key, expected",
+        [
+            ("POWER", ("POWER", -1)),
+            ("POWER12", ("POWER", 12)),
+            ("ShutterRelay1", ("ShutterRelay", 1)),
+            ("HSBColor", ("HSBColor", -1)),
+        ],
+    )
+    def test_key_family(key, expected):
+        from tdmgr.tasmota.common import key_family
+
+        assert key_family(key) == expected
+
+
+@pytest.mark.parametrize(
+    "version, expected",
+    (
+        ("14.2.0.6", (14, 2, 0, 6)),
+        ("8.5.1", (8, 5, 1)),
+        ("9.1.0b", (9, 1)),
+        ("12.0.0", (12,)),
+    ),
+)
+def test_parse_version(version, expected):
+    assert parse_version(version) == expected
+
+
+def test_parse_version_trailing_zeros():
+    assert parse_version("12.2") == parse_version("12.2.0") == parse_version("12.2.0.0")
+    assert parse_version("12.2") < parse_version("12.2.0.6") < parse_version("12.2.1")
+
+
+@pytest.mark.parametrize(
+    "version, above",
+    (
+        ("12.2.0.6(tasmota)", True),
+        ("12.2.0(release-tasmota)", False),
+        ("12.10.0(tasmota)", True),
+    ),
+)
+def test_version_above(device, version, above):
+    device.update_property("Version", version)
+    assert device.version_above("12.2.0.6") is above
+
+
+def test_version_above_short_version(device):
+    device.update_property("Version", "12.2(tasmota)")
+    assert device.version_above("12.2.0")
+    assert not device.version_above("12.2.0.1")
@@ -0,0 +1,84 @@
+import pytest
+
+from tdmgr.GUI.telemetry import TelemetryWidget, format_value, sort_key
+from tdmgr.tasmota.device import TasmotaDevice
+
+
+@pytest.mark.parametrize(
+    "path, value, expected",
+    [
+        (("Time",), "2024-01-01T00:00:00", "2024-01-01 00:00:00"),
+        (("ENERGY", "Voltage"), 230, "230 V"),
+        (("ENERGY", "Voltage"), [230, 231], "[230, 231] V"),
+        (("ZbReceived", "0x1234", "Power"), 1, "1 W"),
+        (("Power",), 1, "1"),  # units only for sensor values
+        (("AM2301", "Temperature"), 21.5, "21.5"),
+    ],
+)
+def test_format_value(path, value, expected):
+    assert format_value(path, value) == expected
+
+
+def test_sort_key():
+    assert sorted(["TempUnit", "ENERGY", "Time", "AM2301"], key=sort_key) == [
+        "Time",
+        "AM2301",
+        "ENERGY",
+        "TempUnit",
+    ]
+
+
+@pytest.fixture
+def widget(qapp):
+    device = TasmotaDevice("device")
+    widget = TelemetryWidget(device)
+    yield widget
+    widget.deleteLater()
+
+
+def send(widget, data: dict):
+    widget.device.t = data
+    widget.device.update_telemetry.emit()
+
+
+def tree(widget) -> dict:
+    def children(item):
+        return {
+            item.child(i).text(0): children(item.child(i)) or item.child(i).text(1)
+            for i in range(item.childCount())
+        }
+
+    return children(widget.tree.invisibleRootItem())
+
+
+def test_widget_inserts_in_order(widget):
+    send(widget, {"ENERGY": {"Power": 5}, "Time": "2024-01-01T00:00:00"})
+    send(widget, {"AM2301": {"Temperature": 20}, "ENERGY": {"Power": 5, "Voltage": 230}})
+
+    assert list(tree(widget)) == ["AM2301", "ENERGY"]
+    assert tree(widget)["ENERGY"] == {"Power": "5 W", "Voltage": "230 V"}
+    item = widget.items[("ENERGY", "Power")]
+    send(widget, {"AM2301": {"Temperature": 20}, "ENERGY": {"Power": 6, "Voltage": 230}})
+    assert widget.items[("ENERGY", "Power")] is item
+    assert item.text(1) == "6 W"
+
+
+def test_widget_removes_subtree(widget):
+    send(widget, {"Zb": {"0x01": {"Power": 1}, "0x02": {"Power": 2}}, "ENERGY": {"Power": 5}})
+    send(widget, {"ENERGY": {"Power": 6}})
+
+    assert tree(widget) == {"ENERGY": {"Power": "6 W"}}
+    assert set(widget.items) == {("ENERGY",), ("ENERGY", "Power")}
+    assert widget.children == {(): ["ENERGY"], ("ENERGY",): ["Power"], ("ENERGY", "Power"): []}
+
+
+def test_widget_leaf_and_node_changes(widget):
+    send(widget, {"Sensor": 1})
+    send(widget, {"Sensor": {"Temperature": 20}})
+    assert tree(widget) == {"Sensor": {"Temperature": "20"}}
+    assert widget.items[("Sensor",)].text(1) == ""
+
+    send(widget, {"Sensor": 2})
+    assert tree(widget) == {"Sensor": "2"}
+    assert widget.children[("Sensor",)] == []
+    assert ("Sensor", "Temperature") not in widget.items
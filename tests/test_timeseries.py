@@ -0,0 +1,107 @@
+import pytest
+from PyQt5.QtCore import QRectF
+
+from tdmgr.GUI.delegates.sparkline import sparkline_polygon
+from tdmgr.tasmota.device import TasmotaDevice
+from tdmgr.tasmota.environment import TasmotaEnvironment
+from tdmgr.timeseries import (
+    DEFAULT_HISTORY_BUDGET,
+    DEFAULT_HISTORY_SERIES,
+    Tier,
+    TimeSeriesStore,
+    numeric_values,
+)
+
+SENSOR = {
+    "Time": "2024-01-01T00:00:00",
+    "ENERGY": {"Power": 100, "Voltage": 230.5, "Today": 1.2},
+    "Switch1": "ON",
+    "Flag": True,
+}
+
+
+def test_numeric_values():
+    assert dict(numeric_values(SENSOR)) == {
+        ("ENERGY", "Power"): 100,
+        ("ENERGY", "Voltage"): 230.5,
+        ("ENERGY", "Today"): 1.2,
+    }
+
+
+def test_raw_tier_keeps_newest():
+    tier = Tier(0, 3)
+    for second in range(5):
+        tier.add(second, second * 10)
+    assert tier.points() == [(2, 20), (3, 30), (4, 40)]
+
+
+def test_tier_averages_buckets():
+    tier = Tier(60, 10)
+    for timestamp, value in ((0, 1), (30, 3), (60, 10), (150, 4), (170, 6)):
+        tier.add(timestamp, value)
+
+    # the last bucket is still open
+    assert tier.points() == [(0, 2), (60, 10), (120, 5)]
+    assert len(tier) == 3
+
+
+def test_budget_fits_expected_series():
+    store = TimeSeriesStore()
+    assert store.series_bytes * DEFAULT_HISTORY_SERIES <= DEFAULT_HISTORY_BUDGET * 1024 * 1024
+    assert store.max_series >= DEFAULT_HISTORY_SERIES
+    assert all(size > 2 for size in store.sizes)
+
+
+def test_store_stops_at_budget():
+    store = TimeSeriesStore(budget=1, series=1000)
+    store.max_series = 2
+    store.add("device", SENSOR, 0)
+
+    assert len(store) == 2
+    assert store.get("device", ("ENERGY", "Today")) is None
+
+    store.remove("device")
+    assert len(store) == 0
+
+
+def test_disabled_store():
+    store = TimeSeriesStore(budget=0)
+    store.add("device", SENSOR, 0)
+    assert len(store) == 0
+
+
+def test_sensor_data_is_kept_in_history(device):
+    env = TasmotaEnvironment()
+    env.add_device(device)
+    changed = []
+    device.property_changed = lambda d, keys: changed.append(keys)
+
+    for power in (100, 120):
+        device.process_sensor({"StatusSNS": {"ENERGY": {"Power": power}}})
+
+    series = env.history.get(device, ("ENERGY", "Power"))
+    assert series.values() == [100, 120]
+    assert series.last() == 120
+    assert changed == [{"StatusSNS"}, {"StatusSNS"}]
+
+    env.remove_device(device)
+    assert env.history.get(device, ("ENERGY", "Power")) is None
+
+
+def test_sensor_data_without_environment():
+    device = TasmotaDevice("device")
+    device.process_sensor({"ENERGY": {"Power": 100}})
+    assert device.t == {"ENERGY": {"Power": 100}}
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    (
+        ([0, 5, 10], [(0, 10), (50, 5), (100, 0)]),
+        ([3, 3], [(0, 5), (100, 5)]),
+        ([1], []),
+    ),
+)
+def test_sparkline_polygon(values, expected):
+    polygon = sparkline_polygon(values, QRectF(0, 0, 100, 10))
+    assert [(point.x(), point.y()) for point in polygon] == expected